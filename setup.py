@@ -53,6 +53,10 @@ setup(
             "aiohttp",
             "azure-storage-blob",
         ],
+        "compression": [
+            "lz4",
+            "zstandard",
+        ],
     },
     install_requires=[
         "alembic",
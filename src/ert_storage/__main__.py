@@ -81,11 +81,35 @@ def run_alembic(args: List[str]) -> None:
     sys.exit(0)
 
 
+def run_gc() -> None:
+    """
+    Remove the blobs of the local blob store that no record refers to
+    """
+    from ert_storage.database import HAS_LOCAL_BLOB_STORAGE, Session
+    from ert_storage.endpoints._records_blob import collect_local_blobs
+
+    if not HAS_LOCAL_BLOB_STORAGE:
+        sys.exit(
+            "Environment variable 'ERT_STORAGE_LOCAL_BLOB_PATH' not set.\n"
+            "There is no local blob store to collect."
+        )
+
+    db = Session()
+    try:
+        removed = collect_local_blobs(db)
+    finally:
+        db.close()
+    print(f"Removed {len(removed)} unreferenced blobs", file=sys.stderr)
+    sys.exit(0)
+
+
 def print_usage() -> None:
     sys.exit(
-        "Usage: ert-storage [alembic...]\n\n"
+        "Usage: ert-storage [alembic...|gc]\n\n"
         "If alembic is given as the first argument, forward the rest of the\n"
-        "arguments to alembic. Otherwise start ERT Storage in development mode."
+        "arguments to alembic. If gc is given, remove the files of the local\n"
+        "blob store that no record refers to. Otherwise start ERT Storage in\n"
+        "development mode."
     )
 
 
@@ -96,6 +120,8 @@ def main(args: Optional[List[str]] = None) -> None:
     if len(args) > 0:
         if args[0] == "alembic":
             run_alembic(args[1:])
+        elif args == ["gc"]:
+            run_gc()
         else:
             print_usage()
     run_server()
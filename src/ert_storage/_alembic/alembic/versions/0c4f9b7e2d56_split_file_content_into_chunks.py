@@ -0,0 +1,116 @@
+"""Split file content into chunks
+
+Revision ID: 0c4f9b7e2d56
+Revises: e83b5c0d4a17
+Create Date: 2026-10-18 16:02:48.115093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import zlib
+
+
+# revision identifiers, used by Alembic.
+revision = "0c4f9b7e2d56"
+down_revision = "e83b5c0d4a17"
+branch_labels = None
+depends_on = None
+
+
+file = sa.table(
+    "file",
+    sa.column("pk", sa.Integer()),
+    sa.column("content", sa.LargeBinary()),
+    sa.column("codec", sa.String()),
+    sa.column("size", sa.BigInteger()),
+)
+
+file_chunk = sa.table(
+    "file_chunk",
+    sa.column("file_pk", sa.Integer()),
+    sa.column("chunk_index", sa.Integer()),
+    sa.column("data", sa.LargeBinary()),
+    sa.column("codec", sa.String()),
+)
+
+
+def _decompress(data, codec):
+    # Files are compressed without byte-shuffling, by the codecs that were
+    # available when this revision was written
+    for name in reversed((codec or "none").split("+")):
+        if name == "zlib":
+            data = zlib.decompress(data)
+        elif name == "zstd":
+            import zstandard
+
+            data = zstandard.ZstdDecompressor().decompress(data)
+        elif name == "lz4":
+            import lz4.frame
+
+            data = lz4.frame.decompress(data)
+        elif name != "none":
+            raise ValueError(f"Unknown compression codec '{name}'")
+    return data
+
+
+def upgrade():
+    op.create_table(
+        "file_chunk",
+        sa.Column("pk", sa.Integer(), nullable=False),
+        sa.Column("file_pk", sa.Integer(), nullable=False),
+        sa.Column("chunk_index", sa.Integer(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("codec", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["file_pk"],
+            ["file.pk"],
+        ),
+        sa.PrimaryKeyConstraint("pk"),
+        sa.UniqueConstraint("file_pk", "chunk_index"),
+    )
+    op.create_index(
+        op.f("ix_file_chunk_file_pk"), "file_chunk", ["file_pk"], unique=False
+    )
+    op.add_column("file", sa.Column("size", sa.BigInteger(), nullable=True))
+
+    # Existing content is kept as it is, as a single chunk
+    conn = op.get_bind()
+    rows = conn.execution_options(stream_results=True).execute(
+        sa.select(file.c.pk, file.c.content, file.c.codec).where(file.c.content != None)
+    )
+    for pk, content, codec in rows:
+        conn.execute(
+            file_chunk.insert().values(
+                file_pk=pk, chunk_index=0, data=content, codec=codec
+            )
+        )
+        conn.execute(
+            file.update()
+            .where(file.c.pk == pk)
+            .values(size=len(_decompress(content, codec)))
+        )
+
+    op.drop_column("file", "codec")
+    op.drop_column("file", "content")
+
+
+def downgrade():
+    op.add_column("file", sa.Column("content", sa.LargeBinary(), nullable=True))
+    op.add_column("file", sa.Column("codec", sa.String(), nullable=True))
+
+    conn = op.get_bind()
+    files = conn.execution_options(stream_results=True).execute(
+        sa.select(file.c.pk).where(file.c.size != None)
+    )
+    for (pk,) in files:
+        chunks = conn.execute(
+            sa.select(file_chunk.c.data, file_chunk.c.codec)
+            .where(file_chunk.c.file_pk == pk)
+            .order_by(file_chunk.c.chunk_index)
+        )
+        content = b"".join(_decompress(data, codec) for data, codec in chunks)
+        conn.execute(file.update().where(file.c.pk == pk).values(content=content))
+
+    op.drop_column("file", "size")
+    op.drop_index(op.f("ix_file_chunk_file_pk"), table_name="file_chunk")
+    op.drop_table("file_chunk")
@@ -0,0 +1,151 @@
+"""Split f64_matrix into tiles
+
+Revision ID: 3957807d584b
+Revises: 843fe8f429b5
+Create Date: 2026-10-18 11:02:17.530114
+
+"""
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3957807d584b"
+down_revision = "843fe8f429b5"
+branch_labels = None
+depends_on = None
+
+
+TILE_ROWS = 32
+TILE_SIZE = 2**15
+
+
+f64_matrix = sa.table(
+    "f64_matrix",
+    sa.column("pk", sa.Integer()),
+    sa.column("data", sa.LargeBinary()),
+    sa.column("dtype", sa.String()),
+    sa.column("shape", sa.ARRAY(sa.Integer())),
+    sa.column("tile_rows", sa.Integer()),
+    sa.column("tile_columns", sa.Integer()),
+)
+
+f64_matrix_tile = sa.table(
+    "f64_matrix_tile",
+    sa.column("f64_matrix_pk", sa.Integer()),
+    sa.column("row", sa.Integer()),
+    sa.column("column", sa.Integer()),
+    sa.column("data", sa.LargeBinary()),
+)
+
+
+def _shape_2d(shape):
+    if len(shape) == 0:
+        return 1, 1
+    if len(shape) == 1:
+        return 1, shape[0]
+    return shape[0], int(np.prod(shape[1:], dtype=np.int64))
+
+
+def upgrade():
+    op.create_table(
+        "f64_matrix_tile",
+        sa.Column("pk", sa.Integer(), nullable=False),
+        sa.Column("f64_matrix_pk", sa.Integer(), nullable=False),
+        sa.Column("row", sa.Integer(), nullable=False),
+        sa.Column("column", sa.Integer(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["f64_matrix_pk"],
+            ["f64_matrix.pk"],
+        ),
+        sa.PrimaryKeyConstraint("pk"),
+        sa.UniqueConstraint("f64_matrix_pk", "row", "column"),
+    )
+    op.create_index(
+        op.f("ix_f64_matrix_tile_f64_matrix_pk"),
+        "f64_matrix_tile",
+        ["f64_matrix_pk"],
+        unique=False,
+    )
+    op.add_column("f64_matrix", sa.Column("tile_rows", sa.Integer(), nullable=True))
+    op.add_column("f64_matrix", sa.Column("tile_columns", sa.Integer(), nullable=True))
+
+    conn = op.get_bind()
+    rows = conn.execution_options(stream_results=True).execute(
+        sa.select(
+            f64_matrix.c.pk, f64_matrix.c.data, f64_matrix.c.dtype, f64_matrix.c.shape
+        )
+    )
+    for pk, data, dtype, shape in rows:
+        matrix = np.frombuffer(data, dtype=dtype).reshape(_shape_2d(shape))
+        tile_rows = max(1, min(TILE_ROWS, matrix.shape[0]))
+        tile_columns = max(1, TILE_SIZE // tile_rows)
+
+        tiles = []
+        for row in range(0, matrix.shape[0], tile_rows):
+            for column in range(0, matrix.shape[1], tile_columns):
+                tile = matrix[row : row + tile_rows, column : column + tile_columns]
+                tiles.append(
+                    dict(
+                        f64_matrix_pk=pk,
+                        row=row // tile_rows,
+                        column=column // tile_columns,
+                        data=np.ascontiguousarray(tile).tobytes(),
+                    )
+                )
+        if tiles:
+            conn.execute(f64_matrix_tile.insert(), tiles)
+        conn.execute(
+            f64_matrix.update()
+            .where(f64_matrix.c.pk == pk)
+            .values(tile_rows=tile_rows, tile_columns=tile_columns)
+        )
+
+    op.alter_column("f64_matrix", "tile_rows", nullable=False)
+    op.alter_column("f64_matrix", "tile_columns", nullable=False)
+    op.drop_column("f64_matrix", "data")
+
+
+def downgrade():
+    op.add_column("f64_matrix", sa.Column("data", sa.LargeBinary(), nullable=True))
+
+    conn = op.get_bind()
+    matrices = conn.execution_options(stream_results=True).execute(
+        sa.select(
+            f64_matrix.c.pk,
+            f64_matrix.c.dtype,
+            f64_matrix.c.shape,
+            f64_matrix.c.tile_rows,
+            f64_matrix.c.tile_columns,
+        )
+    )
+    for pk, dtype, shape, tile_rows, tile_columns in matrices:
+        matrix = np.empty(_shape_2d(shape), dtype=dtype)
+        tiles = conn.execute(
+            sa.select(
+                f64_matrix_tile.c.row, f64_matrix_tile.c.column, f64_matrix_tile.c.data
+            ).where(f64_matrix_tile.c.f64_matrix_pk == pk)
+        )
+        for row, column, data in tiles:
+            row *= tile_rows
+            column *= tile_columns
+            height = min(tile_rows, matrix.shape[0] - row)
+            width = min(tile_columns, matrix.shape[1] - column)
+            matrix[row : row + height, column : column + width] = np.frombuffer(
+                data, dtype=dtype
+            ).reshape(height, width)
+        conn.execute(
+            f64_matrix.update()
+            .where(f64_matrix.c.pk == pk)
+            .values(data=matrix.tobytes())
+        )
+
+    op.alter_column("f64_matrix", "data", nullable=False)
+    op.drop_column("f64_matrix", "tile_columns")
+    op.drop_column("f64_matrix", "tile_rows")
+    op.drop_index(
+        op.f("ix_f64_matrix_tile_f64_matrix_pk"), table_name="f64_matrix_tile"
+    )
+    op.drop_table("f64_matrix_tile")
@@ -0,0 +1,24 @@
+"""Add file.local_blob
+
+Revision ID: 5f2d8e6a9c31
+Revises: b1a0c2f7e4d9
+Create Date: 2026-10-18 14:27:51.883410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5f2d8e6a9c31"
+down_revision = "b1a0c2f7e4d9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("file", sa.Column("local_blob", sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("file", "local_blob")
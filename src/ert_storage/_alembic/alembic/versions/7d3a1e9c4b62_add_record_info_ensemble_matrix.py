@@ -0,0 +1,52 @@
+"""Add ensemble matrix to record info
+
+Revision ID: 7d3a1e9c4b62
+Revises: 0c4f9b7e2d56
+Create Date: 2026-10-18 18:21:06.412587
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7d3a1e9c4b62"
+down_revision = "0c4f9b7e2d56"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "record_info", sa.Column("ensemble_matrix_pk", sa.Integer(), nullable=True)
+    )
+    op.add_column(
+        "record_info",
+        sa.Column(
+            "ensemble_matrix_realizations", sa.ARRAY(sa.Integer()), nullable=True
+        ),
+    )
+    op.add_column(
+        "record_info",
+        sa.Column("ensemble_matrix_sources", sa.ARRAY(sa.Integer()), nullable=True),
+    )
+    op.create_foreign_key(
+        "record_info_ensemble_matrix_pk_fkey",
+        "record_info",
+        "f64_matrix",
+        ["ensemble_matrix_pk"],
+        ["pk"],
+    )
+
+
+def downgrade():
+    # The stacked matrices are only referred to by the record infos
+    matrix_pks = "SELECT ensemble_matrix_pk FROM record_info"
+    op.drop_constraint(
+        "record_info_ensemble_matrix_pk_fkey", "record_info", type_="foreignkey"
+    )
+    op.execute(f"DELETE FROM f64_matrix_tile WHERE f64_matrix_pk IN ({matrix_pks})")
+    op.execute(f"DELETE FROM f64_matrix WHERE pk IN ({matrix_pks})")
+    op.drop_column("record_info", "ensemble_matrix_sources")
+    op.drop_column("record_info", "ensemble_matrix_realizations")
+    op.drop_column("record_info", "ensemble_matrix_pk")
@@ -0,0 +1,82 @@
+"""Store f64_matrix as binary
+
+Revision ID: 843fe8f429b5
+Revises: abccdeea2826
+Create Date: 2026-10-18 09:12:44.318205
+
+"""
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "843fe8f429b5"
+down_revision = "abccdeea2826"
+branch_labels = None
+depends_on = None
+
+
+F64_DTYPE = "<f8"
+
+
+f64_matrix = sa.table(
+    "f64_matrix",
+    sa.column("pk", sa.Integer()),
+    sa.column("content", sa.ARRAY(sa.FLOAT())),
+    sa.column("data", sa.LargeBinary()),
+    sa.column("dtype", sa.String()),
+    sa.column("shape", sa.ARRAY(sa.Integer())),
+)
+
+
+def upgrade():
+    op.add_column("f64_matrix", sa.Column("data", sa.LargeBinary(), nullable=True))
+    op.add_column("f64_matrix", sa.Column("dtype", sa.String(), nullable=True))
+    op.add_column(
+        "f64_matrix", sa.Column("shape", sa.ARRAY(sa.Integer()), nullable=True)
+    )
+
+    conn = op.get_bind()
+    # Don't lose the least significant digits when reading float8[] as text
+    conn.execute(sa.text("SET extra_float_digits=3"))
+    rows = conn.execution_options(stream_results=True).execute(
+        sa.select(f64_matrix.c.pk, f64_matrix.c.content)
+    )
+    for pk, content in rows:
+        array = np.ascontiguousarray(content, dtype=F64_DTYPE)
+        conn.execute(
+            f64_matrix.update()
+            .where(f64_matrix.c.pk == pk)
+            .values(data=array.tobytes(), dtype=F64_DTYPE, shape=list(array.shape))
+        )
+
+    op.alter_column("f64_matrix", "data", nullable=False)
+    op.alter_column("f64_matrix", "dtype", nullable=False)
+    op.alter_column("f64_matrix", "shape", nullable=False)
+    op.drop_column("f64_matrix", "content")
+
+
+def downgrade():
+    op.add_column(
+        "f64_matrix", sa.Column("content", sa.ARRAY(sa.FLOAT()), nullable=True)
+    )
+
+    conn = op.get_bind()
+    rows = conn.execution_options(stream_results=True).execute(
+        sa.select(
+            f64_matrix.c.pk, f64_matrix.c.data, f64_matrix.c.dtype, f64_matrix.c.shape
+        )
+    )
+    for pk, data, dtype, shape in rows:
+        array = np.frombuffer(data, dtype=dtype).reshape(shape)
+        conn.execute(
+            f64_matrix.update()
+            .where(f64_matrix.c.pk == pk)
+            .values(content=array.tolist())
+        )
+
+    op.alter_column("f64_matrix", "content", nullable=False)
+    op.drop_column("f64_matrix", "shape")
+    op.drop_column("f64_matrix", "dtype")
+    op.drop_column("f64_matrix", "data")
@@ -0,0 +1,159 @@
+"""Move matrix labels into label sets
+
+Revision ID: a6c2e4f81d37
+Revises: 7d3a1e9c4b62
+Create Date: 2026-10-18 19:43:51.208736
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a6c2e4f81d37"
+down_revision = "7d3a1e9c4b62"
+branch_labels = None
+depends_on = None
+
+
+f64_matrix = sa.table(
+    "f64_matrix",
+    sa.column("pk", sa.Integer()),
+    sa.column("labels", sa.PickleType()),
+    sa.column("column_label_set_pk", sa.Integer()),
+    sa.column("row_label_set_pk", sa.Integer()),
+)
+
+label_set = sa.table(
+    "label_set",
+    sa.column("pk", sa.Integer()),
+    sa.column("content_hash", sa.String()),
+    sa.column("labels", sa.PickleType()),
+)
+
+label = sa.table(
+    "label",
+    sa.column("label_set_pk", sa.Integer()),
+    sa.column("position", sa.Integer()),
+    sa.column("name", sa.String()),
+)
+
+
+def upgrade():
+    op.create_table(
+        "label_set",
+        sa.Column("pk", sa.Integer(), nullable=False),
+        sa.Column("content_hash", sa.String(), nullable=False),
+        sa.Column("labels", sa.PickleType(), nullable=False),
+        sa.PrimaryKeyConstraint("pk"),
+    )
+    op.create_index(
+        op.f("ix_label_set_content_hash"), "label_set", ["content_hash"], unique=False
+    )
+    op.create_table(
+        "label",
+        sa.Column("pk", sa.Integer(), nullable=False),
+        sa.Column("label_set_pk", sa.Integer(), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(["label_set_pk"], ["label_set.pk"]),
+        sa.PrimaryKeyConstraint("pk"),
+    )
+    op.create_index(
+        "ix_label_label_set_pk_name", "label", ["label_set_pk", "name"], unique=False
+    )
+    for axis in ("column", "row"):
+        op.add_column(
+            "f64_matrix",
+            sa.Column(f"{axis}_label_set_pk", sa.Integer(), nullable=True),
+        )
+        op.create_index(
+            op.f(f"ix_f64_matrix_{axis}_label_set_pk"),
+            "f64_matrix",
+            [f"{axis}_label_set_pk"],
+            unique=False,
+        )
+        op.create_foreign_key(
+            f"f64_matrix_{axis}_label_set_pk_fkey",
+            "f64_matrix",
+            "label_set",
+            [f"{axis}_label_set_pk"],
+            ["pk"],
+        )
+
+    conn = op.get_bind()
+    label_set_pks = {}
+
+    def get_label_set_pk(labels):
+        labels = list(labels)
+        key = repr(labels)
+        if key not in label_set_pks:
+            label_set_pks[key] = conn.execute(
+                label_set.insert()
+                .values(
+                    content_hash=hashlib.sha256(key.encode()).hexdigest(),
+                    labels=labels,
+                )
+                .returning(label_set.c.pk)
+            ).scalar()
+            entries = [
+                dict(label_set_pk=label_set_pks[key], position=position, name=name)
+                for position, name in enumerate(labels)
+                if isinstance(name, str)
+            ]
+            if entries:
+                conn.execute(label.insert(), entries)
+        return label_set_pks[key]
+
+    matrices = conn.execute(
+        sa.select(f64_matrix.c.pk, f64_matrix.c.labels).where(
+            f64_matrix.c.labels != None
+        )
+    ).fetchall()
+    for pk, (columns, rows) in matrices:
+        conn.execute(
+            f64_matrix.update()
+            .where(f64_matrix.c.pk == pk)
+            .values(
+                column_label_set_pk=get_label_set_pk(columns),
+                row_label_set_pk=get_label_set_pk(rows) if rows is not None else None,
+            )
+        )
+
+    op.drop_column("f64_matrix", "labels")
+
+
+def downgrade():
+    op.add_column("f64_matrix", sa.Column("labels", sa.PickleType(), nullable=True))
+
+    conn = op.get_bind()
+    columns = label_set.alias("columns")
+    rows = label_set.alias("rows")
+    matrices = conn.execute(
+        sa.select(f64_matrix.c.pk, columns.c.labels, rows.c.labels).select_from(
+            f64_matrix.join(
+                columns, columns.c.pk == f64_matrix.c.column_label_set_pk
+            ).outerjoin(rows, rows.c.pk == f64_matrix.c.row_label_set_pk)
+        )
+    ).fetchall()
+    for pk, column_labels, row_labels in matrices:
+        conn.execute(
+            f64_matrix.update()
+            .where(f64_matrix.c.pk == pk)
+            .values(labels=[column_labels, row_labels])
+        )
+
+    for axis in ("row", "column"):
+        op.drop_constraint(
+            f"f64_matrix_{axis}_label_set_pk_fkey", "f64_matrix", type_="foreignkey"
+        )
+        op.drop_index(
+            op.f(f"ix_f64_matrix_{axis}_label_set_pk"), table_name="f64_matrix"
+        )
+        op.drop_column("f64_matrix", f"{axis}_label_set_pk")
+    op.drop_index("ix_label_label_set_pk_name", table_name="label")
+    op.drop_table("label")
+    op.drop_index(op.f("ix_label_set_content_hash"), table_name="label_set")
+    op.drop_table("label_set")
@@ -0,0 +1,26 @@
+"""Add codec columns
+
+Revision ID: b1a0c2f7e4d9
+Revises: 3957807d584b
+Create Date: 2026-10-18 13:41:05.201873
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b1a0c2f7e4d9"
+down_revision = "3957807d584b"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("f64_matrix_tile", sa.Column("codec", sa.String(), nullable=True))
+    op.add_column("file", sa.Column("codec", sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("file", "codec")
+    op.drop_column("f64_matrix_tile", "codec")
@@ -0,0 +1,46 @@
+"""Add content hash and reference count to payloads
+
+Revision ID: e83b5c0d4a17
+Revises: 5f2d8e6a9c31
+Create Date: 2026-10-18 15:09:32.640117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e83b5c0d4a17"
+down_revision = "5f2d8e6a9c31"
+branch_labels = None
+depends_on = None
+
+
+PAYLOADS = [("file", "file_pk"), ("f64_matrix", "f64_matrix_pk")]
+
+
+def upgrade():
+    for table, column in PAYLOADS:
+        op.add_column(table, sa.Column("content_hash", sa.String(), nullable=True))
+        op.add_column(
+            table,
+            sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+        )
+        op.alter_column(table, "ref_count", server_default=None)
+        op.create_index(
+            op.f(f"ix_{table}_content_hash"), table, ["content_hash"], unique=False
+        )
+
+        # Existing payloads are never shared, so count the records referring to
+        # them. They have no content hash and are therefore never deduplicated.
+        op.execute(
+            f"UPDATE {table} SET ref_count = "
+            f"(SELECT count(*) FROM record WHERE record.{column} = {table}.pk)"
+        )
+
+
+def downgrade():
+    for table, _ in PAYLOADS:
+        op.drop_index(op.f(f"ix_{table}_content_hash"), table_name=table)
+        op.drop_column(table, "ref_count")
+        op.drop_column(table, "content_hash")
@@ -61,6 +61,13 @@ async def initialize_database() -> None:
         await create_container_if_not_exist()
 
 
+@app.on_event("shutdown")
+def shutdown_codec_pool() -> None:
+    from ert_storage.endpoints._codec_pool import codec_pool
+
+    codec_pool.shutdown()
+
+
 @app.exception_handler(NoResultFound)
 async def sqlalchemy_exception_handler(
     request: Request, exc: NoResultFound
@@ -0,0 +1,100 @@
+"""
+Compression of payloads that are stored in the RDBMS.
+
+A codec is a string of filters joined by '+', which are applied from left to
+right when compressing and from right to left when decompressing. Eg.
+"shuffle+zstd" first byte-shuffles the data and then compresses it with
+Zstandard. The codec is stored alongside each payload, so that data written with
+one codec can always be read back after the configured codec has changed. NULL
+and "none" both mean that the payload is stored as-is.
+
+Byte-shuffling groups the n-th byte of every element together, which makes
+arrays of floating point numbers much more compressible.
+"""
+import zlib
+from typing import Callable, Dict, Optional, Tuple, Union
+
+import numpy as np
+
+
+Buffer = Union[bytes, memoryview]
+_Compressor = Tuple[Callable[[Buffer], bytes], Callable[[Buffer], bytes]]
+
+NO_CODEC = "none"
+SHUFFLE = "shuffle"
+
+
+COMPRESSORS: Dict[str, _Compressor] = {
+    "zlib": (lambda data: zlib.compress(data, 1), zlib.decompress),
+}
+
+try:
+    import zstandard
+
+    COMPRESSORS["zstd"] = (
+        lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+except ImportError:
+    pass
+
+try:
+    import lz4.frame
+
+    COMPRESSORS["lz4"] = (lz4.frame.compress, lz4.frame.decompress)
+except ImportError:
+    pass
+
+
+def file_codec(codec: str) -> str:
+    """
+    Codec for opaque files, which have no element size to shuffle by
+    """
+    names = [name for name in codec.split("+") if name != SHUFFLE]
+    return "+".join(names) or NO_CODEC
+
+
+def check_codec(codec: str) -> None:
+    """
+    Raise a ValueError if the codec is not supported in this environment
+    """
+    for name in codec.split("+"):
+        if name not in (NO_CODEC, SHUFFLE) and name not in COMPRESSORS:
+            raise ValueError(
+                f"Unknown compression codec '{name}'. "
+                f"Available codecs are: {', '.join([NO_CODEC, *COMPRESSORS])}"
+            )
+
+
+def compress(data: Buffer, codec: Optional[str], itemsize: int = 1) -> Buffer:
+    if codec is None or codec == NO_CODEC:
+        return data
+    for name in codec.split("+"):
+        if name == SHUFFLE:
+            data = _shuffle(data, itemsize)
+        elif name != NO_CODEC:
+            data = COMPRESSORS[name][0](data)
+    return data
+
+
+def decompress(data: Buffer, codec: Optional[str], itemsize: int = 1) -> Buffer:
+    if codec is None or codec == NO_CODEC:
+        return data
+    for name in reversed(codec.split("+")):
+        if name == SHUFFLE:
+            data = _unshuffle(data, itemsize)
+        elif name != NO_CODEC:
+            data = COMPRESSORS[name][1](data)
+    return data
+
+
+def _shuffle(data: Buffer, itemsize: int) -> bytes:
+    return np.transpose(
+        np.frombuffer(data, dtype=np.uint8).reshape(-1, itemsize)
+    ).tobytes()
+
+
+def _unshuffle(data: Buffer, itemsize: int) -> bytes:
+    return np.transpose(
+        np.frombuffer(data, dtype=np.uint8).reshape(itemsize, -1)
+    ).tobytes()
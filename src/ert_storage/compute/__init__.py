@@ -1 +1,5 @@
-from .misfits import calculate_misfits_from_pandas
+from .misfits import (
+    calculate_misfits,
+    calculate_misfits_from_pandas,
+    observed_columns,
+)
@@ -1,15 +1,36 @@
 import numpy as np
 import pandas as pd
 from uuid import UUID
-from typing import Any, Mapping, List, Optional
+from typing import Any, Mapping, List, Optional, Sequence
 
 
 def _calculate_misfit(
     obs_value: np.ndarray, response_value: np.ndarray, obs_std: np.ndarray
-) -> List[float]:
+) -> np.ndarray:
     difference = response_value - obs_value
     misfit = (difference / obs_std) ** 2
-    return (misfit * np.sign(difference)).tolist()
+    return misfit * np.sign(difference)
+
+
+def calculate_misfits(
+    responses: np.ndarray,
+    realizations: Sequence[Optional[int]],
+    observation: pd.DataFrame,
+    summary_misfits: bool = False,
+) -> pd.DataFrame:
+    """
+    Compute misfits from the responses of the given realizations, stacked into a
+    (realization, observation) array whose columns are the responses at the
+    observation index, and the observation
+    """
+    misfits = _calculate_misfit(
+        observation["values"].values, responses, observation["errors"].values
+    )
+    if summary_misfits:
+        return pd.DataFrame(
+            np.abs(misfits).sum(axis=1), index=list(realizations), columns=[0]
+        )
+    return pd.DataFrame(misfits, index=list(realizations), columns=observation.index)
 
 
 def calculate_misfits_from_pandas(
@@ -21,15 +42,35 @@ def calculate_misfits_from_pandas(
     Compute misfits from reponses_dict (real_id, values in dataframe)
     and observation
     """
-    misfits_dict = {}
-    for realization_index in reponses_dict:
-        misfits_dict[realization_index] = _calculate_misfit(
-            observation["values"],
-            reponses_dict[realization_index].loc[:, observation.index].values.flatten(),
-            observation["errors"],
+    responses = list(reponses_dict.values())
+    if not responses:
+        stacked = np.empty((0, len(observation)))
+    elif all(response.columns.equals(responses[0].columns) for response in responses):
+        # The observed columns are looked up once when all the responses have
+        # the same columns, which they usually do
+        stacked = np.concatenate([response.values for response in responses])
+        stacked = stacked[:, observed_columns(responses[0].columns, observation)]
+    else:
+        stacked = np.concatenate(
+            [
+                response.values[:, observed_columns(response.columns, observation)]
+                for response in responses
+            ]
         )
+    if len(stacked) != len(responses):
+        raise ValueError("Responses must have a single row per realization")
+    return calculate_misfits(stacked, list(reponses_dict), observation, summary_misfits)
 
-    df = pd.DataFrame(data=misfits_dict, index=observation.index)
-    if summary_misfits:
-        df = pd.DataFrame([df.abs().sum(axis=0)], columns=df.columns, index=[0])
-    return df.T
+
+def observed_columns(columns: Sequence[Any], observation: pd.DataFrame) -> np.ndarray:
+    """
+    Positions of the response columns at the observation index
+    """
+    positions = pd.Index(columns).get_indexer_for(observation.index)
+    if (positions < 0).any():
+        raise KeyError(
+            f"{list(observation.index[positions < 0])} not in the response columns"
+        )
+    if len(positions) != len(observation):
+        raise ValueError("Observed response columns must be unique")
+    return positions
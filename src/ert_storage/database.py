@@ -1,5 +1,6 @@
 import os
-from typing import Any, Callable
+from pathlib import Path
+from typing import Any, Callable, Optional
 
 from fastapi import Depends
 from sqlalchemy import create_engine
@@ -8,11 +9,15 @@ from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.orm import Session as SessionType
 from sqlalchemy.sql import text
 
+from ert_storage.compression import check_codec
 from ert_storage.security import security
 
 ENV_RDBMS = "ERT_STORAGE_DATABASE_URL"
 ENV_BLOB = "ERT_STORAGE_AZURE_CONNECTION_STRING"
 ENV_BLOB_CONTAINER = "ERT_STORAGE_AZURE_BLOB_CONTAINER"
+ENV_LOCAL_BLOB = "ERT_STORAGE_LOCAL_BLOB_PATH"
+ENV_COMPRESSION = "ERT_STORAGE_COMPRESSION"
+ENV_MAX_CHUNK_SIZE = "ERT_STORAGE_MAX_CHUNK_SIZE"
 
 
 def get_env_rdbms() -> str:
@@ -21,11 +26,35 @@ def get_env_rdbms() -> str:
     return os.environ[ENV_RDBMS]
 
 
+def get_env_compression() -> str:
+    compression = os.getenv(ENV_COMPRESSION, "none")
+    try:
+        check_codec(compression)
+    except ValueError as exc:
+        raise EnvironmentError(f"Environment variable '{ENV_COMPRESSION}': {exc}")
+    return compression
+
+
+def get_env_max_chunk_size() -> int:
+    max_chunk_size = os.getenv(ENV_MAX_CHUNK_SIZE, str(2**22))
+    if not max_chunk_size.isdigit() or int(max_chunk_size) <= 0:
+        raise EnvironmentError(
+            f"Environment variable '{ENV_MAX_CHUNK_SIZE}' must be a positive number of bytes"
+        )
+    return int(max_chunk_size)
+
+
 URI_RDBMS = get_env_rdbms()
 IS_SQLITE = URI_RDBMS.startswith("sqlite")
 IS_POSTGRES = URI_RDBMS.startswith("postgres")
 HAS_AZURE_BLOB_STORAGE = ENV_BLOB in os.environ
 BLOB_CONTAINER = os.getenv(ENV_BLOB_CONTAINER, "ert")
+HAS_LOCAL_BLOB_STORAGE = ENV_LOCAL_BLOB in os.environ
+LOCAL_BLOB_PATH: Optional[Path] = (
+    Path(os.environ[ENV_LOCAL_BLOB]).resolve() if HAS_LOCAL_BLOB_STORAGE else None
+)
+COMPRESSION = get_env_compression()
+MAX_CHUNK_SIZE = get_env_max_chunk_size()
 
 
 if IS_SQLITE:
@@ -38,7 +67,10 @@ Session: Callable = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
-async def get_db(*, _: None = Depends(security)) -> Any:
+def get_db(*, _: None = Depends(security)) -> Any:
+    # This is a regular generator, so that FastAPI opens and commits the session
+    # in its thread pool instead of blocking the event loop. Endpoints that are
+    # coroutines should likewise run their queries with `run_in_threadpool`.
     db = Session()
 
     # Make PostgreSQL return float8 columns with highest precision. If we don't
@@ -62,7 +94,10 @@ if HAS_AZURE_BLOB_STORAGE:
     from azure.storage.blob.aio import ContainerClient
 
     azure_blob_container = ContainerClient.from_connection_string(
-        os.environ[ENV_BLOB], BLOB_CONTAINER
+        os.environ[ENV_BLOB],
+        BLOB_CONTAINER,
+        max_block_size=MAX_CHUNK_SIZE,
+        max_single_put_size=MAX_CHUNK_SIZE,
     )
 
     async def create_container_if_not_exist() -> None:
@@ -1,5 +1,19 @@
 from .record_info import RecordInfo, RecordType, RecordClass
-from .record import Record, F64Matrix, File, FileBlock
+from .label_set import Label, LabelSet
+from .record import (
+    READ_BATCH_SIZE,
+    Record,
+    F64Matrix,
+    F64MatrixTile,
+    File,
+    FileBlock,
+    FileChunk,
+    find_duplicate,
+    load_matrix_payload,
+    read_matrices,
+    release_ensemble_matrix,
+    replace_ensemble_matrix,
+)
 from .ensemble import Ensemble
 from .experiment import Experiment
 from .observation import Observation, ObservationTransformation
@@ -0,0 +1,76 @@
+import hashlib
+from typing import Any, Dict, Iterable, Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.orm import deferred, object_session, relationship
+
+from ert_storage.database import Base
+
+
+class LabelSet(Base):
+    """
+    The labels along one axis of a matrix. Label sets are shared by all the
+    matrices with the same labels, eg. the columns of every realization of a
+    record, and are deleted together with the last matrix that refers to them.
+    """
+
+    __tablename__ = "label_set"
+
+    # Label sets are only shared when their labels are also equal
+    DEDUPLICATE_BY = ("labels",)
+
+    pk = sa.Column(sa.Integer, primary_key=True)
+    content_hash = sa.Column(sa.String, nullable=False, index=True)
+    labels = deferred(sa.Column(sa.PickleType, nullable=False))
+
+    entries = relationship(
+        "Label",
+        lazy="dynamic",
+        cascade="all, delete-orphan",
+        back_populates="label_set",
+    )
+
+    def __init__(self, labels: Sequence[Any]) -> None:
+        labels = list(labels)
+        super().__init__(
+            labels=labels,
+            content_hash=hashlib.sha256(repr(labels).encode()).hexdigest(),
+        )
+        # Only string labels can be looked up, as they are given by name in
+        # requests
+        self.entries = [
+            Label(position=position, name=label)
+            for position, label in enumerate(labels)
+            if isinstance(label, str)
+        ]
+
+    def positions(self, names: Iterable[str]) -> Dict[str, int]:
+        """
+        Positions of the first labels with the given names, found through the
+        index on the label table instead of by searching the labels. Names
+        that aren't labels are left out.
+        """
+        names = set(names)
+        if object_session(self) is None or self.pk is None:
+            positions: Dict[str, int] = {}
+            for entry in self.entries:
+                if entry.name in names:
+                    positions.setdefault(entry.name, entry.position)
+            return positions
+        return dict(
+            object_session(self)
+            .query(Label.name, sa.func.min(Label.position))
+            .filter(Label.label_set_pk == self.pk, Label.name.in_(names))
+            .group_by(Label.name)
+        )
+
+
+class Label(Base):
+    __tablename__ = "label"
+    __table_args__ = (sa.Index("ix_label_label_set_pk_name", "label_set_pk", "name"),)
+
+    pk = sa.Column(sa.Integer, primary_key=True)
+    label_set_pk = sa.Column(sa.Integer, sa.ForeignKey("label_set.pk"), nullable=False)
+    label_set = relationship("LabelSet", back_populates="entries")
+    position = sa.Column(sa.Integer, nullable=False)
+    name = sa.Column(sa.String, nullable=False)
@@ -1,18 +1,60 @@
-from typing import Any
+import hashlib
+import itertools
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
 from uuid import uuid4
 
+import numpy as np
 import sqlalchemy as sa
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import (
+    column_property,
+    deferred,
+    joinedload,
+    relationship,
+    object_session,
+    selectinload,
+    undefer,
+)
 from sqlalchemy.ext.hybrid import hybrid_property
 
-from ert_storage.ext.sqlalchemy_arrays import FloatArray
+from ert_storage.compression import Buffer, compress, decompress, file_codec
+from ert_storage.ext.sqlalchemy_arrays import IntArray
 from ert_storage.ext.uuid import UUID
-from ert_storage.database import Base
+from ert_storage.database import Base, COMPRESSION, MAX_CHUNK_SIZE
 
 from ._userdata_field import UserdataField
 from .observation import observation_record_association
-from .record_info import RecordType, RecordClass
+from .label_set import Label, LabelSet
+from .record_info import RecordInfo, RecordType, RecordClass
+
+
+# Matrices are stored as raw little-endian float64 bytes in C order, together
+# with their shape, independent of the machine's native byte order
+F64_DTYPE = "<f8"
+
+# Matrices are split into tiles of at most TILE_ROWS rows and TILE_SIZE
+# elements (256 KiB), so that a single realization or a single label can be read
+# without loading the whole matrix. Axes beyond the second are flattened into
+# the columns. Matrices with fewer rows get correspondingly wider tiles.
+TILE_ROWS = 32
+TILE_SIZE = 2**15
+
+Index = Union[None, slice, Sequence[int], np.ndarray]
+
+# Number of matrices whose tiles are fetched in each query by `read_matrices`,
+# to stay below the limit on the number of parameters in SQLite
+READ_BATCH_SIZE = 500
 
 
 class Record(Base, UserdataField):
@@ -35,8 +77,10 @@ class Record(Base, UserdataField):
     file_pk = sa.Column(sa.Integer, sa.ForeignKey("file.pk"))
     f64_matrix_pk = sa.Column(sa.Integer, sa.ForeignKey("f64_matrix.pk"))
 
-    file = relationship("File", cascade="all")
-    f64_matrix = relationship("F64Matrix", cascade="all")
+    # Payloads may be shared between records, and are deleted by
+    # _release_payloads once the last record referring to them is deleted
+    file = relationship("File", cascade="save-update, merge")
+    f64_matrix = relationship("F64Matrix", cascade="save-update, merge")
 
     observations = relationship(
         "Observation",
@@ -72,14 +116,20 @@ class Record(Base, UserdataField):
     def record_class(self) -> RecordClass:
         return self.record_info.record_class
 
-    @property
-    def has_observations(self) -> bool:
-        return len(self.observations) > 0
+    # Whether the record has observations, without loading the observations.
+    # Deferred, so that it is only queried by the endpoints that list it
+    has_observations = column_property(
+        sa.exists().where(observation_record_association.c.record_pk == pk),
+        deferred=True,
+    )
 
 
 class File(Base):
     __tablename__ = "file"
 
+    # Stored files are only shared between records when these are also equal
+    DEDUPLICATE_BY = ("filename", "mimetype", "local_blob")
+
     pk = sa.Column(sa.Integer, primary_key=True)
     id = sa.Column(UUID, unique=True, default=uuid4, nullable=False)
     time_created = sa.Column(sa.DateTime, server_default=func.now())
@@ -89,23 +139,616 @@ class File(Base):
 
     filename = sa.Column(sa.String, nullable=False)
     mimetype = sa.Column(sa.String, nullable=False)
+    content_hash = sa.Column(sa.String, index=True)
+    ref_count = sa.Column(sa.Integer, nullable=False, default=0)
+    size = sa.Column(sa.BigInteger)
 
-    content = sa.Column(sa.LargeBinary)
     az_container = sa.Column(sa.String)
     az_blob = sa.Column(sa.String)
+    local_blob = sa.Column(sa.String)
+
+    # Content of files stored in the database, split into chunks of at most
+    # MAX_CHUNK_SIZE bytes
+    chunks = relationship(
+        "FileChunk",
+        lazy="dynamic",
+        cascade="all, delete-orphan",
+        order_by="FileChunk.chunk_index",
+        back_populates="file",
+    )
+
+    @property
+    def content(self) -> Optional[bytes]:
+        if self.size is None:
+            return None
+        return b"".join(self.iter_content())
+
+    @content.setter
+    def content(self, value: Optional[bytes]) -> None:
+        if value is None:
+            self.chunks = []
+            self.content_hash = self.size = None
+            return
+        self.content_hash = hashlib.sha256(value).hexdigest()
+        self.size = len(value)
+        codec = file_codec(COMPRESSION)
+        view = memoryview(value)
+        self.chunks = [
+            FileChunk(
+                chunk_index=index,
+                data=bytes(compress(view[start : start + MAX_CHUNK_SIZE], codec)),
+                codec=codec,
+            )
+            for index, start in enumerate(range(0, len(value), MAX_CHUNK_SIZE))
+        ]
+
+    def iter_content(self) -> Iterator[Buffer]:
+        """
+        Iterate over the decompressed chunks of the content. The chunks are
+        fetched through a server-side cursor where the database supports it,
+        so that only one chunk at a time is held in memory.
+        """
+        session = object_session(self)
+        if session is None:
+            # Not yet persisted, so the chunks only exist in memory
+            chunks = [(chunk.data, chunk.codec) for chunk in self.chunks]
+        else:
+            chunks = (
+                session.query(FileChunk.data, FileChunk.codec)
+                .filter_by(file_pk=self.pk)
+                .order_by(FileChunk.chunk_index)
+                .execution_options(stream_results=True)
+                .yield_per(1)
+            )
+        for data, codec in chunks:
+            yield decompress(data, codec)
+
+    def write_chunks(self, chunks: Iterable[Buffer]) -> None:
+        """
+        Store the content given as an iterable of chunks of at most
+        MAX_CHUNK_SIZE bytes, inserting one chunk at a time, so that the content
+        is never held in memory. The file must have been flushed, and `size`
+        and `content_hash` must be set by the caller.
+        """
+        session = object_session(self)
+        codec = file_codec(COMPRESSION)
+        table = FileChunk.__table__
+        for index, chunk in enumerate(chunks):
+            session.execute(
+                table.insert(),
+                dict(
+                    file_pk=self.pk,
+                    chunk_index=index,
+                    data=bytes(compress(chunk, codec)),
+                    codec=codec,
+                ),
+            )
+
+
+class FileChunk(Base):
+    __tablename__ = "file_chunk"
+    __table_args__ = (sa.UniqueConstraint("file_pk", "chunk_index"),)
+
+    pk = sa.Column(sa.Integer, primary_key=True)
+    file_pk = sa.Column(
+        sa.Integer, sa.ForeignKey("file.pk"), nullable=False, index=True
+    )
+    file = relationship("File", back_populates="chunks")
+    chunk_index = sa.Column(sa.Integer, nullable=False)
+    data = deferred(sa.Column(sa.LargeBinary, nullable=False))
+    codec = sa.Column(sa.String, nullable=True)
 
 
 class F64Matrix(Base):
     __tablename__ = "f64_matrix"
 
+    # Stored matrices are only shared between records when these are also equal
+    DEDUPLICATE_BY = ("column_label_set_pk", "row_label_set_pk")
+
     pk = sa.Column(sa.Integer, primary_key=True)
     id = sa.Column(UUID, unique=True, default=uuid4, nullable=False)
     time_created = sa.Column(sa.DateTime, server_default=func.now())
     time_updated = sa.Column(
         sa.DateTime, server_default=func.now(), onupdate=func.now()
     )
-    content = sa.Column(FloatArray, nullable=False)
-    labels = sa.Column(sa.PickleType)
+    dtype = sa.Column(sa.String, nullable=False, default=F64_DTYPE)
+    shape = sa.Column(IntArray, nullable=False)
+    tile_rows = sa.Column(sa.Integer, nullable=False)
+    tile_columns = sa.Column(sa.Integer, nullable=False)
+    column_label_set_pk = sa.Column(
+        sa.Integer, sa.ForeignKey("label_set.pk"), nullable=True, index=True
+    )
+    column_label_set = relationship("LabelSet", foreign_keys=[column_label_set_pk])
+    row_label_set_pk = sa.Column(
+        sa.Integer, sa.ForeignKey("label_set.pk"), nullable=True, index=True
+    )
+    row_label_set = relationship("LabelSet", foreign_keys=[row_label_set_pk])
+    content_hash = sa.Column(sa.String, index=True)
+    ref_count = sa.Column(sa.Integer, nullable=False, default=0)
+
+    tiles = relationship(
+        "F64MatrixTile",
+        lazy="dynamic",
+        cascade="all, delete-orphan",
+        order_by="(F64MatrixTile.row, F64MatrixTile.column)",
+        back_populates="f64_matrix",
+    )
+
+    @property
+    def labels(self) -> Any:
+        """
+        The column and row labels, or None if the matrix isn't labeled
+        """
+        if self.column_label_set is None:
+            return None
+        rows = self.row_label_set
+        return [self.column_label_set.labels, rows.labels if rows else None]
+
+    @labels.setter
+    def labels(self, value: Optional[Sequence[Sequence[Any]]]) -> None:
+        columns, rows = value if value is not None else (None, None)
+        self.column_label_set = LabelSet(columns) if columns is not None else None
+        self.row_label_set = LabelSet(rows) if rows is not None else None
+
+    @property
+    def is_labeled(self) -> bool:
+        return self.column_label_set_pk is not None or self.column_label_set is not None
+
+    def column_positions(self, labels: Iterable[str]) -> Dict[str, int]:
+        """
+        Positions of the columns with the given labels, leaving out those that
+        aren't column labels
+        """
+        if self.column_label_set is None:
+            return {}
+        return self.column_label_set.positions(labels)
+
+    @property
+    def shape_2d(self) -> Tuple[int, int]:
+        """
+        Shape of the matrix as rows (realizations) and columns. A vector is a
+        single row, and any axes beyond the second are flattened into columns.
+        """
+        if len(self.shape) == 0:
+            return 1, 1
+        if len(self.shape) == 1:
+            return 1, self.shape[0]
+        return self.shape[0], int(np.prod(self.shape[1:], dtype=np.int64))
+
+    @property
+    def content(self) -> np.ndarray:
+        return self.read().reshape(self.shape)
+
+    @content.setter
+    def content(self, value: Any) -> None:
+        columns, tiles = self.encode(value)
+        for key, column_value in columns.items():
+            setattr(self, key, column_value)
+        self.tiles = [F64MatrixTile(**tile) for tile in tiles]
+
+    @staticmethod
+    def encode(value: Any) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Convert a matrix into the column values of an F64Matrix and of each of
+        its tiles, for when the rows are inserted without the ORM
+        """
+        array = np.ascontiguousarray(value, dtype=F64_DTYPE)
+        shape = np.shape(array)
+        if len(shape) == 0:
+            nrows, ncols = 1, 1
+        elif len(shape) == 1:
+            nrows, ncols = 1, shape[0]
+        else:
+            nrows, ncols = shape[0], int(np.prod(shape[1:]))
+        matrix = array.reshape(nrows, ncols)
+        tile_rows = max(1, min(TILE_ROWS, nrows))
+        tile_columns = max(1, TILE_SIZE // tile_rows)
+        tiles = _encode_tiles(matrix, tile_rows, tile_columns)
+
+        columns = dict(
+            dtype=F64_DTYPE,
+            shape=list(array.shape),
+            content_hash=_matrix_hash(array),
+            tile_rows=tile_rows,
+            tile_columns=tile_columns,
+        )
+        return columns, tiles
+
+    def read(self, rows: Index = None, columns: Index = None) -> np.ndarray:
+        """
+        Read the given rows and columns of the matrix as a 2-dimensional array,
+        fetching only the tiles that cover them. `rows` and `columns` can be
+        anything that NumPy accepts as an index into a 1-dimensional array.
+        """
+        selection = _MatrixSelection(self, rows, columns)
+        if selection.out.size > 0:
+            for tile in self._query_tiles(selection.row_groups, selection.col_groups):
+                selection.fill(tile)
+        return selection.out
+
+    def iter_row_buffers(
+        self, start: int = 0, stop: Optional[int] = None
+    ) -> Iterator[memoryview]:
+        """
+        Iterate over the C-ordered bytes of the rows in `[start, stop)`. When
+        the matrix fits in a single column of tiles and is not compressed, the
+        stored tile buffers are sliced without being copied.
+        """
+        nrows, ncols = self.shape_2d
+        start, stop, _ = slice(start, stop).indices(nrows)
+        if start >= stop or ncols == 0:
+            return
+
+        row_tiles = range(start // self.tile_rows, (stop - 1) // self.tile_rows + 1)
+        if ncols > self.tile_columns:
+            for row in row_tiles:
+                row_start = max(start, row * self.tile_rows)
+                row_stop = min(stop, (row + 1) * self.tile_rows)
+                rows = self.read(rows=slice(row_start, row_stop))
+                yield memoryview(rows.data).cast("B")
+            return
+
+        row_size = ncols * np.dtype(self.dtype).itemsize
+        row_groups = {row: None for row in row_tiles}
+        for tile in self._query_tiles(row_groups, {0: None}):
+            offset = tile.row * self.tile_rows
+            lo = max(start - offset, 0) * row_size
+            hi = (min(stop - offset, self.tile_rows)) * row_size
+            yield memoryview(self._tile_bytes(tile)).cast("B")[lo:hi]
+
+    def _tile_array(self, tile: "F64MatrixTile") -> np.ndarray:
+        nrows, ncols = self.shape_2d
+        height = min(self.tile_rows, nrows - tile.row * self.tile_rows)
+        width = min(self.tile_columns, ncols - tile.column * self.tile_columns)
+        return np.frombuffer(self._tile_bytes(tile), dtype=self.dtype).reshape(
+            height, width
+        )
+
+    def _tile_bytes(self, tile: "F64MatrixTile") -> Buffer:
+        return decompress(tile.data, tile.codec, np.dtype(self.dtype).itemsize)
+
+    def _query_tiles(
+        self, row_groups: Dict[int, Any], col_groups: Dict[int, Any]
+    ) -> Iterable["F64MatrixTile"]:
+        if object_session(self) is None:
+            # Not yet persisted, so the tiles only exist in memory
+            return [
+                tile
+                for tile in self.tiles
+                if tile.row in row_groups and tile.column in col_groups
+            ]
+
+        nrows, ncols = self.shape_2d
+        query = self.tiles.options(undefer(F64MatrixTile.data))
+        if len(row_groups) < _ceildiv(nrows, self.tile_rows):
+            query = query.filter(F64MatrixTile.row.in_(list(row_groups)))
+        if len(col_groups) < _ceildiv(ncols, self.tile_columns):
+            query = query.filter(F64MatrixTile.column.in_(list(col_groups)))
+        return query
+
+
+class F64MatrixTile(Base):
+    __tablename__ = "f64_matrix_tile"
+    __table_args__ = (sa.UniqueConstraint("f64_matrix_pk", "row", "column"),)
+
+    pk = sa.Column(sa.Integer, primary_key=True)
+    f64_matrix_pk = sa.Column(
+        sa.Integer, sa.ForeignKey("f64_matrix.pk"), nullable=False, index=True
+    )
+    f64_matrix = relationship("F64Matrix", back_populates="tiles")
+    row = sa.Column(sa.Integer, nullable=False)
+    column = sa.Column(sa.Integer, nullable=False)
+    data = deferred(sa.Column(sa.LargeBinary, nullable=False))
+    codec = sa.Column(sa.String, nullable=True)
+
+
+def read_matrices(
+    session: Any, selections: Sequence[Tuple[F64Matrix, Index, Index]]
+) -> List[np.ndarray]:
+    """
+    Like `F64Matrix.read` for each (matrix, rows, columns) selection, but
+    fetching the tiles of all the matrices with a single query per
+    READ_BATCH_SIZE matrices
+    """
+    outputs = [_MatrixSelection(*selection) for selection in selections]
+    by_pk: Dict[int, List[_MatrixSelection]] = {}
+    for output in outputs:
+        if output.out.size > 0:
+            by_pk.setdefault(output.matrix.pk, []).append(output)
+
+    # Only filter on the tile rows (columns) when some matrix is partially
+    # read, and then on the union of the tile rows (columns) of all of them
+    selected = list(itertools.chain.from_iterable(by_pk.values()))
+    tile_rows: Optional[List[int]] = None
+    tile_columns: Optional[List[int]] = None
+    if any(len(s.row_groups) < s.tile_count[0] for s in selected):
+        tile_rows = sorted({row for s in selected for row in s.row_groups})
+    if any(len(s.col_groups) < s.tile_count[1] for s in selected):
+        tile_columns = sorted({column for s in selected for column in s.col_groups})
+
+    pks = list(by_pk)
+    for start in range(0, len(pks), READ_BATCH_SIZE):
+        query = (
+            session.query(F64MatrixTile)
+            .options(undefer(F64MatrixTile.data))
+            .filter(
+                F64MatrixTile.f64_matrix_pk.in_(pks[start : start + READ_BATCH_SIZE])
+            )
+        )
+        if tile_rows is not None:
+            query = query.filter(F64MatrixTile.row.in_(tile_rows))
+        if tile_columns is not None:
+            query = query.filter(F64MatrixTile.column.in_(tile_columns))
+        for tile in query.yield_per(READ_BATCH_SIZE):
+            for output in by_pk[tile.f64_matrix_pk]:
+                output.fill(tile)
+    return [output.out for output in outputs]
+
+
+class _MatrixSelection:
+    """
+    The rows and columns to read from a matrix, grouped by the tiles that
+    contain them, and the array that the tiles are copied into
+    """
+
+    def __init__(self, matrix: F64Matrix, rows: Index, columns: Index) -> None:
+        nrows, ncols = matrix.shape_2d
+        row_index = np.arange(nrows)[rows if rows is not None else slice(None)]
+        col_index = np.arange(ncols)[columns if columns is not None else slice(None)]
+        self.matrix = matrix
+        self.row_index, self.col_index = np.atleast_1d(row_index, col_index)
+        self.row_groups = _group_by_tile(self.row_index, matrix.tile_rows)
+        self.col_groups = _group_by_tile(self.col_index, matrix.tile_columns)
+        self.tile_count = (
+            _ceildiv(nrows, matrix.tile_rows),
+            _ceildiv(ncols, matrix.tile_columns),
+        )
+        self.out = np.empty(
+            (self.row_index.size, self.col_index.size), dtype=matrix.dtype
+        )
+
+    def fill(self, tile: "F64MatrixTile") -> None:
+        if tile.row not in self.row_groups or tile.column not in self.col_groups:
+            return
+        row_pos = self.row_groups[tile.row]
+        col_pos = self.col_groups[tile.column]
+        array = self.matrix._tile_array(tile)
+        self.out[np.ix_(row_pos, col_pos)] = array[
+            np.ix_(
+                self.row_index[row_pos] - tile.row * self.matrix.tile_rows,
+                self.col_index[col_pos] - tile.column * self.matrix.tile_columns,
+            )
+        ]
+
+
+def _encode_tiles(
+    matrix: np.ndarray, tile_rows: int, tile_columns: int
+) -> List[Dict[str, Any]]:
+    """
+    Split a 2-dimensional matrix into compressed tiles
+    """
+    nrows, ncols = np.shape(matrix)
+    tiles = []
+    for row in range(_ceildiv(nrows, tile_rows)):
+        row_start = row * tile_rows
+        for column in range(_ceildiv(ncols, tile_columns)):
+            column_start = column * tile_columns
+            tile = matrix[
+                row_start : row_start + tile_rows,
+                column_start : column_start + tile_columns,
+            ]
+            tiles.append(
+                dict(
+                    row=row,
+                    column=column,
+                    data=compress(
+                        np.ascontiguousarray(tile).tobytes(),
+                        COMPRESSION,
+                        matrix.itemsize,
+                    ),
+                    codec=COMPRESSION,
+                )
+            )
+    return tiles
+
+
+def _matrix_hash(array: np.ndarray) -> str:
+    sha256 = hashlib.sha256(
+        f"{np.dtype(array.dtype).str}{list(np.shape(array))}".encode()
+    )
+    # Viewed as flat bytes, as memoryview can't cast arrays with an empty axis
+    sha256.update(np.ascontiguousarray(array).reshape(-1).view(np.uint8).data)
+    return sha256.hexdigest()
+
+
+@sa.event.listens_for(Record, "after_insert")
+def _retain_payloads(mapper: Any, connection: Any, record: Record) -> None:
+    for table, pk in _payload_tables(record):
+        connection.execute(
+            table.update()
+            .where(table.c.pk == pk)
+            .values(ref_count=table.c.ref_count + 1)
+        )
+
+
+@sa.event.listens_for(Record, "after_delete")
+def _release_payloads(mapper: Any, connection: Any, record: Record) -> None:
+    """
+    Decrement the reference counts of the record's payloads, and delete those
+    that are no longer referred to by any record
+    """
+    for table, pk in _payload_tables(record):
+        connection.execute(
+            table.update()
+            .where(table.c.pk == pk)
+            .values(ref_count=table.c.ref_count - 1)
+        )
+        ref_count = connection.execute(
+            sa.select(table.c.ref_count).where(table.c.pk == pk)
+        ).scalar()
+        if ref_count is not None and ref_count <= 0:
+            if table is F64Matrix.__table__:
+                _delete_matrix(connection, pk)
+            else:
+                chunks = FileChunk.__table__
+                connection.execute(chunks.delete().where(chunks.c.file_pk == pk))
+                connection.execute(table.delete().where(table.c.pk == pk))
+
+
+@sa.event.listens_for(Record, "after_delete")
+def _release_record_info_ensemble_matrix(
+    mapper: Any, connection: Any, record: Record
+) -> None:
+    if record.record_info_pk is not None:
+        release_ensemble_matrix(connection, record.record_info_pk)
+
+
+def release_ensemble_matrix(connection: Any, record_info_pk: int) -> None:
+    """
+    Delete the stacked forward-model records of a record info, if there are any
+    """
+    infos = RecordInfo.__table__
+    pk = connection.execute(
+        sa.select(infos.c.ensemble_matrix_pk).where(infos.c.pk == record_info_pk)
+    ).scalar()
+    if pk is None:
+        return
+
+    connection.execute(
+        infos.update()
+        .where(infos.c.pk == record_info_pk)
+        .values(
+            ensemble_matrix_pk=None,
+            ensemble_matrix_realizations=None,
+            ensemble_matrix_sources=None,
+        )
+    )
+    _delete_matrix(connection, pk)
+
+
+def replace_ensemble_matrix(
+    connection: Any,
+    record_info_pk: int,
+    old_pk: Optional[int],
+    new_pk: int,
+    realizations: List[int],
+    sources: List[int],
+) -> bool:
+    """
+    Replace the stacked forward-model records of a record info and delete the
+    old ones, but only if they are still `old_pk`. Returns whether they were
+    replaced.
+    """
+    infos = RecordInfo.__table__
+    current = infos.c.ensemble_matrix_pk
+    result = connection.execute(
+        infos.update()
+        .where(
+            infos.c.pk == record_info_pk,
+            current == None if old_pk is None else current == old_pk,
+        )
+        .values(
+            ensemble_matrix_pk=new_pk,
+            ensemble_matrix_realizations=realizations,
+            ensemble_matrix_sources=sources,
+        )
+    )
+    if result.rowcount != 1:
+        return False
+    if old_pk is not None:
+        _delete_matrix(connection, old_pk)
+    return True
+
+
+def _delete_matrix(connection: Any, pk: int) -> None:
+    """
+    Delete a matrix, its tiles, and the label sets that no other matrix refers to
+    """
+    matrices = F64Matrix.__table__
+    label_set_pks = connection.execute(
+        sa.select(matrices.c.column_label_set_pk, matrices.c.row_label_set_pk).where(
+            matrices.c.pk == pk
+        )
+    ).first()
+
+    tiles = F64MatrixTile.__table__
+    connection.execute(tiles.delete().where(tiles.c.f64_matrix_pk == pk))
+    connection.execute(matrices.delete().where(matrices.c.pk == pk))
+
+    for label_set_pk in set(label_set_pks or ()) - {None}:
+        in_use = connection.execute(
+            sa.select(matrices.c.pk)
+            .where(
+                (matrices.c.column_label_set_pk == label_set_pk)
+                | (matrices.c.row_label_set_pk == label_set_pk)
+            )
+            .limit(1)
+        ).first()
+        if in_use is None:
+            labels = Label.__table__
+            connection.execute(
+                labels.delete().where(labels.c.label_set_pk == label_set_pk)
+            )
+            label_sets = LabelSet.__table__
+            connection.execute(
+                label_sets.delete().where(label_sets.c.pk == label_set_pk)
+            )
+
+
+Payload = TypeVar("Payload", File, F64Matrix, LabelSet)
+
+
+def find_duplicate(session: Any, payload: Payload) -> Optional[Payload]:
+    """
+    Find an already stored payload with the same content hash as `payload`, and
+    with the same values for the attributes in its DEDUPLICATE_BY
+    """
+    cls = type(payload)
+    keys = cls.DEDUPLICATE_BY
+    with session.no_autoflush:
+        candidates = (
+            session.query(cls)
+            .options(sa.orm.load_only(*keys))
+            .filter_by(content_hash=payload.content_hash)
+            .all()
+        )
+    for candidate in candidates:
+        if all(getattr(candidate, key) == getattr(payload, key) for key in keys):
+            return candidate
+    return None
+
+
+def load_matrix_payload() -> Any:
+    """
+    Loader option for the endpoints that read records' data. It loads the
+    matrices of the records, and their column and row labels, which are
+    otherwise deferred so that listing records never reads them.
+    """
+    return joinedload(Record.f64_matrix).options(
+        selectinload(F64Matrix.column_label_set).undefer(LabelSet.labels),
+        selectinload(F64Matrix.row_label_set).undefer(LabelSet.labels),
+    )
+
+
+def _payload_tables(record: Record) -> Iterator[Tuple[sa.Table, int]]:
+    if record.file_pk is not None:
+        yield File.__table__, record.file_pk
+    if record.f64_matrix_pk is not None:
+        yield F64Matrix.__table__, record.f64_matrix_pk
+
+
+def _ceildiv(a: int, b: int) -> int:
+    return -(-a // b)
+
+
+def _group_by_tile(index: np.ndarray, tile_size: int) -> Dict[int, np.ndarray]:
+    """
+    Map each tile number to the positions in `index` that fall inside it
+    """
+    tile_index = index // tile_size
+    order = np.argsort(tile_index, kind="stable")
+    tiles, starts = np.unique(tile_index[order], return_index=True)
+    return dict(zip(tiles.tolist(), np.split(order, starts[1:])))
 
 
 class FileBlock(Base):
@@ -123,4 +766,4 @@ class FileBlock(Base):
     realization_index = sa.Column(sa.Integer, nullable=True)
     ensemble_pk = sa.Column(sa.Integer, sa.ForeignKey("ensemble.pk"), nullable=True)
     ensemble = relationship("Ensemble")
-    content = sa.Column(sa.LargeBinary, nullable=True)
+    content = deferred(sa.Column(sa.LargeBinary, nullable=True))
@@ -5,6 +5,7 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 from ert_storage.database import Base
+from ert_storage.ext.sqlalchemy_arrays import IntArray
 
 
 class RecordType(Enum):
@@ -44,3 +45,12 @@ class RecordInfo(Base):
     # Parameter-specific data
     prior_pk = sa.Column(sa.Integer, sa.ForeignKey("prior.pk"), nullable=True)
     prior = relationship("Prior")
+
+    # Forward-model records stacked by realization, and the realization and
+    # source matrix of each of its rows. See `endpoints/_records_cache.py`.
+    ensemble_matrix_pk = sa.Column(
+        sa.Integer, sa.ForeignKey("f64_matrix.pk"), nullable=True
+    )
+    ensemble_matrix = relationship("F64Matrix")
+    ensemble_matrix_realizations = sa.Column(IntArray, nullable=True)
+    ensemble_matrix_sources = sa.Column(IntArray, nullable=True)
@@ -0,0 +1,115 @@
+"""
+Pool of workers for the CPU-bound encoding and decoding of record data, eg.
+parsing an uploaded CSV or writing a Parquet response, so that large requests
+neither hold the event loop nor crowd out the threads that wait for the
+database.
+
+The pool is configured with the environment variables:
+
+- ERT_STORAGE_CODEC_POOL: 'thread' (default) or 'process'. Threads share the
+  data with the endpoints, while processes also run pure-Python encoders in
+  parallel at the cost of pickling the data both ways.
+- ERT_STORAGE_CODEC_WORKERS: the number of workers, by default the number of
+  CPUs.
+
+Functions run in the pool must be module-level, and their arguments, results
+and errors picklable, so that they work with either kind of pool.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+ENV_CODEC_POOL = "ERT_STORAGE_CODEC_POOL"
+ENV_CODEC_WORKERS = "ERT_STORAGE_CODEC_WORKERS"
+
+T = TypeVar("T")
+
+
+def get_env_codec_pool() -> str:
+    kind = os.getenv(ENV_CODEC_POOL, "thread")
+    if kind not in ("thread", "process"):
+        raise EnvironmentError(
+            f"Environment variable '{ENV_CODEC_POOL}' must be either 'thread' or 'process'"
+        )
+    return kind
+
+
+def get_env_codec_workers() -> int:
+    workers = os.getenv(ENV_CODEC_WORKERS, str(os.cpu_count() or 1))
+    if not workers.isdigit() or int(workers) <= 0:
+        raise EnvironmentError(
+            f"Environment variable '{ENV_CODEC_WORKERS}' must be a positive number of workers"
+        )
+    return int(workers)
+
+
+class CodecPool:
+    """
+    Thread or process pool that keeps count of the jobs that have been
+    submitted but not finished. The workers are started on first use.
+    """
+
+    def __init__(self, kind: str, workers: int) -> None:
+        self.kind = kind
+        self.workers = workers
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Number of jobs that are waiting for a free worker
+        """
+        return max(0, self.pending - self.workers)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "pending": self.pending,
+            "queue_depth": self.queue_depth,
+        }
+
+    def run(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Run `func(*args)` in the pool and wait for its result. This blocks, so
+        it's meant to be called from endpoints that FastAPI runs in its
+        threadpool.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._create_executor()
+            self.pending += 1
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def _create_executor(self) -> Executor:
+        if self.kind == "process":
+            # Forking a process that runs threads may copy locks that are held,
+            # so the workers are started afresh
+            return ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return ThreadPoolExecutor(self.workers, thread_name_prefix="ert-storage-codec")
+
+
+codec_pool = CodecPool(get_env_codec_pool(), get_env_codec_workers())
+
+
+def run_codec(func: Callable[..., T], *args: Any) -> T:
+    """
+    Run `func(*args)` in the codec pool
+    """
+    return codec_pool.run(func, *args)
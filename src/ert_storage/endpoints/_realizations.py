@@ -0,0 +1,95 @@
+"""
+The `realizations` query parameter, which selects a subset of the realizations
+of an ensemble with a comma-separated list of indices and inclusive ranges, eg.
+"0-49" or "3,7,10-12".
+"""
+from typing import Iterable, List, Optional, Tuple
+from uuid import UUID
+
+import sqlalchemy as sa
+from fastapi import Depends
+from sqlalchemy.sql import ColumnElement
+
+from ert_storage import database_schema as ds
+from ert_storage import exceptions as exc
+from ert_storage.database import Session, get_db
+
+
+class Realizations:
+    """
+    Selected realization indices, kept as sorted inclusive runs where
+    overlapping and adjacent runs are merged, so that eg. "0-9999" is never
+    expanded into ten thousand indices
+    """
+
+    def __init__(self, runs: Iterable[Tuple[int, int]]) -> None:
+        self.runs: List[Tuple[int, int]] = []
+        for first, last in sorted(runs):
+            if self.runs and first <= self.runs[-1][1] + 1:
+                self.runs[-1] = (self.runs[-1][0], max(last, self.runs[-1][1]))
+            else:
+                self.runs.append((first, last))
+
+    def __len__(self) -> int:
+        return sum(last - first + 1 for first, last in self.runs)
+
+    def indices_below(self, stop: int) -> List[int]:
+        """
+        The selected indices that are less than `stop`, in order
+        """
+        indices: List[int] = []
+        for first, last in self.runs:
+            if first >= stop:
+                break
+            indices.extend(range(first, min(last + 1, stop)))
+        return indices
+
+
+def get_realizations(
+    *,
+    db: Session = Depends(get_db),
+    ensemble_id: UUID,
+    realizations: Optional[str] = None,
+) -> Optional[Realizations]:
+    """
+    Parse the `realizations` query parameter. Selecting more realizations than
+    the ensemble has is a 422.
+    """
+    if realizations is None:
+        return None
+
+    runs: List[Tuple[int, int]] = []
+    for part in realizations.split(","):
+        start, dash, stop = part.strip().partition("-")
+        try:
+            first = int(start)
+            last = int(stop) if dash else first
+        except ValueError:
+            first, last = -1, -1
+        if not 0 <= first <= last:
+            raise exc.UnprocessableError(
+                f"Realizations must be indices or ranges like '0-49', not '{part}'"
+            )
+        runs.append((first, last))
+    selection = Realizations(runs)
+
+    size = db.query(ds.Ensemble.size).filter_by(id=ensemble_id).scalar()
+    if size is not None and size > 0 and len(selection) > size:
+        raise exc.UnprocessableError(
+            f"Realizations '{realizations}' select {len(selection)} realizations, "
+            f"but the ensemble has only {size}"
+        )
+    return selection
+
+
+def filter_realizations(column: sa.Column, realizations: Realizations) -> ColumnElement:
+    """
+    SQL predicate for the column being one of the realizations, with runs of
+    consecutive realizations compared as ranges
+    """
+    runs = realizations.runs
+    clauses = [column.between(first, last) for first, last in runs if first != last]
+    singles = [first for first, last in runs if first == last]
+    if singles or not clauses:
+        clauses.append(column.in_(singles))
+    return sa.or_(*clauses)
@@ -1,5 +1,21 @@
+import hashlib
 import io
-from typing import Optional, List, Type, AsyncGenerator
+import mmap
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import (
+    AsyncGenerator,
+    BinaryIO,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
 from uuid import uuid4, UUID
 
 import numpy as np
@@ -11,9 +27,18 @@ from fastapi import (
 )
 from fastapi.logger import logger
 from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.types import Receive, Scope, Send
 
 from ert_storage import database_schema as ds
-from ert_storage.database import Session, get_db, HAS_AZURE_BLOB_STORAGE
+from ert_storage.database import (
+    Session,
+    get_db,
+    HAS_AZURE_BLOB_STORAGE,
+    HAS_LOCAL_BLOB_STORAGE,
+    LOCAL_BLOB_PATH,
+    MAX_CHUNK_SIZE,
+)
 
 if HAS_AZURE_BLOB_STORAGE:
     from ert_storage.database import azure_blob_container
@@ -36,11 +61,26 @@ class BlobHandler:
         self,
         file: UploadFile,
     ) -> ds.File:
-        return ds.File(
+        # Hash the upload before storing it, so that nothing is written if an
+        # identical file is already stored
+        content_hash, size = await run_in_threadpool(_hash_file, file.file)
+        new_file = ds.File(
             filename=file.filename,
             mimetype=file.content_type,
-            content=await file.read(),
+            content_hash=content_hash,
+            size=size,
         )
+        duplicate = await run_in_threadpool(ds.find_duplicate, self._db, new_file)
+        if duplicate is not None:
+            return duplicate
+
+        def store() -> None:
+            self._db.add(new_file)
+            self._db.flush()
+            new_file.write_chunks(iter(lambda: file.file.read(MAX_CHUNK_SIZE), b""))
+
+        await run_in_threadpool(store)
+        return new_file
 
     async def stage_blob(
         self,
@@ -48,7 +88,10 @@ class BlobHandler:
         request: Request,
         block_index: int,
     ) -> ds.FileBlock:
-        ensemble = self._db.query(ds.Ensemble).filter_by(id=self._ensemble_id).one()
+        content = await request.body()
+        ensemble = await run_in_threadpool(
+            self._db.query(ds.Ensemble).filter_by(id=self._ensemble_id).one
+        )
         block_id = str(uuid4())
 
         return ds.FileBlock(
@@ -57,7 +100,7 @@ class BlobHandler:
             block_index=block_index,
             record_name=self._name,
             realization_index=self._realization_index,
-            content=await request.body(),
+            content=content,
         )
 
     def create_blob(self) -> ds.File:
@@ -69,15 +112,39 @@ class BlobHandler:
     async def finalize_blob(
         self, submitted_blocks: List[ds.FileBlock], record: ds.Record
     ) -> None:
-        record.file.content = b"".join([block.content for block in submitted_blocks])
+        sha256 = hashlib.sha256()
+        size = 0
+
+        def chunks() -> Iterator[memoryview]:
+            nonlocal size
+            for block in submitted_blocks:
+                # Load the content of one block at a time
+                content = (
+                    self._db.query(ds.FileBlock.content).filter_by(pk=block.pk).scalar()
+                    or b""
+                )
+                sha256.update(content)
+                size += len(content)
+                view = memoryview(content)
+                for start in range(0, len(content), MAX_CHUNK_SIZE):
+                    yield view[start : start + MAX_CHUNK_SIZE]
+
+        def store() -> None:
+            self._db.query(ds.FileChunk).filter_by(file_pk=record.file.pk).delete()
+            record.file.write_chunks(chunks())
+
+        await run_in_threadpool(store)
+        record.file.size = size
+        record.file.content_hash = sha256.hexdigest()
 
     async def get_content(self, record: ds.Record) -> Response:
         assert record.record_type == ds.RecordType.file
-        return Response(
-            content=record.file.content,
+        return StreamingResponse(
+            record.file.iter_content(),
             media_type=record.file.mimetype,
             headers={
-                "Content-Disposition": f'attachment; filename="{record.file.filename}"'
+                "Content-Disposition": f'attachment; filename="{record.file.filename}"',
+                "Content-Length": str(record.file.size or 0),
             },
         )
 
@@ -154,6 +221,260 @@ class AzureBlobHandler(BlobHandler):
         )
 
 
+class LocalBlobHandler(BlobHandler):
+    """
+    Store files in a directory tree on the local filesystem. Files are named by
+    the SHA-256 of their content and sharded into subdirectories by the first
+    two bytes of it, so that identical files are only stored once. Staged
+    blocks are kept in a separate directory until the blob is finalized.
+    """
+
+    @property
+    def _root(self) -> Path:
+        assert LOCAL_BLOB_PATH is not None
+        return LOCAL_BLOB_PATH
+
+    async def upload_file(
+        self,
+        file: UploadFile,
+    ) -> ds.File:
+        key = await run_in_threadpool(self._store, [file.file])
+        return ds.File(
+            filename=file.filename,
+            mimetype=file.content_type,
+            local_blob=key,
+            content_hash=os.path.basename(key),
+        )
+
+    async def stage_blob(
+        self,
+        record: ds.Record,
+        request: Request,
+        block_index: int,
+    ) -> ds.FileBlock:
+        block_id = str(uuid4())
+        path = self._staging_path(block_id)
+        f = await run_in_threadpool(self._open_staged, path)
+        try:
+            async for chunk in request.stream():
+                await run_in_threadpool(f.write, chunk)
+        finally:
+            await run_in_threadpool(f.close)
+
+        return ds.FileBlock(
+            ensemble_pk=record.ensemble_pk,
+            block_id=block_id,
+            block_index=block_index,
+            record_name=self._name,
+            realization_index=self._realization_index,
+        )
+
+    async def finalize_blob(
+        self, submitted_blocks: List[ds.FileBlock], record: ds.Record
+    ) -> None:
+        paths = [
+            self._staging_path(block.block_id)
+            for block in sorted(submitted_blocks, key=lambda x: x.block_index)
+        ]
+        key = await run_in_threadpool(self._store_blocks, paths)
+        record.file.local_blob = key
+        record.file.content_hash = os.path.basename(key)
+
+    async def get_content(self, record: ds.Record) -> Response:
+        if record.file.local_blob is None:
+            # Stored in the database before local blob storage was enabled
+            return await super().get_content(record)
+        return await run_in_threadpool(
+            LocalFileResponse,
+            self._root / record.file.local_blob,
+            media_type=record.file.mimetype,
+            headers={
+                "Content-Disposition": f'attachment; filename="{record.file.filename}"'
+            },
+        )
+
+    def _staging_path(self, block_id: str) -> Path:
+        return self._root / "staging" / block_id
+
+    def _open_staged(self, path: Path) -> BinaryIO:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return open(path, "wb")
+
+    def _store_blocks(self, paths: List[Path]) -> str:
+        """
+        Concatenate the staged blocks into the blob store and remove them
+        """
+        files = [open(path, "rb") for path in paths]
+        try:
+            key = self._store(files)
+        finally:
+            for f in files:
+                f.close()
+        for path in paths:
+            path.unlink()
+        return key
+
+    def _store(self, files: Iterable[BinaryIO]) -> str:
+        """
+        Concatenate the files into the blob store and return the key of the
+        resulting blob relative to the root directory
+        """
+        tmpdir = self._root / "tmp"
+        tmpdir.mkdir(parents=True, exist_ok=True)
+        sha256 = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=tmpdir, delete=False) as tmp:
+            try:
+                for f in files:
+                    while chunk := f.read(MAX_CHUNK_SIZE):
+                        sha256.update(chunk)
+                        tmp.write(chunk)
+                # Make sure the content is on disk before the blob is renamed
+                # into place, where the database will refer to it
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            except BaseException:
+                os.unlink(tmp.name)
+                raise
+
+        digest = sha256.hexdigest()
+        key = os.path.join(digest[:2], digest[2:4], digest)
+        path = self._root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp.name, path)
+        return key
+
+
+def collect_local_blobs(db: Session, min_age: float = 3600.0) -> List[str]:
+    """
+    Remove the blobs of the local blob store that no file refers to, and return
+    their keys.
+
+    Blobs are shared by all files with the same content, so they are left in
+    place when the last file that refers to one is deleted, and are instead
+    removed by running this periodically, eg. with `ert-storage gc`. Blobs that
+    were written less than `min_age` seconds ago are kept, as an upload of the
+    same content may be about to refer to them again.
+    """
+    assert LOCAL_BLOB_PATH is not None
+    root = LOCAL_BLOB_PATH
+    now = time.time()
+    keys = [
+        os.path.relpath(path, root)
+        for path in root.glob("??/??/*")
+        if path.is_file() and now - path.stat().st_mtime >= min_age
+    ]
+
+    referenced: Set[str] = set()
+    for start in range(0, len(keys), ds.READ_BATCH_SIZE):
+        referenced.update(
+            key
+            for key, in db.query(ds.File.local_blob).filter(
+                ds.File.local_blob.in_(keys[start : start + ds.READ_BATCH_SIZE])
+            )
+        )
+
+    tmpdir = root / "tmp"
+    tmpdir.mkdir(parents=True, exist_ok=True)
+    removed = []
+    for key in keys:
+        if key in referenced:
+            continue
+        # Move the blob aside before checking its age again, so that a blob
+        # that was just rewritten by an upload is put back instead of removed
+        path = root / key
+        moved = tmpdir / str(uuid4())
+        try:
+            os.replace(path, moved)
+        except FileNotFoundError:
+            continue
+        if time.time() - moved.stat().st_mtime < min_age:
+            os.replace(moved, path)
+        else:
+            moved.unlink()
+            removed.append(key)
+    return removed
+
+
+def _hash_file(f: BinaryIO) -> Tuple[str, int]:
+    """
+    Compute the SHA-256 and size of a seekable file, reading one chunk at a
+    time, and rewind it
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    f.seek(0)
+    while chunk := f.read(MAX_CHUNK_SIZE):
+        sha256.update(chunk)
+        size += len(chunk)
+    f.seek(0)
+    return sha256.hexdigest(), size
+
+
+class LocalFileResponse(Response):
+    """
+    Response that sends a local file without reading it into Python buffers.
+    Uses the ASGI zero-copy send extension (ie. sendfile) when the server
+    supports it, and otherwise sends slices of a memory map of the file.
+    """
+
+    chunk_size = 2**22
+
+    def __init__(
+        self,
+        path: Path,
+        media_type: str,
+        headers: Optional[dict] = None,
+        status_code: int = 200,
+    ) -> None:
+        self.path = path
+        self.size = os.stat(path).st_size
+        super().__init__(
+            status_code=status_code,
+            media_type=media_type,
+            headers={**(headers or {}), "content-length": str(self.size)},
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        with open(self.path, "rb") as f:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send(
+                    {
+                        "type": "http.response.zerocopysend",
+                        "file": f.fileno(),
+                        "count": self.size,
+                        "more_body": False,
+                    }
+                )
+                return
+            if self.size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for offset in range(0, self.size, self.chunk_size):
+                        with memoryview(mm)[offset : offset + self.chunk_size] as chunk:
+                            await send(
+                                {
+                                    "type": "http.response.body",
+                                    "body": chunk,
+                                    "more_body": True,
+                                }
+                            )
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _get_blob_handler_type() -> Type[BlobHandler]:
+    if HAS_AZURE_BLOB_STORAGE:
+        return AzureBlobHandler
+    if HAS_LOCAL_BLOB_STORAGE:
+        return LocalBlobHandler
+    return BlobHandler
+
+
 def get_blob_handler(
     *,
     db: Session = Depends(get_db),
@@ -161,22 +482,14 @@ def get_blob_handler(
     ensemble_id: UUID,
     realization_index: Optional[int] = None,
 ) -> BlobHandler:
-    blob_handler: Type[BlobHandler]
-    if HAS_AZURE_BLOB_STORAGE:
-        blob_handler = AzureBlobHandler
-    else:
-        blob_handler = BlobHandler
+    blob_handler = _get_blob_handler_type()
     return blob_handler(
         db=db, name=name, ensemble_id=ensemble_id, realization_index=realization_index
     )
 
 
 def get_blob_handler_from_record(db: Session, record: ds.Record) -> BlobHandler:
-    blob_handler: Type[BlobHandler]
-    if HAS_AZURE_BLOB_STORAGE:
-        blob_handler = AzureBlobHandler
-    else:
-        blob_handler = BlobHandler
+    blob_handler = _get_blob_handler_type()
     return blob_handler(
         db=db,
         name=record.name,
@@ -0,0 +1,499 @@
+"""
+Creating and reading many matrix records in a single request.
+
+Entries are given either as an NPZ archive, where each array is named after the
+record as `name` for ensemble-wide records or `name@realization_index` for
+forward-model records, or as an Arrow IPC stream with the columns `name`,
+`realization_index` (null for ensemble-wide records) and `values`, a list of
+floats per record. The Arrow stream may also have a `shape` column, a list of
+integers per record, which is always present when reading.
+"""
+import io
+from collections import Counter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+from uuid import uuid4
+
+import numpy as np
+import pyarrow as pa
+import sqlalchemy as sa
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager, joinedload
+
+from ert_storage import database_schema as ds
+from ert_storage import exceptions as exc
+from ert_storage.database import Session
+
+
+NPZ_MIMETYPE = "application/x-npz"
+ARROW_STREAM_MIMETYPE = "application/vnd.apache.arrow.stream"
+
+# Number of values in each `IN` clause, to stay below the limits of SQLite
+BATCH_SIZE = 500
+
+Entry = Tuple[str, Optional[int], np.ndarray]
+
+
+def read_entries(body: bytes, content_type: str) -> List[Entry]:
+    """
+    Decode the request body into (name, realization_index, matrix) entries
+    """
+    if content_type == NPZ_MIMETYPE:
+        return list(_read_npz(body))
+    elif content_type == ARROW_STREAM_MIMETYPE:
+        return list(_read_arrow(body))
+    raise exc.UnprocessableError(
+        f"Content-Type must be either '{NPZ_MIMETYPE}' or '{ARROW_STREAM_MIMETYPE}'"
+    )
+
+
+def write_entries(entries: List[Entry], media_type: str) -> bytes:
+    """
+    Encode (name, realization_index, matrix) entries in the given format
+    """
+    if media_type == NPZ_MIMETYPE:
+        stream = io.BytesIO()
+        arrays: Dict[str, Any] = {
+            _format_key(name, index): array for name, index, array in entries
+        }
+        np.savez(stream, **arrays)
+        return stream.getvalue()
+
+    sizes = np.array([array.size for _, _, array in entries], dtype=np.int32)
+    ndims = np.array([array.ndim for _, _, array in entries], dtype=np.int32)
+    table = pa.table(
+        {
+            "name": pa.array([name for name, _, _ in entries], pa.string()),
+            "realization_index": pa.array(
+                [index for _, index, _ in entries], pa.int64()
+            ),
+            "values": pa.ListArray.from_arrays(
+                np.concatenate([[0], np.cumsum(sizes)]).astype(np.int32),
+                pa.array(
+                    np.concatenate([array.ravel() for _, _, array in entries])
+                    if entries
+                    else np.empty(0),
+                    pa.float64(),
+                ),
+            ),
+            "shape": pa.ListArray.from_arrays(
+                np.concatenate([[0], np.cumsum(ndims)]).astype(np.int32),
+                pa.array(
+                    [dim for _, _, array in entries for dim in np.shape(array)],
+                    pa.int64(),
+                ),
+            ),
+        }
+    )
+    stream = io.BytesIO()
+    with pa.ipc.new_stream(stream, table.schema) as writer:
+        writer.write_table(table)
+    return stream.getvalue()
+
+
+def read_records(
+    db: Session,
+    ensemble: ds.Ensemble,
+    names: Optional[List[str]],
+    realization_indices: Optional[List[int]],
+    label: Optional[str],
+) -> List[Entry]:
+    """
+    Read the matrix records with the given names, or all of them when `names` is
+    None, finding the records with one query and their tiles with another.
+
+    With `realization_indices`, only forward-model records of those
+    realizations are read, and ensemble-wide matrices with at least two
+    dimensions are split into one entry per realization. With `label`, only
+    that column of labeled matrices is read.
+    """
+    query = (
+        db.query(ds.Record)
+        .join(ds.Record.record_info)
+        .options(
+            contains_eager(ds.Record.record_info), joinedload(ds.Record.f64_matrix)
+        )
+        .filter(ds.RecordInfo.ensemble_pk == ensemble.pk)
+    )
+    if realization_indices is not None:
+        query = query.filter(
+            (ds.Record.realization_index == None)
+            | ds.Record.realization_index.in_(realization_indices)
+        )
+
+    if names is None:
+        records = query.filter(
+            ds.RecordInfo.record_type == ds.RecordType.f64_matrix
+        ).all()
+    else:
+        records = []
+        for batch in _batched(sorted(set(names))):
+            records.extend(query.filter(ds.RecordInfo.name.in_(batch)))
+        missing = set(names) - {record.name for record in records}
+        if missing:
+            raise exc.NotFoundError(f"Records not found: {', '.join(sorted(missing))}")
+
+    keys: List[Tuple[str, Optional[int], Sequence[int]]] = []
+    selections: List[Tuple[ds.F64Matrix, Any, Any]] = []
+    for record in records:
+        if record.record_type != ds.RecordType.f64_matrix:
+            raise exc.ExpectationError("Non matrix record not supported")
+
+        matrix = record.f64_matrix
+        columns = None
+        shape = matrix.shape
+        if label is not None and matrix.is_labeled:
+            positions = matrix.column_positions([label])
+            if label not in positions:
+                raise exc.UnprocessableError(f"Record label '{label}' not found!")
+            columns = [positions[label]]
+
+        if (
+            record.realization_index is None
+            and realization_indices is not None
+            and len(shape) >= 2
+        ):
+            for index in sorted(set(realization_indices)):
+                if 0 <= index < shape[0]:
+                    keys.append((record.name, index, shape[1:]))
+                    selections.append((matrix, [index], columns))
+        else:
+            keys.append((record.name, record.realization_index, shape))
+            selections.append((matrix, None, columns))
+
+    entries = []
+    for (name, realization_index, shape), array in zip(
+        keys, ds.read_matrices(db, selections)
+    ):
+        if label is None:
+            array = array.reshape(shape)
+        entries.append((name, realization_index, array))
+    entries.sort(key=lambda entry: (entry[0], _realization_sort_key(entry[1])))
+    return entries
+
+
+def create_records(db: Session, ensemble: ds.Ensemble, entries: List[Entry]) -> None:
+    """
+    Validate the entries like when creating each record separately, and insert
+    them with a fixed number of statements
+    """
+    names = sorted({name for name, _, _ in entries})
+    _check_new_records(db, ensemble, entries, names)
+    record_infos = _get_record_infos(db, ensemble, names)
+
+    for name, realization_index, matrix in entries:
+        info = record_infos[name]
+        if (
+            realization_index is None
+            and info.record_class is ds.RecordClass.parameter
+            and matrix.ndim <= 1
+        ):
+            raise exc.UnprocessableError(
+                f"Ensemble-wide parameter record '{name}' for ensemble '{ensemble.id}'"
+                "must have dimensionality of at least 2"
+            )
+
+    matrix_pks = _insert_matrices(db, [matrix for _, _, matrix in entries])
+    db.execute(
+        ds.Record.__table__.insert(),
+        [
+            dict(
+                id=uuid4(),
+                record_info_pk=record_infos[name].pk,
+                realization_index=realization_index,
+                f64_matrix_pk=pk,
+                userdata={},
+            )
+            for (name, realization_index, _), pk in zip(entries, matrix_pks)
+        ],
+    )
+
+    # Record inserts without the ORM don't go through _retain_payloads
+    table = ds.F64Matrix.__table__
+    db.execute(
+        table.update()
+        .where(table.c.pk == sa.bindparam("matrix_pk"))
+        .values(ref_count=table.c.ref_count + sa.bindparam("count")),
+        [dict(matrix_pk=pk, count=count) for pk, count in Counter(matrix_pks).items()],
+    )
+
+
+def _read_npz(body: bytes) -> Iterator[Entry]:
+    try:
+        npz = np.load(io.BytesIO(body), allow_pickle=False)
+    except (OSError, ValueError):
+        raise exc.UnprocessableError("Request body is not a valid NPZ archive")
+    with npz:
+        for key in npz.files:
+            name, realization_index = _parse_key(key)
+            yield name, realization_index, _as_matrix(npz[key], key)
+
+
+def _read_arrow(body: bytes) -> Iterator[Entry]:
+    try:
+        table = pa.ipc.open_stream(body).read_all()
+        names = table.column("name").to_pylist()
+        indices = table.column("realization_index").to_pylist()
+        values = table.column("values").combine_chunks()
+        shapes = (
+            table.column("shape").to_pylist()
+            if "shape" in table.column_names
+            else [None] * table.num_rows
+        )
+    except (pa.ArrowInvalid, KeyError):
+        raise exc.UnprocessableError(
+            "Request body must be an Arrow stream with the columns "
+            "'name', 'realization_index' and 'values'"
+        )
+    _check_arrow_schema(table.schema)
+    offsets = values.offsets.to_numpy()
+    flat = values.values.to_numpy(zero_copy_only=False)
+    for i, (name, realization_index, shape) in enumerate(zip(names, indices, shapes)):
+        matrix = _as_matrix(flat[offsets[i] : offsets[i + 1]], name)
+        if shape is not None:
+            try:
+                matrix = matrix.reshape(shape)
+            except (TypeError, ValueError):
+                raise exc.UnprocessableError(
+                    f"Record {_describe(name, realization_index)} has the wrong shape"
+                )
+        yield name, realization_index, matrix
+
+
+def _check_arrow_schema(schema: pa.Schema) -> None:
+    """
+    Check the types of the columns, so that eg. a 'values' column that isn't a
+    list column is rejected up front
+    """
+
+    def is_list_of(type_: pa.DataType, *checks: Callable[[Any], bool]) -> bool:
+        return (pa.types.is_list(type_) or pa.types.is_large_list(type_)) and any(
+            check(type_.value_type) for check in checks
+        )
+
+    expected: Dict[str, Tuple[Callable[[pa.DataType], bool], str]] = {
+        "name": (pa.types.is_string, "strings"),
+        "realization_index": (
+            lambda t: pa.types.is_integer(t) or pa.types.is_null(t),
+            "integers",
+        ),
+        "values": (
+            lambda t: is_list_of(t, pa.types.is_floating, pa.types.is_integer),
+            "lists of numbers",
+        ),
+        "shape": (lambda t: is_list_of(t, pa.types.is_integer), "lists of integers"),
+    }
+    for column, (check, description) in expected.items():
+        if column in schema.names and not check(schema.field(column).type):
+            raise exc.UnprocessableError(
+                f"Column '{column}' of the Arrow stream must contain {description}, "
+                f"not {schema.field(column).type}"
+            )
+
+
+def _parse_key(key: str) -> Tuple[str, Optional[int]]:
+    name, sep, index = key.rpartition("@")
+    if sep and index.isdigit():
+        return name, int(index)
+    return key, None
+
+
+def _format_key(name: str, realization_index: Optional[int]) -> str:
+    if realization_index is None:
+        return name
+    return f"{name}@{realization_index}"
+
+
+def _realization_sort_key(realization_index: Optional[int]) -> int:
+    return -1 if realization_index is None else realization_index
+
+
+def _as_matrix(value: Any, key: str) -> np.ndarray:
+    try:
+        return np.asarray(value, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise exc.UnprocessableError(f"Record '{key}' needs to be a matrix")
+
+
+def _check_new_records(
+    db: Session, ensemble: ds.Ensemble, entries: List[Entry], names: List[str]
+) -> None:
+    """
+    Apply the checks of `new_record` to all entries at once
+    """
+    keys = [(name, realization_index) for name, realization_index, _ in entries]
+    for key, count in Counter(keys).items():
+        if count > 1:
+            raise exc.ConflictError(f"Record {_describe(*key)} is given more than once")
+
+    if ensemble.size != -1:
+        for _, realization_index in keys:
+            if (
+                realization_index is not None
+                and realization_index not in ensemble.active_realizations
+            ):
+                raise exc.ExpectationError(
+                    f"Realization index {realization_index} outside of allowed realization indices {ensemble.active_realizations}"
+                )
+
+    # As in `new_record`, a record conflicts with an existing record for the
+    # same realization and with an existing ensemble-wide record. Ensemble-wide
+    # and forward-model records of the same name can't be given together.
+    existing = set()
+    for batch in _batched(names):
+        existing.update(
+            db.query(ds.RecordInfo.name, ds.Record.realization_index)
+            .join(ds.Record.record_info)
+            .filter(ds.RecordInfo.ensemble_pk == ensemble.pk)
+            .filter(ds.RecordInfo.name.in_(batch))
+        )
+    new_ensemble_wide = {name for name, index in keys if index is None}
+    for name, realization_index in keys:
+        if (name, None) in existing:
+            raise exc.ConflictError(
+                f"Ensemble-wide record '{name}' for ensemble '{ensemble.id}' already exists",
+            )
+        if (name, realization_index) in existing:
+            raise exc.ConflictError(
+                f"Record {_describe(name, realization_index)} for ensemble '{ensemble.id}' already exists",
+            )
+        if realization_index is not None and name in new_ensemble_wide:
+            raise exc.ConflictError(
+                f"Record {_describe(name, realization_index)} can't be given together with the ensemble-wide record '{name}'",
+            )
+
+
+def _get_record_infos(
+    db: Session, ensemble: ds.Ensemble, names: List[str]
+) -> Dict[str, ds.RecordInfo]:
+    """
+    Get the record infos of the given names, creating those that don't exist
+    """
+    record_classes: Dict[str, ds.RecordClass] = {}
+    for name in names:
+        if name in ensemble.parameter_names:
+            record_classes[name] = ds.RecordClass.parameter
+        elif name in ensemble.response_names:
+            record_classes[name] = ds.RecordClass.response
+        else:
+            record_classes[name] = ds.RecordClass.other
+
+    record_infos = _query_record_infos(db, ensemble, names)
+    while len(record_infos) < len(names):
+        nested = db.begin_nested()
+        try:
+            for name in names:
+                if name not in record_infos:
+                    db.add(
+                        ds.RecordInfo(
+                            ensemble_pk=ensemble.pk,
+                            name=name,
+                            record_class=record_classes[name],
+                            record_type=ds.RecordType.f64_matrix,
+                        )
+                    )
+            nested.commit()
+        except IntegrityError:
+            # Assuming this is a UNIQUE constraint failure due to a concurrent
+            # request creating some of the same record infos. Fetch them and
+            # create the rest.
+            nested.rollback()
+        record_infos = _query_record_infos(db, ensemble, names)
+
+    for name, info in record_infos.items():
+        if info.record_class != record_classes[name]:
+            raise exc.ConflictError(
+                "Record class of new record does not match previous record class",
+                new_record_class=record_classes[name],
+                old_record_class=info.record_class,
+            )
+        elif info.record_type != ds.RecordType.f64_matrix:
+            raise exc.ConflictError(
+                "Record type of new record does not match previous record type",
+                new_record_type=ds.RecordType.f64_matrix,
+                old_record_type=info.record_type,
+            )
+    return record_infos
+
+
+def _query_record_infos(
+    db: Session, ensemble: ds.Ensemble, names: List[str]
+) -> Dict[str, ds.RecordInfo]:
+    record_infos: Dict[str, ds.RecordInfo] = {}
+    for batch in _batched(names):
+        for info in (
+            db.query(ds.RecordInfo)
+            .filter_by(ensemble_pk=ensemble.pk)
+            .filter(ds.RecordInfo.name.in_(batch))
+        ):
+            record_infos[info.name] = info
+    return record_infos
+
+
+def _insert_matrices(db: Session, matrices: Sequence[np.ndarray]) -> List[int]:
+    """
+    Insert the matrices and their tiles, reusing identical matrices that are
+    already stored, and return the primary key of each matrix
+    """
+    encoded = [ds.F64Matrix.encode(matrix) for matrix in matrices]
+    hashes = [columns["content_hash"] for columns, _ in encoded]
+
+    pk_by_hash: Dict[str, int] = {}
+    for batch in _batched(sorted(set(hashes))):
+        pk_by_hash.update(
+            (content_hash, pk)
+            for pk, content_hash in db.query(
+                ds.F64Matrix.pk, ds.F64Matrix.content_hash
+            ).filter(
+                ds.F64Matrix.content_hash.in_(batch),
+                ds.F64Matrix.column_label_set_pk == None,
+                ds.F64Matrix.row_label_set_pk == None,
+            )
+        )
+
+    new: Dict[str, Tuple[Any, Dict[str, Any], List[Dict[str, Any]]]] = {}
+    for columns, tiles in encoded:
+        content_hash = columns["content_hash"]
+        if content_hash not in pk_by_hash and content_hash not in new:
+            new[content_hash] = (uuid4(), columns, tiles)
+
+    if new:
+        db.execute(
+            ds.F64Matrix.__table__.insert(),
+            [dict(id=id_, ref_count=0, **columns) for id_, columns, _ in new.values()],
+        )
+        hash_by_id = {id_: content_hash for content_hash, (id_, _, _) in new.items()}
+        for batch in _batched(list(hash_by_id)):
+            for pk, id_ in db.query(ds.F64Matrix.pk, ds.F64Matrix.id).filter(
+                ds.F64Matrix.id.in_(batch)
+            ):
+                pk_by_hash[hash_by_id[id_]] = pk
+        tiles = [
+            dict(f64_matrix_pk=pk_by_hash[content_hash], **tile)
+            for content_hash, (_, _, matrix_tiles) in new.items()
+            for tile in matrix_tiles
+        ]
+        if tiles:
+            db.execute(ds.F64MatrixTile.__table__.insert(), tiles)
+
+    return [pk_by_hash[content_hash] for content_hash in hashes]
+
+
+def _describe(name: str, realization_index: Optional[int]) -> str:
+    if realization_index is None:
+        return f"'{name}'"
+    return f"'{name}' for realization {realization_index}"
+
+
+def _batched(values: Sequence[Any]) -> Iterable[Sequence[Any]]:
+    for start in range(0, len(values), BATCH_SIZE):
+        yield values[start : start + BATCH_SIZE]
@@ -0,0 +1,251 @@
+"""
+Forward-model records of a matrix record, stacked into one matrix by
+realization.
+
+Reading all realizations of a record otherwise means reading and concatenating
+one matrix per realization. The stacked matrix is stored as the
+`ensemble_matrix` of the record's RecordInfo, together with the realization and
+the source matrix of each of its rows.
+
+Creating records never touches the stacked matrix, so that uploads neither wait
+for each other nor fail because of it. Instead, reading records uses the stacked
+matrix only when it holds all of them, and otherwise reads them one by one and
+rebuilds the stacked matrix after the response is sent. The rebuild replaces the
+stacked matrix only if no other request has replaced or released it in the
+meantime, and a failed rebuild is logged and leaves it as it was.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from fastapi.logger import logger
+from sqlalchemy.orm import Session as OrmSession, object_session
+from starlette.background import BackgroundTask
+
+from ert_storage import database_schema as ds
+from ert_storage.database import Session
+
+# Realization and source matrix of a row of a stacked matrix
+Key = Tuple[int, int]
+
+# Record infos whose stacked matrix is being rebuilt by this process
+_rebuilding: Set[int] = set()
+_rebuilding_lock = threading.Lock()
+
+
+def get_ensemble_matrix_rows(
+    records: Sequence[ds.Record],
+) -> Optional[Tuple[ds.F64Matrix, Optional[List[int]]]]:
+    """
+    Get the stacked matrix and the rows of it that hold the forward-model
+    records, ordered by realization, or None for all of its rows when they are
+    the records in that order.
+
+    Returns None if there's no stacked matrix that holds all of the records.
+    """
+    if not records or any(record.realization_index is None for record in records):
+        return None
+    info = records[0].record_info
+    if info.ensemble_matrix_pk is None:
+        return None
+
+    stacked_keys = list(
+        zip(info.ensemble_matrix_realizations, info.ensemble_matrix_sources)
+    )
+    stacked_rows = {key: row for row, key in enumerate(stacked_keys)}
+    rows = []
+    for record in sorted(records, key=lambda record: record.realization_index):
+        key = (record.realization_index, record.f64_matrix_pk)
+        if key not in stacked_rows:
+            return None
+        rows.append(stacked_rows[key])
+    if rows == list(range(len(stacked_keys))):
+        return info.ensemble_matrix, None
+    return info.ensemble_matrix, rows
+
+
+def is_ensemble_matrix(matrix: ds.F64Matrix) -> bool:
+    """
+    Whether the stacked matrix is still in use, ie. it wasn't replaced or
+    released, which also deletes its tiles, while it was being read
+    """
+    db = object_session(matrix)
+    return (
+        db.query(ds.RecordInfo.pk).filter_by(ensemble_matrix_pk=matrix.pk).first()
+        is not None
+    )
+
+
+def rebuild_task(db: Session, records: Sequence[ds.Record]) -> Optional[BackgroundTask]:
+    """
+    Task that rebuilds the stacked matrix of the forward-model records, or None
+    if it already holds them or if they can't be stacked
+    """
+    if not _is_stackable(
+        [
+            (record.f64_matrix.shape, record.f64_matrix.column_label_set_pk)
+            for record in records
+            if record.realization_index is not None and record.f64_matrix is not None
+        ]
+    ):
+        return None
+    if get_ensemble_matrix_rows(records) is not None:
+        return None
+    return BackgroundTask(
+        rebuild_ensemble_matrix, db.get_bind(), records[0].record_info_pk
+    )
+
+
+def rebuild_ensemble_matrix(bind: Any, record_info_pk: int) -> None:
+    """
+    Stack the forward-model records of the record info in a session of its own.
+    Failures are logged, as the records can always be read one by one instead.
+    """
+    with _rebuilding_lock:
+        if record_info_pk in _rebuilding:
+            return
+        _rebuilding.add(record_info_pk)
+
+    db = OrmSession(bind=bind, autoflush=False)
+    try:
+        nested = db.begin_nested()
+        try:
+            if _rebuild(db, record_info_pk):
+                nested.commit()
+            else:
+                nested.rollback()
+        except Exception:
+            nested.rollback()
+            raise
+        finally:
+            db.commit()
+    except Exception:
+        logger.exception(
+            "Could not stack the records of record info %d", record_info_pk
+        )
+    finally:
+        db.close()
+        with _rebuilding_lock:
+            _rebuilding.discard(record_info_pk)
+
+
+def _rebuild(db: OrmSession, record_info_pk: int) -> bool:
+    """
+    Replace the stacked matrix of the record info, unless it is up to date or
+    was replaced or released by another request in the meantime. Returns whether
+    anything is to be committed.
+    """
+    info = db.query(ds.RecordInfo).filter_by(pk=record_info_pk).one()
+    old_pk = info.ensemble_matrix_pk
+    entries = _query_entries(db, record_info_pk)
+    if not _is_stackable(
+        [(shape, label_set_pk) for _, _, shape, label_set_pk in entries]
+    ):
+        # The records no longer fit in a stacked matrix
+        if old_pk is None:
+            return False
+        ds.release_ensemble_matrix(db.connection(), record_info_pk)
+        return True
+
+    keys = [(realization, source) for realization, source, _, _ in entries]
+    if old_pk is not None and keys == list(
+        zip(info.ensemble_matrix_realizations, info.ensemble_matrix_sources)
+    ):
+        return False
+
+    # The stacked matrix belongs to the record info alone, so it is never
+    # deduplicated against the matrices of records
+    columns, tiles = ds.F64Matrix.encode(_read_rows(db, keys))
+    columns["content_hash"] = None
+    matrix = ds.F64Matrix(column_label_set_pk=entries[0][3], ref_count=1, **columns)
+    db.add(matrix)
+    db.flush()
+    if tiles:
+        db.execute(
+            ds.F64MatrixTile.__table__.insert(),
+            [dict(f64_matrix_pk=matrix.pk, **tile) for tile in tiles],
+        )
+
+    if not ds.replace_ensemble_matrix(
+        db.connection(),
+        record_info_pk,
+        old_pk,
+        matrix.pk,
+        [realization for realization, _ in keys],
+        [source for _, source in keys],
+    ):
+        return False
+
+    # Records may have been replaced while their matrices were read
+    current = [
+        (realization, source)
+        for realization, source, _, _ in _query_entries(db, record_info_pk)
+    ]
+    return current == keys
+
+
+def _query_entries(
+    db: OrmSession, record_info_pk: int
+) -> List[Tuple[int, int, List[int], Optional[int]]]:
+    """
+    Realization, source matrix, shape and column label set of each forward-model
+    record of the record info, ordered by realization
+    """
+    return [
+        (realization, pk, shape, label_set_pk)
+        for realization, pk, shape, label_set_pk in db.query(
+            ds.Record.realization_index,
+            ds.F64Matrix.pk,
+            ds.F64Matrix.shape,
+            ds.F64Matrix.column_label_set_pk,
+        )
+        .join(ds.Record.f64_matrix)
+        .filter(
+            ds.Record.record_info_pk == record_info_pk,
+            ds.Record.realization_index != None,
+        )
+        .order_by(ds.Record.realization_index)
+    ]
+
+
+def _is_stackable(matrices: List[Tuple[Sequence[int], Optional[int]]]) -> bool:
+    """
+    Whether the matrices, given by their shape and column label set, are rows
+    with the same columns
+    """
+    return (
+        len(matrices) >= 2
+        and len({(_ncols(shape), label_set_pk) for shape, label_set_pk in matrices})
+        == 1
+        and all(_is_row(shape) for shape, _ in matrices)
+    )
+
+
+def _read_rows(db: OrmSession, keys: List[Key]) -> np.ndarray:
+    """
+    Stack the source matrices of the keys into a matrix, reading them with a
+    query per READ_BATCH_SIZE matrices
+    """
+    pks = sorted({pk for _, pk in keys})
+    read: Dict[int, np.ndarray] = {}
+    for start in range(0, len(pks), ds.READ_BATCH_SIZE):
+        matrices = (
+            db.query(ds.F64Matrix)
+            .filter(ds.F64Matrix.pk.in_(pks[start : start + ds.READ_BATCH_SIZE]))
+            .all()
+        )
+        read.update(
+            zip(
+                (matrix.pk for matrix in matrices),
+                ds.read_matrices(db, [(matrix, None, None) for matrix in matrices]),
+            )
+        )
+    return np.stack([np.reshape(read[pk], -1) for _, pk in keys])
+
+
+def _is_row(shape: Sequence[int]) -> bool:
+    return len(shape) <= 1 or (len(shape) == 2 and shape[0] == 1)
+
+
+def _ncols(shape: Sequence[int]) -> int:
+    return int(np.prod(shape, dtype=np.int64))
@@ -0,0 +1,101 @@
+"""
+Cache of computed misfits, so that requesting the misfits of the same responses
+again, eg. when polling for them, neither reads the responses nor computes the
+misfits.
+
+Results are keyed on what they are computed from: the id, realization, matrix
+and update time of each response record, and the id, update time and content of
+the observation. Any change to the inputs gives a different key, so that stale
+results are never returned and instead are evicted when least recently used.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+from ert_storage import database_schema as ds
+
+# Total size in bytes of the cached results
+CACHE_SIZE = 2**26
+
+
+class MisfitsCache:
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            content = self._entries.get(key)
+            if content is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return content
+
+    def put(self, key: str, content: bytes) -> None:
+        if len(content) > self.max_size:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = content
+            self.size += len(content)
+            while self.size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+misfits_cache = MisfitsCache(CACHE_SIZE)
+
+
+def misfits_key(
+    responses: Sequence[ds.Record], observation: ds.Observation, *args: Any
+) -> str:
+    """
+    Key of the misfits of the responses to the observation, computed with the
+    given arguments
+    """
+    digest = hashlib.sha256()
+    for response in responses:
+        digest.update(
+            repr(
+                (
+                    response.id,
+                    response.realization_index,
+                    response.f64_matrix_pk,
+                    response.time_updated,
+                )
+            ).encode()
+        )
+    digest.update(
+        repr(
+            (
+                observation.id,
+                observation.time_updated,
+                list(observation.x_axis),
+                list(observation.values),
+                list(observation.errors),
+                args,
+            )
+        ).encode()
+    )
+    return digest.hexdigest()
@@ -1,15 +1,25 @@
 from ert_storage.database_schema.record import F64Matrix
+import hashlib
+import itertools
 import numpy as np
 import pandas as pd
 from uuid import UUID
-from typing import Any, Optional, List
+from typing import Any, Dict, Optional, List, Set, Tuple
 import sqlalchemy as sa
 from fastapi.responses import Response
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, status
+from sqlalchemy.orm import contains_eager, selectinload
 from ert_storage.database import Session, get_db
 from ert_storage import database_schema as ds, json_schema as js
 from ert_storage import exceptions as exc
-from ert_storage.compute import calculate_misfits_from_pandas, misfits
+from ert_storage.compute import calculate_misfits, misfits, observed_columns
+from ert_storage.endpoints._codec_pool import run_codec
+from ert_storage.endpoints.compute._misfits_cache import misfits_cache, misfits_key
+from ert_storage.endpoints._realizations import (
+    Realizations,
+    filter_realizations,
+    get_realizations,
+)
 
 router = APIRouter(tags=["misfits"])
 
@@ -23,20 +33,23 @@ router = APIRouter(tags=["misfits"])
         }
     },
 )
-async def get_response_misfits(
+def get_response_misfits(
     *,
     db: Session = Depends(get_db),
     ensemble_id: UUID,
     response_name: str,
     realization_index: Optional[int] = None,
+    realizations: Optional[Realizations] = Depends(get_realizations),
     summary_misfits: bool = False,
 ) -> Response:
     """
-    Compute univariate misfits for response(s)
+    Compute univariate misfits for response(s), of all realizations or of
+    those selected by either `realization_index` or `realizations`, eg. "0-9,15"
     """
 
     response_query = (
         db.query(ds.Record)
+        .options(ds.load_matrix_payload())
         .filter(ds.Record.observations != None)
         .join(ds.RecordInfo)
         .filter_by(
@@ -46,6 +59,10 @@ async def get_response_misfits(
         .join(ds.Ensemble)
         .filter_by(id=ensemble_id)
     )
+    if realization_index is not None and realizations is not None:
+        raise exc.UnprocessableError(
+            "Only one of 'realization_index' and 'realizations' can be given"
+        )
     if realization_index is not None:
         responses = [
             response_query.filter(
@@ -53,32 +70,245 @@ async def get_response_misfits(
             ).one()
         ]
     else:
-        responses = response_query.all()
-
-    observation_df = None
-    response_dict = {}
-    for response in responses:
-        data_df = pd.DataFrame(response.f64_matrix.content)
-        labels = response.f64_matrix.labels
-        if labels is not None:
-            data_df.columns = labels[0]
-            data_df.index = labels[1]
-        response_dict[response.realization_index] = data_df
-        if observation_df is None:
-            # currently we expect only a single observation object, while
-            # later in the future this might change
-            obs = response.observations[0]
-            observation_df = pd.DataFrame(
-                data={"values": obs.values, "errors": obs.errors}, index=obs.x_axis
+        if realizations is not None:
+            response_query = response_query.filter(
+                filter_realizations(ds.Record.realization_index, realizations)
+            )
+        responses = response_query.order_by(ds.Record.realization_index).all()
+
+    if not responses:
+        raise exc.UnprocessableError(
+            f"Unable to compute misfits: no '{response_name}' responses with observations"
+        )
+
+    # currently we expect only a single observation object, while
+    # later in the future this might change
+    obs = responses[0].observations[0]
+    key = misfits_key(responses, obs, summary_misfits)
+    content = misfits_cache.get(key)
+    if content is None:
+        content = _compute_misfits(db, responses, obs, summary_misfits)
+        misfits_cache.put(key, content)
+    return Response(
+        content=content,
+        media_type="text/csv",
+    )
+
+
+@router.get(
+    "/compute/ensemble_misfits",
+    responses={
+        status.HTTP_200_OK: {
+            "content": {"text/csv": {}},
+            "description": "Return misfits as csv, where rows are observed points "
+            "and columns are realizations.",
+        }
+    },
+)
+def get_ensemble_misfits(
+    *,
+    db: Session = Depends(get_db),
+    ensemble_id: UUID,
+    response_name: Optional[List[str]] = Query(None),
+    realizations: Optional[Realizations] = Depends(get_realizations),
+    summary_misfits: bool = False,
+) -> Response:
+    """
+    Compute univariate misfits for every response with observations in the
+    ensemble, or for those given by `response_name`, which can be repeated.
+    Rows are the observed points, labeled by `response`, `observation` and
+    `x_axis`, and columns are the realizations, all of them or those selected by
+    `realizations`, eg. "0-9,15". With `summary_misfits`, there's instead a row
+    per response with the sum of its absolute misfits per realization.
+    """
+    ensemble = db.query(ds.Ensemble).filter_by(id=ensemble_id).one()
+    query = (
+        db.query(ds.Record)
+        .join(ds.RecordInfo)
+        .options(
+            contains_eager(ds.Record.record_info),
+            selectinload(ds.Record.observations),
+            ds.load_matrix_payload(),
+        )
+        .filter(
+            ds.Record.observations != None,
+            ds.RecordInfo.ensemble_pk == ensemble.pk,
+            ds.RecordInfo.record_type == ds.RecordType.f64_matrix,
+        )
+    )
+    if response_name is not None:
+        query = query.filter(ds.RecordInfo.name.in_(response_name))
+    if realizations is not None:
+        query = query.filter(
+            filter_realizations(ds.Record.realization_index, realizations)
+        )
+    records = query.order_by(ds.RecordInfo.name, ds.Record.realization_index).all()
+
+    groups = [
+        (name, list(responses))
+        for name, responses in itertools.groupby(
+            records, key=lambda record: record.record_info.name
+        )
+    ]
+    missing = sorted(set(response_name or []) - {name for name, _ in groups})
+    if missing:
+        raise exc.UnprocessableError(
+            f"Unable to compute misfits: no {missing} responses with observations"
+        )
+
+    # currently we expect only a single observation object per response, while
+    # later in the future this might change
+    observations = [responses[0].observations[0] for _, responses in groups]
+    digest = hashlib.sha256(repr(("ensemble", summary_misfits)).encode())
+    for (name, responses), obs in zip(groups, observations):
+        digest.update(misfits_key(responses, obs, name).encode())
+    key = digest.hexdigest()
+
+    content = misfits_cache.get(key)
+    if content is None:
+        observation_dfs = [_observation_dataframe(obs) for obs in observations]
+        try:
+            stacked = _read_observed_responses(
+                db,
+                [
+                    (responses, observation_df)
+                    for (_, responses), observation_df in zip(groups, observation_dfs)
+                ],
+            )
+        except (KeyError, ValueError) as misfits_exc:
+            raise exc.UnprocessableError(f"Unable to compute misfits: {misfits_exc}")
+        try:
+            content = run_codec(
+                _encode_ensemble_misfits,
+                [
+                    (
+                        name,
+                        obs.name,
+                        [response.realization_index for response in responses],
+                        responses_array,
+                        observation_df,
+                    )
+                    for (name, responses), obs, responses_array, observation_df in zip(
+                        groups, observations, stacked, observation_dfs
+                    )
+                ],
+                summary_misfits,
             )
+        except Exception as misfits_exc:
+            raise exc.UnprocessableError(f"Unable to compute misfits: {misfits_exc}")
+        misfits_cache.put(key, content)
+    return Response(
+        content=content,
+        media_type="text/csv",
+    )
+
 
+def _compute_misfits(
+    db: Session,
+    responses: List[ds.Record],
+    obs: ds.Observation,
+    summary_misfits: bool,
+) -> bytes:
+    observation_df = _observation_dataframe(obs)
+    try:
+        (stacked,) = _read_observed_responses(db, [(responses, observation_df)])
+    except (KeyError, ValueError) as misfits_exc:
+        raise exc.UnprocessableError(f"Unable to compute misfits: {misfits_exc}")
     try:
-        result_df = calculate_misfits_from_pandas(
-            response_dict, observation_df, summary_misfits
+        return run_codec(
+            _encode_misfits,
+            stacked,
+            [response.realization_index for response in responses],
+            observation_df,
+            summary_misfits,
         )
     except Exception as misfits_exc:
         raise exc.UnprocessableError(f"Unable to compute misfits: {misfits_exc}")
-    return Response(
-        content=result_df.to_csv().encode(),
-        media_type="text/csv",
+
+
+def _observation_dataframe(obs: ds.Observation) -> pd.DataFrame:
+    return pd.DataFrame(
+        data={"values": obs.values, "errors": obs.errors}, index=obs.x_axis
     )
+
+
+def _read_observed_responses(
+    db: Session, groups: List[Tuple[List[ds.Record], pd.DataFrame]]
+) -> List[np.ndarray]:
+    """
+    Read each group of responses at the index of its observation, stacked into a
+    (realization, observation) array. The observed columns are looked up once
+    per set of column labels, and only the tiles that hold them are read, for
+    all the groups at once.
+    """
+    selections = []
+    for responses, observation_df in groups:
+        positions: Dict[Tuple[Optional[int], int], np.ndarray] = {}
+        for response in responses:
+            matrix = response.f64_matrix
+            nrows, ncols = matrix.shape_2d
+            if nrows != 1:
+                raise ValueError("Responses must have a single row per realization")
+            key = (matrix.column_label_set_pk, ncols)
+            if key not in positions:
+                labels = matrix.labels
+                positions[key] = observed_columns(
+                    labels[0] if labels is not None else range(ncols), observation_df
+                )
+            selections.append((matrix, None, positions[key]))
+
+    rows = ds.read_matrices(db, selections)
+    stacked = []
+    start = 0
+    for responses, observation_df in groups:
+        stacked.append(
+            np.concatenate(rows[start : start + len(responses)])
+            if responses
+            else np.empty((0, len(observation_df)))
+        )
+        start += len(responses)
+    return stacked
+
+
+def _encode_misfits(
+    responses: np.ndarray,
+    realizations: List[int],
+    observation_df: pd.DataFrame,
+    summary_misfits: bool,
+) -> bytes:
+    return (
+        calculate_misfits(responses, realizations, observation_df, summary_misfits)
+        .to_csv()
+        .encode()
+    )
+
+
+def _encode_ensemble_misfits(
+    groups: List[Tuple[str, str, List[Optional[int]], np.ndarray, pd.DataFrame]],
+    summary_misfits: bool,
+) -> bytes:
+    tables = []
+    all_realizations: Set[Optional[int]] = set()
+    for name, obs_name, realizations, responses, observation_df in groups:
+        table = calculate_misfits(
+            responses, realizations, observation_df, summary_misfits
+        ).T
+        if summary_misfits:
+            table.index = pd.Index([name], name="response")
+        else:
+            table.index = pd.MultiIndex.from_arrays(
+                [[name] * len(table), [obs_name] * len(table), table.index],
+                names=["response", "observation", "x_axis"],
+            )
+        tables.append(table)
+        all_realizations.update(realizations)
+
+    if not tables:
+        names = (
+            ["response"] if summary_misfits else ["response", "observation", "x_axis"]
+        )
+        return pd.DataFrame(columns=names).set_index(names).to_csv().encode()
+
+    # Realizations without a response have no misfits
+    columns = sorted(all_realizations, key=lambda index: -1 if index is None else index)
+    return pd.concat(tables).reindex(columns=columns).to_csv().encode()
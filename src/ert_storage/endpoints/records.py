@@ -3,8 +3,21 @@ from uuid import uuid4, UUID
 import io
 import numpy as np
 import pandas as pd
+import pyarrow as pa
 from enum import Enum
-from typing import Any, Mapping, Dict, Optional, List, AsyncGenerator
+from typing import (
+    Any,
+    Mapping,
+    Dict,
+    Iterator,
+    Optional,
+    List,
+    AsyncGenerator,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
 import sqlalchemy as sa
 from fastapi import (
     APIRouter,
@@ -12,6 +25,7 @@ from fastapi import (
     Depends,
     File,
     Header,
+    Query,
     Request,
     UploadFile,
     status,
@@ -19,8 +33,11 @@ from fastapi import (
 from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased, contains_eager, joinedload, undefer
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm.attributes import flag_modified
+from starlette.concurrency import run_in_threadpool
+from starlette.types import Receive, Scope, Send
 from ert_storage.database import Session, get_db
 from ert_storage import database_schema as ds, json_schema as js
 from ert_storage import exceptions as exc
@@ -29,18 +46,160 @@ from ert_storage.endpoints._records_blob import (
     get_blob_handler_from_record,
     BlobHandler,
 )
+from ert_storage.endpoints._codec_pool import run_codec
+from ert_storage.endpoints._realizations import (
+    Realizations,
+    filter_realizations,
+    get_realizations,
+)
+from ert_storage.endpoints._records_cache import (
+    get_ensemble_matrix_rows,
+    is_ensemble_matrix,
+    rebuild_task,
+)
+from ert_storage.endpoints._records_bulk import (
+    NPZ_MIMETYPE,
+    ARROW_STREAM_MIMETYPE,
+    create_records,
+    read_entries,
+    read_records,
+    write_entries,
+)
 
 from fastapi.logger import logger
 
 
 router = APIRouter(tags=["record"])
 
+# Number of rows that are encoded at a time in streamed responses
+STREAM_BLOCK_ROWS = 1024
+
 
 class ListRecords(BaseModel):
     ensemble: Mapping[str, str]
     forward_model: Mapping[str, str]
 
 
+class ColumnSelection:
+    """
+    Columns of matrix records that are selected either by their labels, by an
+    inclusive range of labels, or by a slice of their positions. Selecting by
+    label has no effect on unlabeled matrices.
+    """
+
+    def __init__(
+        self,
+        labels: Optional[List[str]] = None,
+        label_from: Optional[str] = None,
+        label_to: Optional[str] = None,
+        columns: Union[None, int, slice] = None,
+    ) -> None:
+        self.labels = labels
+        self.label_from = label_from
+        self.label_to = label_to
+        self.columns = columns
+        # Resolved positions by column label set, which are the same for
+        # every matrix that shares the labels
+        self._positions: Dict[int, np.ndarray] = {}
+
+    @property
+    def is_all(self) -> bool:
+        return (
+            self.labels is None
+            and self.label_from is None
+            and self.label_to is None
+            and self.columns is None
+        )
+
+    def resolve(self, matrix: ds.F64Matrix) -> Optional[np.ndarray]:
+        """
+        Positions of the selected columns of the matrix, or None for all of them
+        """
+        if self.columns is not None:
+            try:
+                return np.atleast_1d(np.arange(matrix.shape_2d[1])[self.columns])
+            except IndexError:
+                raise exc.UnprocessableError(f"Column {self.columns} out of range")
+        if self.is_all or not matrix.is_labeled:
+            return None
+
+        key = matrix.column_label_set_pk
+        if key is None:
+            return self._resolve_labels(matrix)
+        if key not in self._positions:
+            self._positions[key] = self._resolve_labels(matrix)
+        return self._positions[key]
+
+    def _resolve_labels(self, matrix: ds.F64Matrix) -> np.ndarray:
+        bounds = [self.label_from, self.label_to]
+        wanted: List[Optional[str]] = [*(self.labels or bounds)]
+        positions = matrix.column_positions(label for label in wanted if label)
+        for label in wanted:
+            if label is not None and label not in positions:
+                raise exc.UnprocessableError(f"Record label '{label}' not found!")
+
+        if self.labels is not None:
+            return np.array([positions[label] for label in self.labels])
+        start = positions[self.label_from] if self.label_from is not None else 0
+        stop = (
+            positions[self.label_to] + 1
+            if self.label_to is not None
+            else matrix.shape_2d[1]
+        )
+        if start >= stop:
+            raise exc.UnprocessableError(
+                f"Record label '{self.label_from}' comes after '{self.label_to}'"
+            )
+        return np.arange(start, stop)
+
+    def column_names(self, matrix: ds.F64Matrix, positions: np.ndarray) -> List[Any]:
+        if not matrix.is_labeled:
+            return positions.tolist()
+        if self.labels is not None:
+            return self.labels
+        labels = matrix.labels[0]
+        return [labels[position] for position in positions]
+
+
+def get_column_selection(
+    *,
+    label: Optional[List[str]] = Query(None),
+    label_from: Optional[str] = None,
+    label_to: Optional[str] = None,
+    columns: Optional[str] = None,
+) -> ColumnSelection:
+    """
+    Select columns by any number of `label`s, by the range of labels from
+    `label_from` to `label_to` (both inclusive and optional), or by `columns`,
+    a column index or a slice like "10:20" or "::2"
+    """
+    selectors = [label is not None, label_from or label_to, columns is not None]
+    if sum(bool(selector) for selector in selectors) > 1:
+        raise exc.UnprocessableError(
+            "Only one of 'label', 'label_from'/'label_to' and 'columns' can be given"
+        )
+    return ColumnSelection(
+        labels=label,
+        label_from=label_from,
+        label_to=label_to,
+        columns=_parse_columns(columns) if columns is not None else None,
+    )
+
+
+def _parse_columns(value: str) -> Union[int, slice]:
+    try:
+        parts = [int(part) if part.strip() else None for part in value.split(":")]
+    except ValueError:
+        parts = []
+    if len(parts) == 1 and parts[0] is not None:
+        return parts[0]
+    if not 2 <= len(parts) <= 3 or parts[2:] == [0]:
+        raise exc.UnprocessableError(
+            f"Columns must be an index or a slice like 'start:stop:step', not '{value}'"
+        )
+    return slice(*parts)
+
+
 def get_record_by_name(
     *,
     db: Session = Depends(get_db),
@@ -48,11 +207,17 @@ def get_record_by_name(
     name: str,
     realization_index: Optional[int] = None,
 ) -> ds.Record:
+    """
+    Get the record with the given name, together with its record info and file,
+    which the blob handlers use outside of the thread pool
+    """
+    options = (contains_eager(ds.Record.record_info), joinedload(ds.Record.file))
     try:
         return (
             db.query(ds.Record)
             .filter_by(realization_index=realization_index)
             .join(ds.RecordInfo)
+            .options(*options)
             .filter_by(name=name)
             .join(ds.Ensemble)
             .filter_by(id=ensemble_id)
@@ -66,6 +231,7 @@ def get_record_by_name(
             db.query(ds.Record)
             .filter_by(realization_index=None)
             .join(ds.RecordInfo)
+            .options(*options)
             .filter_by(
                 name=name,
                 record_type=ds.RecordType.f64_matrix,
@@ -83,37 +249,62 @@ def get_records_by_name(
     ensemble_id: UUID,
     name: str,
     realization_index: Optional[int] = None,
+    realizations: Optional[Realizations] = Depends(get_realizations),
 ) -> List[ds.Record]:
-    records = (
-        db.query(ds.Record)
-        .filter_by(realization_index=realization_index)
-        .join(ds.RecordInfo)
-        .filter_by(name=name)
-        .join(ds.Ensemble)
-        .filter_by(id=ensemble_id)
-    ).all()
+    """
+    Get the records with the given name, which are the first of:
 
-    if not records:
-        records = (
-            db.query(ds.Record)
-            .join(ds.RecordInfo)
-            .filter_by(
-                name=name,
-                record_type=ds.RecordType.f64_matrix,
+    1. The records of the selected realizations, or the ensemble-wide record if
+       neither `realization_index` nor `realizations` is given
+    2. The matrix records of all realizations, if `realizations` isn't given
+    3. The ensemble-wide record
+
+    The precedence is resolved in a single statement, which also loads the
+    record info and matrix of each record.
+    """
+    if realizations is not None and realization_index is not None:
+        raise exc.UnprocessableError(
+            "Only one of 'realization_index' and 'realizations' can be given"
+        )
+
+    def rank(record: Any, info: Any) -> Any:
+        index = record.realization_index
+        if realizations is not None:
+            return sa.case(
+                (filter_realizations(index, realizations), 0),
+                (index == None, 2),
             )
-            .join(ds.Ensemble)
-            .filter_by(id=ensemble_id)
-        ).all()
+        return sa.case(
+            (index == realization_index, 0),
+            (info.record_type == ds.RecordType.f64_matrix, 1),
+            (index == None, 2),
+        )
 
-    if not records:
-        records = (
-            db.query(ds.Record)
-            .filter_by(realization_index=None)
-            .join(ds.RecordInfo)
-            .filter_by(name=name)
-            .join(ds.Ensemble)
-            .filter_by(id=ensemble_id)
-        ).all()
+    ensemble_pk = (
+        sa.select(ds.Ensemble.pk).where(ds.Ensemble.id == ensemble_id).scalar_subquery()
+    )
+    other, other_info = aliased(ds.Record), aliased(ds.RecordInfo)
+    best_rank = (
+        sa.select(sa.func.min(rank(other, other_info)))
+        .join_from(other, other_info, other.record_info_pk == other_info.pk)
+        .where(other_info.name == name, other_info.ensemble_pk == ensemble_pk)
+        .scalar_subquery()
+    )
+    records = (
+        db.query(ds.Record)
+        .join(ds.Record.record_info)
+        .options(
+            contains_eager(ds.Record.record_info),
+            joinedload(ds.Record.file),
+            ds.load_matrix_payload(),
+        )
+        .filter(
+            ds.RecordInfo.name == name,
+            ds.RecordInfo.ensemble_pk == ensemble_pk,
+            rank(ds.Record, ds.RecordInfo) == best_rank,
+        )
+        .order_by(ds.Record.realization_index)
+    ).all()
 
     if not records:
         raise exc.NotFoundError(f"Record not found")
@@ -213,7 +404,7 @@ async def post_ensemble_record_file(
     Assign an arbitrary file to the given `name` record.
     """
     record.file = await bh.upload_file(file)
-    _create_record(db, record)
+    await run_in_threadpool(_create_record, db, record)
 
 
 @router.put("/ensembles/{ensemble_id}/records/{name}/blob")
@@ -232,7 +423,7 @@ async def add_block(
 
 
 @router.post("/ensembles/{ensemble_id}/records/{name}/blob")
-async def create_blob(
+def create_blob(
     *,
     db: Session = Depends(get_db),
     bh: BlobHandler = Depends(get_blob_handler),
@@ -255,8 +446,8 @@ async def finalize_blob(
     """
     Commit all staged blocks to a blob record
     """
-    submitted_blocks = list(
-        db.query(ds.FileBlock)
+    submitted_blocks = await run_in_threadpool(
+        lambda: db.query(ds.FileBlock)
         .filter_by(
             record_name=record.name,
             ensemble_pk=record.ensemble_pk,
@@ -267,6 +458,39 @@ async def finalize_blob(
     )
     await bh.finalize_blob(submitted_blocks, record)
 
+    # The blocks are no longer needed once they are part of the blob
+    for block in submitted_blocks:
+        db.delete(block)
+
+
+@router.post("/ensembles/{ensemble_id}/records")
+async def post_ensemble_records(
+    *,
+    db: Session = Depends(get_db),
+    ensemble_id: UUID,
+    content_type: str = Header(...),
+    request: Request,
+) -> None:
+    """
+    Create many matrix records at once, eg. a parameter for all realizations.
+
+    With Content-Type 'application/x-npz', the body is an NPZ archive where each
+    array is named `name` for an ensemble-wide record or `name@realization_index`
+    for a forward-model record. With Content-Type
+    'application/vnd.apache.arrow.stream', the body is an Arrow IPC stream with
+    the columns `name`, `realization_index` (null for ensemble-wide records) and
+    `values`, a list of floats.
+
+    Either all records are created, or none of them are.
+    """
+    body = await request.body()
+
+    def create() -> None:
+        ensemble = db.query(ds.Ensemble).filter_by(id=ensemble_id).one()
+        create_records(db, ensemble, run_codec(read_entries, body, content_type))
+
+    await run_in_threadpool(create)
+
 
 @router.post(
     "/ensembles/{ensemble_id}/records/{name}/matrix", response_model=js.RecordOut
@@ -287,34 +511,16 @@ async def post_ensemble_record_matrix(
         )
         content_type = "text/csv"
 
-    labels = None
+    return await run_in_threadpool(
+        _create_record_matrix, db, record, content_type, await request.body()
+    )
+
 
+def _create_record_matrix(
+    db: Session, record: ds.Record, content_type: str, body: bytes
+) -> js.RecordOut:
     try:
-        if content_type == "application/json":
-            content = np.array(await request.json(), dtype=np.float64)
-        elif content_type == "application/x-numpy":
-            from numpy.lib.format import read_array
-
-            stream = io.BytesIO(await request.body())
-            content = read_array(stream)
-        elif content_type == "text/csv":
-            stream = io.BytesIO(await request.body())
-            df = pd.read_csv(stream, index_col=0, float_precision="round_trip")
-            content = df.values
-            labels = [
-                [str(v) for v in df.columns.values],
-                [str(v) for v in df.index.values],
-            ]
-        elif content_type == "application/x-parquet":
-            stream = io.BytesIO(await request.body())
-            df = pd.read_parquet(stream)
-            content = df.values
-            labels = [
-                [v for v in df.columns.values],
-                [v for v in df.index.values],
-            ]
-        else:
-            raise ValueError()
+        content, labels = run_codec(_read_matrix, content_type, body)
     except ValueError:
         if record.realization_index is None:
             message = f"Ensemble-wide record '{record.name}' for needs to be a matrix"
@@ -334,14 +540,57 @@ async def post_ensemble_record_matrix(
                 "must have dimensionality of at least 2"
             )
 
-    matrix_obj = ds.F64Matrix(content=content.tolist(), labels=labels)
+    matrix_obj = ds.F64Matrix(content=content, labels=labels)
 
     record.f64_matrix = matrix_obj
-    return _create_record(db, record)
+    return js.RecordOut.from_orm(_create_record(db, record))
+
+
+def _read_matrix(
+    content_type: str, body: bytes
+) -> Tuple[np.ndarray, Optional[List[List[Any]]]]:
+    """
+    Decode a matrix and its column and row labels, if any, from the request
+    body. Raises ValueError if the body isn't a matrix.
+    """
+    labels = None
+    if content_type == "application/json":
+        content = np.array(json.loads(body), dtype=np.float64)
+    elif content_type == "application/x-numpy":
+        from numpy.lib.format import read_array
+
+        stream = io.BytesIO(body)
+        content = read_array(stream)
+    elif content_type == "text/csv":
+        stream = io.BytesIO(body)
+        df = pd.read_csv(stream, index_col=0, float_precision="round_trip")
+        content = df.values
+        labels = [
+            [str(v) for v in df.columns.values],
+            [str(v) for v in df.index.values],
+        ]
+    elif content_type == "application/x-parquet":
+        stream = io.BytesIO(body)
+        df = pd.read_parquet(stream)
+        content = df.values
+        labels = [
+            [v for v in df.columns.values],
+            [v for v in df.index.values],
+        ]
+    elif content_type == ARROW_STREAM_MIMETYPE:
+        df = pa.ipc.open_stream(body).read_pandas()
+        content = df.values
+        labels = [
+            [v for v in df.columns.values],
+            [v for v in df.index.values],
+        ]
+    else:
+        raise ValueError()
+    return content, labels
 
 
 @router.put("/ensembles/{ensemble_id}/records/{name}/userdata")
-async def replace_record_userdata(
+def replace_record_userdata(
     *,
     db: Session = Depends(get_db),
     record: ds.Record = Depends(get_record_by_name),
@@ -355,7 +604,7 @@ async def replace_record_userdata(
 
 
 @router.patch("/ensembles/{ensemble_id}/records/{name}/userdata")
-async def patch_record_userdata(
+def patch_record_userdata(
     *,
     db: Session = Depends(get_db),
     record: ds.Record = Depends(get_record_by_name),
@@ -372,7 +621,7 @@ async def patch_record_userdata(
 @router.get(
     "/ensembles/{ensemble_id}/records/{name}/userdata", response_model=Mapping[str, Any]
 )
-async def get_record_userdata(
+def get_record_userdata(
     *,
     record: ds.Record = Depends(get_record_by_name),
 ) -> Mapping[str, Any]:
@@ -383,7 +632,7 @@ async def get_record_userdata(
 
 
 @router.post("/ensembles/{ensemble_id}/records/{name}/observations")
-async def post_record_observations(
+def post_record_observations(
     *,
     db: Session = Depends(get_db),
     record: ds.Record = Depends(get_record_by_name),
@@ -400,7 +649,7 @@ async def post_record_observations(
 
 
 @router.get("/ensembles/{ensemble_id}/records/{name}/observations")
-async def get_record_observations(
+def get_record_observations(
     *,
     db: Session = Depends(get_db),
     record: ds.Record = Depends(get_record_by_name),
@@ -459,6 +708,28 @@ To parse data using Python, assuming ERT Storage is running on `http://localhost
 """
 
 
+GET_ARROW_DESCRIPTION = """\
+Data encoded as an Apache Arrow IPC stream, with the column labels as the names
+of the fields and the row labels as the pandas index.
+
+To parse data using Python, assuming ERT Storage is running on `http://localhost:8000` :
+
+```python
+   import pyarrow as pa
+   import requests
+
+   resp = requests.get(
+       "http://localhost:8000/ensembles/{ENSEMBLE_ID}/records/{RECORD_NAME}",
+       headers={"Accept": "application/vnd.apache.arrow.stream"}
+   )
+   df = pa.ipc.open_stream(resp.content).read_pandas()
+
+   # Print the pandas DataFrame
+   print(df)
+```
+"""
+
+
 @router.get(
     "/ensembles/{ensemble_id}/records/{name}",
     responses={
@@ -496,6 +767,14 @@ To parse data using Python, assuming ERT Storage is running on `http://localhost
                         }
                     }
                 },
+                "application/vnd.apache.arrow.stream": {
+                    "examples": {
+                        "success": {
+                            "summary": "Fetch data encoded as an Arrow IPC stream",
+                            "description": GET_ARROW_DESCRIPTION,
+                        }
+                    }
+                },
             },
         }
     },
@@ -507,7 +786,8 @@ async def get_ensemble_record(
     records: List[ds.Record] = Depends(get_records_by_name),
     accept: str = Header("application/json"),
     realization_index: Optional[int] = None,
-    label: Optional[str] = None,
+    realizations: Optional[Realizations] = Depends(get_realizations),
+    selection: ColumnSelection = Depends(get_column_selection),
 ) -> Any:
     """
     Get record with a given `name`. If `realization_index` is not set, look for
@@ -516,6 +796,12 @@ async def get_ensemble_record(
     record.
     If label is provided it is assumed the record data is of the form {"a": 1, "b": 2}
     and will return only the data for the provided label (i.e. label = "a" -> return: [[1]])
+    The `label` parameter can be repeated to select several columns. Instead of
+    labels, a range of labels can be selected with `label_from` and `label_to`,
+    eg. a range of dates, or columns by position with `columns`, eg. "10:20".
+    Only the stored tiles that cover the selected columns are read.
+    A subset of the realizations can be selected with `realizations`, which is a
+    comma-separated list of indices and inclusive ranges, eg. "0-9,15".
 
 
     Records support multiple data formats. In particular:
@@ -534,9 +820,61 @@ async def get_ensemble_record(
     if _type == ds.RecordType.file:
         return await bh.get_content(records[0])
 
+    response = await run_in_threadpool(
+        _get_matrix_records_response,
+        records,
+        accept,
+        realization_index,
+        realizations,
+        selection,
+    )
+    if realization_index is None:
+        # Stack the records for the next request, after this one is sent
+        response.background = rebuild_task(db, records)
+    return response
+
+
+def _get_matrix_records_response(
+    records: List[ds.Record],
+    accept: str,
+    realization_index: Optional[int],
+    realizations: Optional[Realizations],
+    selection: ColumnSelection,
+) -> Response:
+    if (
+        realization_index is None
+        and (stacked := get_ensemble_matrix_rows(records)) is not None
+    ):
+        matrix, stacked_rows = stacked
+        response = _get_ensemble_matrix_response(
+            matrix,
+            sorted(record.realization_index for record in records),
+            accept,
+            selection,
+            stacked_rows,
+        )
+        # Otherwise the stacked matrix was replaced while it was read, so read
+        # the records one by one instead
+        if is_ensemble_matrix(matrix):
+            return response
+
+    # Ensemble-wide records hold one row per realization
+    rows = (
+        Realizations([(realization_index, realization_index)])
+        if realization_index is not None
+        else realizations
+    )
+
+    if accept == "application/x-numpy" and selection.is_all:
+        npy_response = _get_record_npy_response(
+            records, realization_index, realizations
+        )
+        if npy_response is not None:
+            return npy_response
+
     df_list = []
     for record in records:
-        data_df = _get_record_dataframe(record, realization_index, label)
+        data_df = _get_record_dataframe(record, rows, selection)
         df_list.append(data_df)
 
     # Combine data for each realization into one dataframe
@@ -544,11 +882,41 @@ async def get_ensemble_record(
     # Sort data by realization number
     data_frame.sort_index(axis=0, inplace=True)
 
-    return await _get_record_resonse(data_frame, accept)
+    return _get_record_resonse(data_frame, accept)
+
+
+@router.get("/ensembles/{ensemble_id}/record_data")
+def get_ensemble_record_data(
+    *,
+    db: Session = Depends(get_db),
+    ensemble_id: UUID,
+    name: Optional[List[str]] = Query(None),
+    realization_index: Optional[List[int]] = Query(None),
+    label: Optional[str] = None,
+    accept: str = Header(ARROW_STREAM_MIMETYPE),
+) -> Response:
+    """
+    Get many matrix records at once, in the same formats as are accepted by
+    `POST /ensembles/{ensemble_id}/records`: an Arrow IPC stream, or an NPZ
+    archive when `accept` is 'application/x-npz'.
+
+    Every `name` that is given is returned, or all matrix records when none are.
+    If `realization_index` is given, only forward-model records of those
+    realizations are returned, and ensemble-wide records are split into one
+    entry per realization. If `label` is given, only that column of labeled
+    records is returned.
+    """
+    ensemble = db.query(ds.Ensemble).filter_by(id=ensemble_id).one()
+    entries = read_records(db, ensemble, name, realization_index, label)
+    media_type = NPZ_MIMETYPE if accept == NPZ_MIMETYPE else ARROW_STREAM_MIMETYPE
+    return Response(
+        content=run_codec(write_entries, entries, media_type),
+        media_type=media_type,
+    )
 
 
 @router.get("/ensembles/{ensemble_id}/records/{name}/labels", response_model=List[str])
-async def get_record_labels(
+def get_record_labels(
     *,
     db: Session = Depends(get_db),
     ensemble_id: UUID,
@@ -567,53 +935,53 @@ async def get_record_labels(
       return: []
     """
 
-    record = (
-        db.query(ds.Record)
-        .join(ds.RecordInfo)
-        .filter_by(name=name)
-        .join(ds.Ensemble)
-        .filter_by(id=ensemble_id)
-        .first()
-    )
-    if record is None:
+    labels = _get_column_labels(db, ensemble_id, [name])
+    if name not in labels:
         raise exc.NotFoundError(f"Record not found")
-
-    if record.f64_matrix and record.f64_matrix.labels:
-        return record.f64_matrix.labels[0]
-    return []
+    return labels[name] or []
 
 
 @router.get("/ensembles/{ensemble_id}/parameters", response_model=List[Dict[str, Any]])
-async def get_ensemble_parameters(
+def get_ensemble_parameters(
     *, db: Session = Depends(get_db), ensemble_id: UUID
 ) -> List[Dict[str, Any]]:
     ensemble = db.query(ds.Ensemble).filter_by(id=ensemble_id).one()
-    parameters = []
-    for name in ensemble.parameter_names:
-        param = {"name": name, "labels": []}
-        record = (
-            db.query(ds.Record)
-            .join(ds.RecordInfo)
-            .filter_by(name=name)
-            .join(ds.Ensemble)
-            .filter_by(id=ensemble_id)
-            .first()
-        )
-        if record is None:
-            parameters.append(param)
-            continue
+    labels = _get_column_labels(db, ensemble_id, ensemble.parameter_names)
+    return [
+        {"name": name, "labels": labels.get(name) or []}
+        for name in ensemble.parameter_names
+    ]
 
-        if record.f64_matrix and record.f64_matrix.labels:
-            param["labels"] = record.f64_matrix.labels[0]
 
-        parameters.append(param)
-    return parameters
+def _get_column_labels(
+    db: Session, ensemble_id: UUID, names: Sequence[str]
+) -> Dict[str, Optional[List[Any]]]:
+    """
+    Get the column labels of the first record of each name, or None for those
+    that aren't labeled, in a single query that reads neither the records nor
+    their matrices. Names without records are left out.
+    """
+    first_records = (
+        db.query(ds.RecordInfo.name, sa.func.min(ds.Record.pk).label("pk"))
+        .join(ds.RecordInfo.records)
+        .join(ds.RecordInfo.ensemble)
+        .filter(ds.Ensemble.id == ensemble_id, ds.RecordInfo.name.in_(names))
+        .group_by(ds.RecordInfo.name)
+        .subquery()
+    )
+    return dict(
+        db.query(first_records.c.name, ds.LabelSet.labels)
+        .select_from(first_records)
+        .join(ds.Record, ds.Record.pk == first_records.c.pk)
+        .outerjoin(ds.F64Matrix, ds.F64Matrix.pk == ds.Record.f64_matrix_pk)
+        .outerjoin(ds.LabelSet, ds.LabelSet.pk == ds.F64Matrix.column_label_set_pk)
+    )
 
 
 @router.get(
     "/ensembles/{ensemble_id}/records", response_model=Mapping[str, js.RecordOut]
 )
-async def get_ensemble_records(
+def get_ensemble_records(
     *, db: Session = Depends(get_db), ensemble_id: UUID
 ) -> Mapping[str, ds.Record]:
     return {
@@ -621,6 +989,10 @@ async def get_ensemble_records(
         for rec in (
             db.query(ds.Record)
             .join(ds.RecordInfo)
+            .options(
+                contains_eager(ds.Record.record_info),
+                undefer(ds.Record.has_observations),
+            )
             .join(ds.Ensemble)
             .filter_by(id=ensemble_id)
             .all()
@@ -629,8 +1001,13 @@ async def get_ensemble_records(
 
 
 @router.get("/records/{record_id}", response_model=js.RecordOut)
-async def get_record(*, db: Session = Depends(get_db), record_id: UUID) -> ds.Record:
-    return db.query(ds.Record).filter_by(id=record_id).one()
+def get_record(*, db: Session = Depends(get_db), record_id: UUID) -> ds.Record:
+    return (
+        db.query(ds.Record)
+        .options(undefer(ds.Record.has_observations))
+        .filter_by(id=record_id)
+        .one()
+    )
 
 
 @router.get("/records/{record_id}/data")
@@ -646,13 +1023,31 @@ async def get_record_data(
         )
         accept = "text/csv"
 
-    record = db.query(ds.Record).filter_by(id=record_id).one()
+    record = await run_in_threadpool(
+        db.query(ds.Record)
+        .options(
+            joinedload(ds.Record.record_info),
+            joinedload(ds.Record.file),
+            ds.load_matrix_payload(),
+        )
+        .filter_by(id=record_id)
+        .one
+    )
     if record.record_info.record_type == ds.RecordType.file:
-        bh = get_blob_handler_from_record(db, record)
+        bh = await run_in_threadpool(get_blob_handler_from_record, db, record)
         return await bh.get_content(record)
 
-    dataframe = _get_record_dataframe(record, None, None)
-    return await _get_record_resonse(dataframe, accept)
+    return await run_in_threadpool(_get_record_data_response, record, accept)
+
+
+def _get_record_data_response(record: ds.Record, accept: Optional[str]) -> Response:
+    if accept == "application/x-numpy":
+        response = _get_record_npy_response([record], None)
+        if response is not None:
+            return response
+
+    dataframe = _get_record_dataframe(record, None, ColumnSelection())
+    return _get_record_resonse(dataframe, accept)
 
 
 @router.get(
@@ -666,6 +1061,10 @@ def get_ensemble_responses(
         for rec in (
             db.query(ds.Record)
             .join(ds.RecordInfo)
+            .options(
+                contains_eager(ds.Record.record_info),
+                undefer(ds.Record.has_observations),
+            )
             .filter_by(record_class=ds.RecordClass.response)
             .join(ds.Ensemble)
             .filter_by(id=ensemble_id)
@@ -676,90 +1075,315 @@ def get_ensemble_responses(
 
 def _get_record_dataframe(
     record: ds.Record,
-    realization_index: Optional[int],
-    label: Optional[str],
+    realizations: Optional[Realizations],
+    selection: ColumnSelection,
 ) -> pd.DataFrame:
     type_ = record.record_info.record_type
     if type_ != ds.RecordType.f64_matrix:
         raise exc.ExpectationError("Non matrix record not supported")
 
-    labels = record.f64_matrix.labels
-    content_is_labeled = labels is not None
-    label_specified = label is not None
-
-    if content_is_labeled and label_specified and label not in labels[0]:
-        raise exc.UnprocessableError(f"Record label '{label}' not found!")
-
-    if realization_index is None or record.realization_index is not None:
-        matrix_content = record.f64_matrix.content
-    elif record.realization_index is None:
-        matrix_content = record.f64_matrix.content[realization_index]
-    if not isinstance(matrix_content[0], List):
-        matrix_content = [matrix_content]
-
-    if content_is_labeled and label_specified:
-        lbl_idx = labels[0].index(label)
-        data = pd.DataFrame([[c[lbl_idx]] for c in matrix_content])
-        data.columns = [label]
-    elif content_is_labeled:
-        data = pd.DataFrame(matrix_content)
-        data.columns = labels[0]
+    matrix = record.f64_matrix
+    content_is_labeled = matrix.is_labeled
+    positions = selection.resolve(matrix)
+
+    rows: Optional[List[int]] = None
+    shape = matrix.shape
+    if realizations is not None and record.realization_index is None:
+        # Realizations that the record has no row for are left out, like
+        # those without a forward-model record
+        rows = realizations.indices_below(shape[0])
+        shape = (
+            shape[1:] if len(realizations) == 1 and rows else (len(rows), *shape[1:])
+        )
+
+    if positions is not None:
+        data = pd.DataFrame(
+            matrix.read(rows, positions),
+            columns=selection.column_names(matrix, positions),
+        )
+        return _set_record_dataframe_index(data, record, rows)
+
+    matrix_content = matrix.read(rows).reshape(shape)
+    if matrix_content.ndim < 2:
+        matrix_content = matrix_content.reshape(1, -1)
+
+    if matrix_content.ndim > 2:
+        # DataFrames are 2-dimensional, so keep the trailing axes as nested
+        # lists in each cell
+        data = pd.DataFrame(matrix_content.tolist())
     else:
         data = pd.DataFrame(matrix_content)
+        if content_is_labeled:
+            data.columns = matrix.labels[0]
+
+    return _set_record_dataframe_index(data, record, rows)
+
+
+def _set_record_dataframe_index(
+    data: pd.DataFrame, record: ds.Record, rows: Optional[Sequence[int]]
+) -> pd.DataFrame:
+    labels = record.f64_matrix.labels
 
     # Set data index for labled content
-    if content_is_labeled:
+    if labels is not None:
         if record.realization_index is not None:
             data.index = [record.realization_index]
-        elif realization_index is not None:
-            data.index = [realization_index]
+        elif rows is not None:
+            data.index = list(rows)
         else:
             data.index = labels[1]
 
     return data
 
 
-async def _get_record_resonse(
-    dataframe: pd.DataFrame,
+Buffer = Union[bytes, memoryview]
+
+
+class BufferResponse(Response):
+    """
+    Response that sends a sequence of bytes-like objects as-is, without first
+    joining them or converting them to `bytes`
+    """
+
+    def __init__(
+        self,
+        buffers: Sequence[Buffer],
+        media_type: str,
+        status_code: int = 200,
+    ) -> None:
+        self.buffers = buffers
+        content_length = sum(memoryview(buf).nbytes for buf in buffers)
+        super().__init__(
+            status_code=status_code,
+            media_type=media_type,
+            headers={"content-length": str(content_length)},
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        for buf in self.buffers:
+            await send({"type": "http.response.body", "body": buf, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _get_ensemble_matrix_response(
+    matrix: ds.F64Matrix,
+    realizations: Sequence[int],
     accept: Optional[str],
+    selection: ColumnSelection,
+    rows: Optional[Sequence[int]] = None,
 ) -> Response:
-    if accept == "application/x-numpy":
-        from numpy.lib.format import write_array
+    """
+    Respond with forward-model records that are stacked by realization, in the
+    same way as when they are read and concatenated one by one. Only the given
+    `rows` are read, if any.
+    """
+    from numpy.lib.format import write_array_header_1_0
+
+    if accept == "application/x-numpy" and selection.is_all and rows is None:
+        header = io.BytesIO()
+        write_array_header_1_0(
+            header,
+            {"descr": matrix.dtype, "fortran_order": False, "shape": matrix.shape_2d},
+        )
+        return BufferResponse(
+            [header.getvalue(), *matrix.iter_row_buffers()],
+            media_type="application/x-numpy",
+        )
+
+    positions = selection.resolve(matrix)
+    if positions is not None:
+        data = pd.DataFrame(
+            matrix.read(rows, positions),
+            columns=selection.column_names(matrix, positions),
+        )
+    else:
+        data = pd.DataFrame(matrix.read(rows))
+        if matrix.is_labeled:
+            data.columns = matrix.labels[0]
+
+    # Unlabeled records keep the index of their single row
+    data.index = list(realizations) if matrix.is_labeled else [0] * len(data)
+    return _get_record_resonse(data, accept)
+
+
+def _realization_sort_key(record: ds.Record) -> int:
+    return -1 if record.realization_index is None else record.realization_index
+
+
+def _get_record_npy_response(
+    records: Sequence[ds.Record],
+    realization_index: Optional[int],
+    realizations: Optional[Realizations] = None,
+) -> Optional[Response]:
+    """
+    Build an NPY response by writing the NPY header followed by the stored
+    matrix tiles (or slices of them) directly. No lists or DataFrames are
+    created, and tiles are only copied when a matrix is more than one tile
+    wide.
+
+    Returns None if the records can't be combined without realigning labels,
+    in which case the caller should fall back to the DataFrame based encoder.
+    """
+    from numpy.lib.format import write_array_header_1_0
+
+    if any(rec.record_type != ds.RecordType.f64_matrix for rec in records):
+        return None
+    if realizations is not None and any(
+        rec.realization_index is None for rec in records
+    ):
+        return None
+
+    records = sorted(records, key=_realization_sort_key)
+    matrices = [rec.f64_matrix for rec in records]
+    dtype = matrices[0].dtype
+    if any(mat.dtype != dtype for mat in matrices):
+        return None
+
+    # Labeled records are combined by aligning their columns, which is only a
+    # no-op when all of them have the same column labels, ie. label set
+    column_labels = [mat.column_label_set_pk for mat in matrices]
+    if any(labels != column_labels[0] for labels in column_labels):
+        return None
+
+    buffers: List[Buffer] = []
+    shapes: List[Sequence[int]] = []
+    for record, matrix in zip(records, matrices):
+        shape: Sequence[int] = matrix.shape
+        if realization_index is not None and record.realization_index is None:
+            if len(shape) == 0 or not 0 <= realization_index < shape[0]:
+                return None
+            buffers.extend(
+                matrix.iter_row_buffers(realization_index, realization_index + 1)
+            )
+            shape = shape[1:]
+        else:
+            buffers.extend(matrix.iter_row_buffers())
+        if len(shape) < 2:
+            shape = [1, int(np.prod(shape, dtype=np.int64))]
+        shapes.append(shape)
+
+    if len(shapes) == 1:
+        total_shape = tuple(shapes[0])
+    elif all(len(shape) == 2 and shape[1] == shapes[0][1] for shape in shapes):
+        total_shape = (sum(shape[0] for shape in shapes), shapes[0][1])
+    else:
+        return None
 
-        stream = io.BytesIO()
-        write_array(stream, np.array(dataframe.values.tolist()))
+    header = io.BytesIO()
+    write_array_header_1_0(
+        header, {"descr": dtype, "fortran_order": False, "shape": total_shape}
+    )
+    return BufferResponse(
+        [header.getvalue(), *buffers], media_type="application/x-numpy"
+    )
 
+
+def _get_record_resonse(
+    dataframe: pd.DataFrame,
+    accept: Optional[str],
+) -> Response:
+    if accept == "application/x-numpy":
         return Response(
-            content=stream.getvalue(),
+            content=run_codec(_encode_npy, dataframe),
             media_type=accept,
         )
     if accept == "text/csv":
+        return StreamingResponse(_iter_csv(dataframe), media_type=accept)
+    if accept == "application/x-parquet":
         return Response(
-            content=dataframe.to_csv().encode(),
+            content=run_codec(_encode_parquet, dataframe),
             media_type=accept,
         )
-    if accept == "application/x-parquet":
-        stream = io.BytesIO()
-        dataframe.to_parquet(stream)
-        return Response(
-            content=stream.getvalue(),
+    if accept == ARROW_STREAM_MIMETYPE:
+        return StreamingResponse(
+            _iter_arrow_stream(run_codec(pa.Table.from_pandas, dataframe)),
             media_type=accept,
         )
     else:
         if dataframe.values.shape[0] == 1:
-            content = dataframe.values[0].tolist()
-        else:
-            content = dataframe.values.tolist()
-        return Response(
-            content=json.dumps(content),
-            media_type="application/json",
+            return Response(
+                content=run_codec(_encode_json, dataframe.values[0]),
+                media_type="application/json",
+            )
+        return StreamingResponse(
+            _iter_json(dataframe.values), media_type="application/json"
         )
 
 
+def _encode_npy(dataframe: pd.DataFrame) -> bytes:
+    from numpy.lib.format import write_array
+
+    stream = io.BytesIO()
+    write_array(stream, np.array(dataframe.values.tolist()))
+    return stream.getvalue()
+
+
+def _encode_parquet(dataframe: pd.DataFrame) -> bytes:
+    stream = io.BytesIO()
+    dataframe.to_parquet(stream)
+    return stream.getvalue()
+
+
+def _encode_csv(dataframe: pd.DataFrame, header: bool) -> bytes:
+    return dataframe.to_csv(header=header).encode()
+
+
+def _encode_json(values: np.ndarray) -> bytes:
+    return json.dumps(values.tolist()).encode()
+
+
+def _iter_csv(dataframe: pd.DataFrame) -> Iterator[bytes]:
+    """
+    Encode the dataframe like `dataframe.to_csv()`, a block of rows at a time
+    """
+    yield run_codec(_encode_csv, dataframe.iloc[:0], True)
+    for start in range(0, len(dataframe), STREAM_BLOCK_ROWS):
+        block = dataframe.iloc[start : start + STREAM_BLOCK_ROWS]
+        yield run_codec(_encode_csv, block, False)
+
+
+def _iter_json(values: np.ndarray) -> Iterator[bytes]:
+    """
+    Encode the rows like `json.dumps(values.tolist())`, a block of rows at a
+    time
+    """
+    yield b"["
+    for start in range(0, len(values), STREAM_BLOCK_ROWS):
+        block = run_codec(_encode_json, values[start : start + STREAM_BLOCK_ROWS])
+        yield (b", " if start > 0 else b"") + block[1:-1]
+    yield b"]"
+
+
+def _iter_arrow_stream(table: pa.Table) -> Iterator[bytes]:
+    """
+    Encode the table as an Arrow IPC stream, one record batch at a time
+    """
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=STREAM_BLOCK_ROWS):
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
 def _create_record(
     db: Session,
     record: ds.Record,
 ) -> ds.Record:
+    if record.f64_matrix is not None:
+        _deduplicate_label_sets(db, record.f64_matrix)
+    record.f64_matrix = _deduplicate(db, record.f64_matrix)
+    record.file = _deduplicate(db, record.file)
+
     nested = db.begin_nested()
     try:
         db.add(record)
@@ -800,3 +1424,43 @@ def _create_record(
         db.commit()
 
     return record
+
+
+Payload = TypeVar("Payload", ds.File, ds.F64Matrix, ds.LabelSet)
+
+
+def _deduplicate_label_sets(db: Session, matrix: ds.F64Matrix) -> None:
+    """
+    Use the stored label sets that are equal to those of the matrix, and store
+    the rest, so that the matrix can be deduplicated by its label sets
+    """
+    for axis in ("column", "row"):
+        label_set = getattr(matrix, f"{axis}_label_set")
+        if label_set is None or sa.inspect(label_set).has_identity:
+            continue
+        label_set = _deduplicate(db, label_set)
+        if not sa.inspect(label_set).has_identity:
+            db.add(label_set)
+            db.flush()
+        setattr(matrix, f"{axis}_label_set", label_set)
+        setattr(matrix, f"{axis}_label_set_pk", label_set.pk)
+
+
+def _deduplicate(db: Session, payload: Optional[Payload]) -> Optional[Payload]:
+    """
+    If an identical payload is already stored, return it instead, so that the
+    new payload doesn't need to be written.
+    """
+    if (
+        payload is None
+        or payload.content_hash is None
+        or sa.inspect(payload).has_identity
+    ):
+        return payload
+
+    duplicate = ds.find_duplicate(db, payload)
+    if duplicate is None:
+        return payload
+    if payload in db:
+        db.expunge(payload)
+    return duplicate
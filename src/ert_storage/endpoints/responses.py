@@ -1,3 +1,4 @@
+from typing import List, Optional
 from uuid import uuid4, UUID
 import pandas as pd
 from fastapi import (
@@ -8,17 +9,32 @@ from fastapi.responses import Response
 from pandas.core.frame import DataFrame
 from ert_storage.database import Session, get_db, HAS_AZURE_BLOB_STORAGE
 from ert_storage import database_schema as ds
+from ert_storage.endpoints._codec_pool import run_codec
+from ert_storage.endpoints._realizations import (
+    Realizations,
+    filter_realizations,
+    get_realizations,
+)
 
 router = APIRouter(tags=["response"])
 
 
 @router.get("/ensembles/{ensemble_id}/responses/{response_name}/data")
-async def get_ensemble_response_dataframe(
-    *, db: Session = Depends(get_db), ensemble_id: UUID, response_name: str
+def get_ensemble_response_dataframe(
+    *,
+    db: Session = Depends(get_db),
+    ensemble_id: UUID,
+    response_name: str,
+    realizations: Optional[Realizations] = Depends(get_realizations),
 ) -> Response:
+    """
+    Get the response of all realizations, or of those selected by
+    `realizations`, eg. "0-9,15", as a CSV with a row per realization
+    """
     ensemble = db.query(ds.Ensemble).filter_by(id=ensemble_id).one()
-    records = (
+    query = (
         db.query(ds.Record)
+        .options(ds.load_matrix_payload())
         .filter(ds.Record.realization_index != None)
         .join(ds.RecordInfo)
         .filter_by(
@@ -26,7 +42,12 @@ async def get_ensemble_response_dataframe(
             name=response_name,
             record_class=ds.RecordClass.response,
         )
-    ).all()
+    )
+    if realizations is not None:
+        query = query.filter(
+            filter_realizations(ds.Record.realization_index, realizations)
+        )
+    records = query.order_by(ds.Record.realization_index).all()
     df_list = []
     for record in records:
         data_df = pd.DataFrame(record.f64_matrix.content)
@@ -39,6 +60,10 @@ async def get_ensemble_response_dataframe(
         df_list.append(data_df)
 
     return Response(
-        content=pd.concat(df_list, axis=0).to_csv().encode(),
+        content=run_codec(_encode_csv, df_list),
         media_type="text/csv",
     )
+
+
+def _encode_csv(dataframes: List[DataFrame]) -> bytes:
+    return pd.concat(dataframes, axis=0).to_csv().encode()
@@ -1,6 +1,8 @@
 from typing import Mapping, Any
 from fastapi import APIRouter, Depends
 from ert_storage.database import Session, get_db
+from ert_storage.endpoints import _codec_pool
+from ert_storage.endpoints.compute._misfits_cache import misfits_cache
 
 router = APIRouter(tags=["info"])
 
@@ -11,3 +13,19 @@ def info(
     db: Session = Depends(get_db),
 ) -> Mapping[str, Any]:
     return {"name": "Ert Storage Server"}
+
+
+@router.get("/server/metrics", response_model=Mapping[str, Any])
+def metrics(
+    *,
+    db: Session = Depends(get_db),
+) -> Mapping[str, Any]:
+    """
+    Load of the server, where `codec_pool.queue_depth` is the number of
+    encoding and decoding jobs that are waiting for a worker, and the use of
+    the misfits cache
+    """
+    return {
+        "codec_pool": _codec_pool.codec_pool.metrics(),
+        "misfits_cache": misfits_cache.metrics(),
+    }
@@ -1,4 +1,5 @@
-from typing import Any
+from functools import partial
+from typing import Any, Callable, Tuple
 from fastapi import status
 
 
@@ -12,6 +13,10 @@ class ErtStorageError(RuntimeError):
     def __init__(self, message: str, **kwargs: Any):
         super().__init__(message, kwargs)
 
+    def __reduce__(self) -> Tuple[Callable[..., "ErtStorageError"], Tuple[str]]:
+        # Errors are pickled when raised in worker processes
+        return partial(type(self), **self.args[1]), (self.args[0],)
+
 
 class NotFoundError(ErtStorageError):
     __status_code__ = status.HTTP_404_NOT_FOUND
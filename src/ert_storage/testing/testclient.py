@@ -1,6 +1,6 @@
 import os
 from contextlib import contextmanager
-from typing import Any, AsyncGenerator, Generator, Optional, Tuple, Union
+from typing import Any, Generator, Optional, Tuple, Union
 
 import requests
 from fastapi import Depends
@@ -154,9 +154,9 @@ def _override_get_db(session: sessionmaker) -> None:
     from ert_storage.app import app
     from ert_storage.database import IS_POSTGRES, get_db
 
-    async def override_get_db(
+    def override_get_db(
         *, _: None = Depends(security)
-    ) -> AsyncGenerator[Session, None]:
+    ) -> Generator[Session, None, None]:
         db = session()
 
         # Make PostgreSQL return float8 columns with highest precision. If we don't
@@ -0,0 +1,150 @@
+"""
+Benchmarks comparing the throughput and compression ratio of the codecs in
+ert_storage.compression on data similar to what ERT stores for the SPE1 case in
+tests/data/spe1_st.
+
+Run with:
+
+    pytest tests/benchmark -k benchmark -s
+"""
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from ert_storage import compression
+
+REFCASE = (
+    Path(__file__).parent.parent
+    / "data"
+    / "spe1_st"
+    / "resources"
+    / "refcase"
+    / "SPE1CASE2.UNSMRY"
+)
+NUM_REALIZATIONS = 100
+TILE_SIZE = 2**15
+REPEAT = 3
+
+
+def _read_unsmry(path):
+    """
+    Read the PARAMS arrays of an Eclipse unified summary file as a (time, key)
+    matrix. The file is a sequence of big-endian Fortran records, where each
+    keyword header is followed by one or more records of data.
+    """
+    buffer = path.read_bytes()
+    params = []
+    pos = 0
+    while pos < len(buffer):
+        header = np.frombuffer(buffer, dtype=">i4", count=1, offset=pos)[0]
+        keyword = buffer[pos + 4 : pos + 12].decode().strip()
+        count = int(np.frombuffer(buffer, dtype=">i4", count=1, offset=pos + 12)[0])
+        kind = buffer[pos + 16 : pos + 20].decode()
+        pos += header + 8
+
+        itemsize = {"REAL": 4, "INTE": 4, "LOGI": 4, "DOUB": 8, "CHAR": 8}[kind]
+        data = []
+        remaining = count
+        while remaining > 0:
+            length = int(np.frombuffer(buffer, dtype=">i4", count=1, offset=pos)[0])
+            data.append(buffer[pos + 4 : pos + 4 + length])
+            remaining -= length // itemsize
+            pos += length + 8
+        if keyword == "PARAMS":
+            params.append(np.frombuffer(b"".join(data), dtype=">f4"))
+    return np.array(params, dtype=np.float64)
+
+
+def _summary_ensemble():
+    """
+    Perturb the reference summary vectors into an ensemble, one matrix of time
+    steps and keys per realization. The simulator writes single precision, so
+    the perturbed values are rounded to float32 before being stored as float64.
+    """
+    refcase = _read_unsmry(REFCASE)
+    rng = np.random.default_rng(0)
+    scale = rng.lognormal(0.0, 0.1, size=(NUM_REALIZATIONS, 1, refcase.shape[1]))
+    ensemble = (refcase[np.newaxis] * scale).astype(np.float32)
+    return ensemble.astype(np.float64).reshape(NUM_REALIZATIONS, -1)
+
+
+def _gen_kw_ensemble():
+    """
+    Two uniformly distributed GEN_KW parameters, as in field_properties_priors
+    """
+    rng = np.random.default_rng(0)
+    return rng.uniform(0.1, 0.9, size=(NUM_REALIZATIONS, 2))
+
+
+def _field_ensemble():
+    """
+    A smooth porosity field on the 10x10x3 SPE1 grid
+    """
+    rng = np.random.default_rng(0)
+    x, y, z = np.meshgrid(
+        np.linspace(0, 1, 10), np.linspace(0, 1, 10), np.linspace(0, 1, 3)
+    )
+    phase = rng.uniform(0, 2 * np.pi, size=(NUM_REALIZATIONS, 1, 1, 1))
+    field = 0.2 + 0.05 * np.sin(2 * np.pi * (x + y) + phase) + 0.01 * z
+    return field.reshape(NUM_REALIZATIONS, -1)
+
+
+DATASETS = {
+    "summary": _summary_ensemble,
+    "gen_kw": _gen_kw_ensemble,
+    "field": _field_ensemble,
+}
+
+
+def _tiles(matrix):
+    """
+    Split the matrix into tiles the same way as ds.F64Matrix
+    """
+    tile_rows = max(1, min(32, matrix.shape[0]))
+    tile_columns = max(1, TILE_SIZE // tile_rows)
+    return [
+        np.ascontiguousarray(
+            matrix[row : row + tile_rows, column : column + tile_columns]
+        ).tobytes()
+        for row in range(0, matrix.shape[0], tile_rows)
+        for column in range(0, matrix.shape[1], tile_columns)
+    ]
+
+
+def _best_of(func):
+    elapsed = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func()
+        elapsed.append(time.perf_counter() - start)
+    return result, min(elapsed)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("dataset", list(DATASETS))
+def test_benchmark_compression(dataset):
+    matrix = DATASETS[dataset]()
+    tiles = _tiles(matrix)
+    nbytes = sum(len(tile) for tile in tiles)
+    codecs = ["none"] + [
+        codec for name in compression.COMPRESSORS for codec in (name, f"shuffle+{name}")
+    ]
+
+    print(f"\n{dataset}: {matrix.shape}, {nbytes / 2**10:.1f} KiB")
+    for codec in codecs:
+        packed, compress_time = _best_of(
+            lambda: [compression.compress(tile, codec, 8) for tile in tiles]
+        )
+        unpacked, decompress_time = _best_of(
+            lambda: [compression.decompress(tile, codec, 8) for tile in packed]
+        )
+        assert b"".join(unpacked) == b"".join(tiles)
+
+        ratio = nbytes / sum(len(tile) for tile in packed)
+        print(
+            f"{codec:>15}: ratio {ratio:6.2f}, "
+            f"compress {nbytes / compress_time / 2**20:9.1f} MiB/s, "
+            f"decompress {nbytes / decompress_time / 2**20:9.1f} MiB/s"
+        )
@@ -0,0 +1,149 @@
+"""
+Load test for concurrent requests against a running ert-storage server, to show
+that requests are served concurrently instead of one after the other on the
+event loop.
+
+Run with:
+
+    pytest tests/benchmark -k benchmark -s
+
+The server uses the database in ERT_STORAGE_DATABASE_URL, or a temporary SQLite
+database when it is unset. As the database is usually local when benchmarking,
+every statement is delayed by DATABASE_LATENCY to stand in for the round trip to
+a database server. Requests only wait for each other when that delay blocks the
+event loop.
+"""
+import asyncio
+import io
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+import pytest
+
+NUM_CELLS = 2**10
+NUM_REQUESTS = 64
+CONCURRENCY = [1, 2, 4, 8, 16]
+DATABASE_LATENCY = 0.005
+
+SERVER = """
+import sys
+import time
+
+import sqlalchemy as sa
+import uvicorn
+
+from ert_storage.database import engine
+
+@sa.event.listens_for(engine, "before_cursor_execute")
+def _latency(*args):
+    time.sleep(float(sys.argv[2]))
+
+uvicorn.run("ert_storage.app:app", port=int(sys.argv[1]), log_level="warning")
+"""
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server_url(tmp_path):
+    port = _free_port()
+    env = {**os.environ, "ERT_STORAGE_NO_TOKEN": "1"}
+    env.setdefault("ERT_STORAGE_DATABASE_URL", f"sqlite:///{tmp_path}/ert.db")
+    proc = subprocess.Popen(
+        [sys.executable, "-c", SERVER, str(port), str(DATABASE_LATENCY)], env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"{url}/healthcheck")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        else:
+            pytest.fail("ert-storage server did not start")
+        yield url
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def _npy(array):
+    stream = io.BytesIO()
+    np.save(stream, array)
+    return stream.getvalue()
+
+
+def _create_ensemble(client):
+    experiment_id = client.post("/experiments", json={"name": "load"}).json()["id"]
+    return client.post(
+        f"/experiments/{experiment_id}/ensembles",
+        json={"parameter_names": [], "response_names": [], "size": NUM_REQUESTS // 4},
+    ).json()["id"]
+
+
+async def _send(url, requests, concurrency):
+    queue = list(requests)
+
+    async def worker(client):
+        while queue:
+            method, path, kwargs = queue.pop()
+            response = await client.request(method, path, **kwargs)
+            response.raise_for_status()
+
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+
+
+def _upload(ensemble_id, name, realization_index):
+    return (
+        "POST",
+        f"/ensembles/{ensemble_id}/records/{name}/matrix",
+        dict(
+            params={"realization_index": realization_index},
+            content=_npy(np.random.rand(NUM_CELLS)),
+            headers={"content-type": "application/x-numpy"},
+        ),
+    )
+
+
+def _download(ensemble_id, name, realization_index):
+    return (
+        "GET",
+        f"/ensembles/{ensemble_id}/records/{name}",
+        dict(
+            params={"realization_index": realization_index},
+            headers={"accept": "application/x-numpy"},
+        ),
+    )
+
+
+@pytest.mark.benchmark
+def test_benchmark_concurrent_requests(server_url):
+    with httpx.Client(base_url=server_url, timeout=60) as client:
+        ensemble_id = _create_ensemble(client)
+
+    print()
+    for concurrency in CONCURRENCY:
+        names = [f"{concurrency}_{index % 4}" for index in range(NUM_REQUESTS)]
+        for kind, request in [("upload", _upload), ("download", _download)]:
+            requests = [
+                request(ensemble_id, name, index // 4)
+                for index, name in enumerate(names)
+            ]
+            start = time.perf_counter()
+            asyncio.run(_send(server_url, requests, concurrency))
+            elapsed = time.perf_counter() - start
+            print(
+                f"{kind:>8}, {concurrency:>2} concurrent: {elapsed * 1000:8.1f} ms, "
+                f"{len(requests) / elapsed:8.1f} requests/s"
+            )
@@ -0,0 +1,93 @@
+"""
+Benchmarks for computing the misfits of all realizations of a response.
+
+Run with:
+
+    pytest tests/benchmark -k benchmark -s
+"""
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ert_storage.compute import calculate_misfits, calculate_misfits_from_pandas
+
+NUM_COLUMNS = 2000
+NUM_OBSERVATIONS = 200
+REPEAT = 3
+
+
+def _legacy(reponses_dict, observation, summary_misfits):
+    # The misfits computed one realization at a time
+    misfits_dict = {}
+    for realization_index in reponses_dict:
+        response_value = (
+            reponses_dict[realization_index].loc[:, observation.index].values.flatten()
+        )
+        difference = response_value - observation["values"]
+        misfit = (difference / observation["errors"]) ** 2
+        misfits_dict[realization_index] = (misfit * np.sign(difference)).tolist()
+
+    df = pd.DataFrame(data=misfits_dict, index=observation.index)
+    if summary_misfits:
+        df = pd.DataFrame([df.abs().sum(axis=0)], columns=df.columns, index=[0])
+    return df.T
+
+
+def _measure(func, repeat=REPEAT):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("num_realizations", [100, 1000, 10000])
+@pytest.mark.parametrize("summary_misfits", [False, True])
+def test_benchmark_misfits(num_realizations, summary_misfits):
+    columns = [f"T{index}" for index in range(NUM_COLUMNS)]
+    responses = np.random.rand(num_realizations, NUM_COLUMNS)
+    response_dict = {
+        index: pd.DataFrame([row], columns=columns)
+        for index, row in enumerate(responses)
+    }
+    observed = np.sort(np.random.choice(NUM_COLUMNS, NUM_OBSERVATIONS, replace=False))
+    observation = pd.DataFrame(
+        {
+            "values": np.random.rand(NUM_OBSERVATIONS),
+            "errors": np.random.rand(NUM_OBSERVATIONS) + 0.1,
+        },
+        index=[columns[index] for index in observed],
+    )
+
+    print()
+    legacy, legacy_elapsed = _measure(
+        lambda: _legacy(response_dict, observation, summary_misfits), repeat=1
+    )
+    for name, func in [
+        (
+            "DataFrames",
+            lambda: calculate_misfits_from_pandas(
+                response_dict, observation, summary_misfits
+            ),
+        ),
+        (
+            "Stacked array",
+            lambda: calculate_misfits(
+                responses[:, observed],
+                list(range(num_realizations)),
+                observation,
+                summary_misfits,
+            ),
+        ),
+    ]:
+        result, elapsed = _measure(func)
+        np.testing.assert_allclose(result.values, legacy.values)
+        print(
+            f"{num_realizations:>6} realizations, {name:>13}: "
+            f"{elapsed * 1000:8.1f} ms, {legacy_elapsed / elapsed:6.1f}x faster "
+            f"than one at a time ({legacy_elapsed * 1000:.1f} ms)"
+        )
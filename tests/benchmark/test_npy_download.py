@@ -0,0 +1,83 @@
+"""
+Benchmarks for downloading matrix records in NPY format.
+
+Run with:
+
+    pytest tests/benchmark -k benchmark -s
+"""
+import io
+import time
+import tracemalloc
+
+import numpy as np
+import pytest
+from numpy.lib.format import read_array
+
+# 100 realizations of 2**17 float64s each, ie. 100 MiB
+NUM_REALIZATIONS = 100
+NUM_CELLS = 2**17
+
+
+def _make_record(ds, content, realization_index=None):
+    return ds.Record(
+        record_info=ds.RecordInfo(
+            name="benchmark",
+            record_type=ds.RecordType.f64_matrix,
+            record_class=ds.RecordClass.parameter,
+        ),
+        f64_matrix=ds.F64Matrix(content=content),
+        realization_index=realization_index,
+    )
+
+
+def _measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    buffers = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return buffers, elapsed, peak
+
+
+def _report(name, elapsed, peak, nbytes):
+    print(
+        f"{name:>30}: {elapsed * 1000:8.1f} ms, "
+        f"{nbytes / elapsed / 2**20:8.1f} MiB/s, "
+        f"peak memory {peak / 2**20:8.1f} MiB"
+    )
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("per_realization", [False, True])
+def test_benchmark_npy_download(ert_storage_client, per_realization):
+    from ert_storage import database_schema as ds
+    from ert_storage.endpoints import records as rec
+
+    matrix = np.random.rand(NUM_REALIZATIONS, NUM_CELLS)
+    if per_realization:
+        records = [_make_record(ds, row, index) for index, row in enumerate(matrix)]
+    else:
+        records = [_make_record(ds, matrix)]
+
+    def legacy():
+        import pandas as pd
+
+        dataframe = pd.concat(
+            [
+                rec._get_record_dataframe(record, None, rec.ColumnSelection())
+                for record in records
+            ]
+        )
+        response = rec._get_record_resonse(dataframe, "application/x-numpy")
+        return [response.body]
+
+    def buffered():
+        return rec._get_record_npy_response(records, None).buffers
+
+    print()
+    for name, func in [("DataFrame encoder", legacy), ("Buffered NPY", buffered)]:
+        buffers, elapsed, peak = _measure(func)
+        body = b"".join(buffers)
+        np.testing.assert_array_equal(read_array(io.BytesIO(body)), matrix)
+        _report(name, elapsed, peak, matrix.nbytes)
@@ -1,8 +1,9 @@
 import io
 from fastapi import params
 import numpy as np
-from numpy.testing import assert_array_equal
+from numpy.testing import assert_allclose, assert_array_equal
 import pandas as pd
+from ert_storage.compute import calculate_misfits_from_pandas
 
 
 OBSERVATION = (
@@ -60,6 +61,13 @@ def test_misfits_with_labels(client, create_experiment, create_ensemble):
     misfits_df = pd.read_csv(stream, index_col=0, float_precision="round_trip")
     assert misfits_df.shape == (5, 3)
     assert_array_equal(misfits_df.columns, obs["x_axis"])
+    expected = calculate_misfits_from_pandas(
+        data_df,
+        pd.DataFrame(
+            {"values": obs["values"], "errors": obs["errors"]}, index=obs["x_axis"]
+        ),
+    )
+    assert_allclose(misfits_df.values, expected.values)
 
     # get summary misfits for all realizations
     resp = client.get(
@@ -84,3 +92,193 @@ def test_misfits_with_labels(client, create_experiment, create_ensemble):
 
     assert_array_equal(misfits_df.columns, obs["x_axis"])
     assert misfits_df.shape == (1, 3)
+
+    # get univariate misfits of a subset of the realizations
+    resp = client.get(
+        "/compute/misfits",
+        params=dict(
+            ensemble_id=str(ensemble_id), response_name=name, realizations="1-2,4"
+        ),
+    )
+    stream = io.BytesIO(resp.content)
+    misfits_df = pd.read_csv(stream, index_col=0, float_precision="round_trip")
+    assert_array_equal(misfits_df.index, [1, 2, 4])
+    assert misfits_df.shape == (3, 3)
+
+
+def test_misfits_cache(client, create_experiment, create_ensemble):
+    import sqlalchemy as sa
+    from ert_storage import database_schema as ds
+
+    experiment_id = create_experiment("test_ensembles")
+    ensemble_id = create_ensemble(experiment_id=experiment_id)
+    name, obs = OBSERVATION
+
+    def post_observation(obs_name, values):
+        return client.post(
+            f"/experiments/{experiment_id}/observations",
+            json=dict(
+                name=obs_name, values=values, errors=obs["errors"], x_axis=obs["x_axis"]
+            ),
+        ).json()["id"]
+
+    def post_response(realization_index, obs_id):
+        data = pd.DataFrame(
+            [np.random.rand(8)], columns=["A", "B", "C", "D", "E", "F", "G", "H"]
+        )
+        client.post(
+            f"/ensembles/{ensemble_id}/records/{name}/matrix",
+            data=data.to_csv().encode(),
+            headers={"content-type": "text/csv"},
+            params=dict(realization_index=realization_index),
+        )
+        link_observation(realization_index, obs_id)
+
+    def link_observation(realization_index, obs_id):
+        client.post(
+            f"/ensembles/{ensemble_id}/records/{name}/observations",
+            json=[obs_id],
+            params=dict(realization_index=realization_index),
+        )
+
+    def get_misfits(**params):
+        loaded.clear()
+        resp = client.get(
+            "/compute/misfits",
+            params=dict(ensemble_id=str(ensemble_id), response_name=name, **params),
+        )
+        return pd.read_csv(io.BytesIO(resp.content), index_col=0)
+
+    obs_id = post_observation(name, obs["values"])
+    for realization_index in range(3):
+        post_response(realization_index, obs_id)
+
+    loaded = []
+
+    def on_load(target, context):
+        loaded.append(target)
+
+    sa.event.listen(ds.F64MatrixTile, "load", on_load)
+    try:
+        misfits_df = get_misfits()
+        assert loaded
+
+        # Repeated requests are served from the cache without reading responses
+        hits = client.get("/server/metrics").json()["misfits_cache"]["hits"]
+        pd.testing.assert_frame_equal(get_misfits(), misfits_df)
+        assert not loaded
+        assert client.get("/server/metrics").json()["misfits_cache"]["hits"] == (
+            hits + 1
+        )
+        assert get_misfits(summary_misfits=True).shape == (3, 1)
+        assert loaded
+
+        # Adding a response or changing the observation gives new misfits
+        post_response(3, obs_id)
+        assert_array_equal(get_misfits().index, [0, 1, 2, 3])
+        assert loaded
+
+        other_obs_id = post_observation("OTHER", [10, 20, 30])
+        for realization_index in range(4):
+            link_observation(realization_index, other_obs_id)
+        other_df = get_misfits()
+        assert loaded
+        assert (other_df.values < misfits_df.values.min()).all()
+    finally:
+        sa.event.remove(ds.F64MatrixTile, "load", on_load)
+
+
+def test_ensemble_misfits(client, create_experiment, create_ensemble):
+    import sqlalchemy as sa
+    from ert_storage.database import engine
+
+    experiment_id = create_experiment("test_ensembles")
+    ensemble_id = create_ensemble(experiment_id=experiment_id)
+    columns = ["A", "B", "C", "D", "E", "F", "G", "H"]
+    observations = {
+        "FOPR": dict(values=[1, 2, 3], errors=[0.1, 0.2, 0.3], x_axis=["C", "E", "H"]),
+        "WOPR": dict(values=[4, 5], errors=[0.4, 0.5], x_axis=["A", "B"]),
+        "WWCT": dict(values=[6], errors=[0.6], x_axis=["G"]),
+    }
+    # WWCT has no response for realization 0
+    realizations = {"FOPR": range(4), "WOPR": range(4), "WWCT": range(1, 4)}
+    for name, obs in observations.items():
+        obs_id = client.post(
+            f"/experiments/{experiment_id}/observations",
+            json=dict(name=f"{name}_obs", **obs),
+        ).json()["id"]
+        for realization_index in realizations[name]:
+            data = pd.DataFrame([np.random.rand(8)], columns=columns)
+            client.post(
+                f"/ensembles/{ensemble_id}/records/{name}/matrix",
+                data=data.to_csv().encode(),
+                headers={"content-type": "text/csv"},
+                params=dict(realization_index=realization_index),
+            )
+            client.post(
+                f"/ensembles/{ensemble_id}/records/{name}/observations",
+                json=[obs_id],
+                params=dict(realization_index=realization_index),
+            )
+    # Responses without observations are left out
+    client.post(
+        f"/ensembles/{ensemble_id}/records/FGPR/matrix",
+        json=[1.0, 2.0],
+        params=dict(realization_index=0),
+    )
+
+    statements = []
+
+    def on_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    def get_misfits(url="/compute/ensemble_misfits", check_status_code=200, **params):
+        statements.clear()
+        resp = client.get(
+            url,
+            params=dict(ensemble_id=str(ensemble_id), **params),
+            check_status_code=check_status_code,
+        )
+        return resp.content
+
+    def read(content, index_col):
+        return pd.read_csv(
+            io.BytesIO(content), index_col=index_col, float_precision="round_trip"
+        )
+
+    sa.event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        misfits_df = read(get_misfits(), [0, 1, 2])
+        # Finding the ensemble, the records, their observations and label
+        # sets, and reading the tiles, however many responses there are
+        assert len([s for s in statements if s.startswith("SELECT")]) <= 6
+
+        assert list(misfits_df.columns) == ["0", "1", "2", "3"]
+        assert list(misfits_df.index) == [
+            (name, f"{name}_obs", x)
+            for name, obs in observations.items()
+            for x in obs["x_axis"]
+        ]
+        assert misfits_df.loc["WWCT", "0"].isna().all()
+        for name in observations:
+            expected = read(get_misfits("/compute/misfits", response_name=name), 0)
+            assert_allclose(
+                misfits_df.loc[name].droplevel(0).T.dropna().values, expected.values
+            )
+
+        summary_df = read(get_misfits(summary_misfits=True), 0)
+        assert list(summary_df.index) == list(observations)
+        assert_allclose(
+            summary_df.values,
+            misfits_df.abs().groupby(level=0).sum(min_count=1).values,
+        )
+
+        subset_df = read(
+            get_misfits(response_name=["WOPR", "WWCT"], realizations="1-2"), [0, 1, 2]
+        )
+        assert_allclose(subset_df.values, misfits_df.loc[["WOPR", "WWCT"], ["1", "2"]])
+
+        get_misfits(response_name=["FOPR", "FGPR"], check_status_code=422)
+        assert read(get_misfits(realizations="10"), [0, 1, 2]).empty
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", on_execute)
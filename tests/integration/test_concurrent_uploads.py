@@ -0,0 +1,179 @@
+"""
+Concurrent uploads of the records of a realization each, interleaved with reads
+of all realizations, against a running ert-storage server. Unlike the test
+client, the server serves requests concurrently in sessions of their own.
+
+The server uses the database in ERT_STORAGE_DATABASE_URL, or a temporary SQLite
+database when it is unset.
+"""
+import asyncio
+import io
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+import pytest
+
+NUM_REALIZATIONS = 64
+NUM_CELLS = 100
+CONCURRENCY = 16
+BULK_REALIZATIONS = 8
+
+SERVER = """
+import sys
+
+import uvicorn
+
+uvicorn.run("ert_storage.app:app", port=int(sys.argv[1]), log_level="warning")
+"""
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server_url(tmp_path):
+    port = _free_port()
+    env = {**os.environ, "ERT_STORAGE_NO_TOKEN": "1"}
+    env.setdefault("ERT_STORAGE_DATABASE_URL", f"sqlite:///{tmp_path}/ert.db")
+    proc = subprocess.Popen([sys.executable, "-c", SERVER, str(port)], env=env)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"{url}/healthcheck")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        else:
+            pytest.fail("ert-storage server did not start")
+        yield url
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+@pytest.fixture
+def ensemble_id(server_url):
+    with httpx.Client(base_url=server_url, timeout=60) as client:
+        experiment_id = client.post(
+            "/experiments", json={"name": "test_concurrent_uploads"}
+        ).json()["id"]
+        yield client.post(
+            f"/experiments/{experiment_id}/ensembles",
+            json={
+                "parameter_names": [],
+                "response_names": [],
+                "size": NUM_REALIZATIONS,
+            },
+        ).json()["id"]
+        client.delete(f"/experiments/{experiment_id}")
+
+
+def _npy(array):
+    stream = io.BytesIO()
+    np.save(stream, array)
+    return stream.getvalue()
+
+
+def _npz(**arrays):
+    stream = io.BytesIO()
+    np.savez(stream, **arrays)
+    return stream.getvalue()
+
+
+def _upload(ensemble_id, name, index, row):
+    return (
+        "POST",
+        f"/ensembles/{ensemble_id}/records/{name}/matrix",
+        dict(
+            params={"realization_index": index},
+            content=_npy(row),
+            headers={"content-type": "application/x-numpy"},
+        ),
+    )
+
+
+def _upload_bulk(ensemble_id, name, indices, rows):
+    return (
+        "POST",
+        f"/ensembles/{ensemble_id}/records",
+        dict(
+            content=_npz(**{f"{name}@{index}": rows[index] for index in indices}),
+            headers={"content-type": "application/x-npz"},
+        ),
+    )
+
+
+def _download(ensemble_id, name):
+    return (
+        "GET",
+        f"/ensembles/{ensemble_id}/records/{name}",
+        dict(headers={"accept": "application/x-numpy"}),
+    )
+
+
+async def _send(url, requests):
+    queue = list(reversed(requests))
+    responses = []
+
+    async def worker(client):
+        while queue:
+            method, path, kwargs = queue.pop()
+            response = await client.request(method, path, **kwargs)
+            assert response.status_code == 200, response.text
+            if method == "GET":
+                responses.append(np.load(io.BytesIO(response.content)))
+
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        await asyncio.gather(*(worker(client) for _ in range(CONCURRENCY)))
+    return responses
+
+
+def _check(responses, rows):
+    # Every read holds some of the realizations, each with its own row
+    expected = {row.tobytes() for row in rows}
+    for response in responses:
+        assert response.ndim == 2
+        assert all(row.tobytes() in expected for row in response)
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_concurrent_uploads(server_url, ensemble_id, bulk):
+    rows = np.random.rand(NUM_REALIZATIONS, NUM_CELLS)
+
+    if bulk:
+        uploads = [
+            _upload_bulk(
+                ensemble_id, "rows", range(start, start + BULK_REALIZATIONS), rows
+            )
+            for start in range(0, NUM_REALIZATIONS, BULK_REALIZATIONS)
+        ]
+    else:
+        uploads = [
+            _upload(ensemble_id, "rows", index, rows[index])
+            for index in range(NUM_REALIZATIONS)
+        ]
+
+    # Reads of all realizations are sent along with the uploads once some
+    # realizations exist
+    asyncio.run(_send(server_url, uploads[:1]))
+    requests = []
+    for upload in uploads[1:]:
+        requests += [upload, _download(ensemble_id, "rows")]
+    _check(asyncio.run(_send(server_url, requests)), rows)
+
+    # Once the uploads are done, every read holds all realizations, whether the
+    # records are stacked yet or not
+    responses = asyncio.run(
+        _send(server_url, [_download(ensemble_id, "rows")] * CONCURRENCY * 2)
+    )
+    for response in responses:
+        np.testing.assert_array_equal(response, rows)
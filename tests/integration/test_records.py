@@ -1,6 +1,7 @@
 import io
 import itertools
 import json
+import os
 import random
 
 import numpy as np
@@ -8,6 +9,7 @@ import pandas as pd
 import pytest
 from fastapi import status
 from numpy.testing import assert_array_equal
+from pandas.testing import assert_frame_equal
 
 NUM_REALIZATIONS = 5
 PARAMETERS = [
@@ -132,6 +134,8 @@ def test_ensemble_wide_parameters_dataframe(client, simple_ensemble, mimetype):
         stream = io.BytesIO()
         data.to_parquet(stream)
         data_formatted = stream.getvalue()
+    elif mimetype == "application/vnd.apache.arrow.stream":
+        data_formatted = _write_arrow(data)
     else:
         data_formatted = data.to_csv()
 
@@ -295,7 +299,10 @@ def test_ensemble_matrix_json(client, simple_ensemble, get, post):
         raise NotImplementedError()
 
 
-@pytest.mark.parametrize("mimetype", ["application/x-parquet", "text/csv"])
+@pytest.mark.parametrize(
+    "mimetype",
+    ["application/x-parquet", "text/csv", "application/vnd.apache.arrow.stream"],
+)
 def test_ensemble_matrix_dataframe(client, simple_ensemble, mimetype):
     ensemble_id = simple_ensemble()
     matrix = np.random.rand(8, 5)
@@ -314,6 +321,8 @@ def test_ensemble_matrix_dataframe(client, simple_ensemble, mimetype):
         stream = io.BytesIO()
         data.to_parquet(stream)
         data_formatted = stream.getvalue()
+    elif mimetype == "application/vnd.apache.arrow.stream":
+        data_formatted = _write_arrow(data)
     else:
         data_formatted = data.to_csv()
 
@@ -333,6 +342,10 @@ def test_ensemble_matrix_dataframe(client, simple_ensemble, mimetype):
 
     if mimetype == "application/x-parquet":
         df = pd.read_parquet(stream)
+    elif mimetype == "application/vnd.apache.arrow.stream":
+        import pyarrow as pa
+
+        df = pa.ipc.open_stream(stream).read_pandas()
     else:
         df = pd.read_csv(stream, index_col=0, float_precision="round_trip")
 
@@ -341,6 +354,41 @@ def test_ensemble_matrix_dataframe(client, simple_ensemble, mimetype):
     assert_array_equal(df.index.values, data.index.values)
 
 
+def _write_arrow(data):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(data)
+    stream = io.BytesIO()
+    with pa.ipc.new_stream(stream, table.schema) as writer:
+        writer.write_table(table)
+    return stream.getvalue()
+
+
+def test_ensemble_matrix_arrow_batches(client, simple_ensemble, monkeypatch):
+    import pyarrow as pa
+    from ert_storage.endpoints import records
+
+    monkeypatch.setattr(records, "STREAM_BLOCK_ROWS", 3)
+    ensemble_id = simple_ensemble()
+    data = pd.DataFrame(np.random.rand(8, 2), columns=["a", "b"])
+    client.post(
+        f"/ensembles/{ensemble_id}/records/mat/matrix",
+        data=_write_arrow(data),
+        headers={"content-type": "application/vnd.apache.arrow.stream"},
+    )
+
+    resp = client.get(
+        f"/ensembles/{ensemble_id}/records/mat",
+        headers={"accept": "application/vnd.apache.arrow.stream"},
+    )
+    reader = pa.ipc.open_stream(resp.content)
+    batches = list(reader)
+    assert [batch.num_rows for batch in batches] == [3, 3, 2]
+    df = pa.Table.from_batches(batches, reader.schema).to_pandas()
+    assert_array_equal(df.values, data.values)
+    assert list(df.columns) == ["a", "b"]
+
+
 @pytest.mark.parametrize(
     "labels",
     [
@@ -638,6 +686,8 @@ def test_get_labeled_ens_wide_data(client, simple_ensemble, mimetype):
         stream = io.BytesIO()
         data.to_parquet(stream)
         data_formatted = stream.getvalue()
+    elif mimetype == "application/vnd.apache.arrow.stream":
+        data_formatted = _write_arrow(data)
     else:
         data_formatted = data.to_csv()
 
@@ -770,3 +820,1825 @@ def test_get_ens_wide_record_label(
         f"/ensembles/{ensemble_id}/records/ens_wide/labels",
     )
     assert resp.json() == []
+
+
+def test_matrix_binary_roundtrip(client, simple_ensemble):
+    from numpy.lib.format import read_array, write_array
+
+    ensemble_id = simple_ensemble()
+    info = np.finfo(np.float64)
+    matrix = np.array(
+        [
+            [info.max, info.min, info.tiny, info.eps],
+            [np.nan, np.inf, -np.inf, -0.0],
+            [1 / 3, np.pi, 5e-324, 1e300],
+        ]
+    )
+
+    stream = io.BytesIO()
+    write_array(stream, matrix.astype(">f8"))
+    client.post(
+        f"/ensembles/{ensemble_id}/records/mat/matrix",
+        data=stream.getvalue(),
+        headers={"content-type": "application/x-numpy"},
+    )
+
+    resp = client.get(
+        f"/ensembles/{ensemble_id}/records/mat",
+        headers={"accept": "application/x-numpy"},
+    )
+    actual = read_array(io.BytesIO(resp.content))
+    assert actual.shape == matrix.shape
+    assert actual.tobytes() == matrix.astype("<f8").tobytes()
+
+
+def test_matrix_numpy_by_realization(client, simple_ensemble):
+    from numpy.lib.format import read_array
+
+    ensemble_id = simple_ensemble(parameters=["coeffs"], size=NUM_REALIZATIONS)
+    matrix = np.random.rand(NUM_REALIZATIONS, 7)
+
+    # Ensemble-wide parameter
+    client.post(f"/ensembles/{ensemble_id}/records/coeffs/matrix", json=matrix.tolist())
+    for index in range(NUM_REALIZATIONS):
+        resp = client.get(
+            f"/ensembles/{ensemble_id}/records/coeffs",
+            params={"realization_index": index},
+            headers={"accept": "application/x-numpy"},
+        )
+        assert_array_equal(read_array(io.BytesIO(resp.content)), matrix[[index]])
+
+    # Per-realization records, posted out of order
+    for index in reversed(range(NUM_REALIZATIONS)):
+        client.post(
+            f"/ensembles/{ensemble_id}/records/indexed/matrix",
+            params={"realization_index": index},
+            json=matrix[index].tolist(),
+        )
+    resp = client.get(
+        f"/ensembles/{ensemble_id}/records/indexed",
+        headers={"accept": "application/x-numpy"},
+    )
+    assert int(resp.headers["content-length"]) == len(resp.content)
+    assert_array_equal(read_array(io.BytesIO(resp.content)), matrix)
+
+
+@pytest.fixture
+def small_tiles(monkeypatch):
+    """
+    Split matrices into tiles of 2 rows and 3 columns
+    """
+    from ert_storage.database_schema import record
+
+    monkeypatch.setattr(record, "TILE_ROWS", 2)
+    monkeypatch.setattr(record, "TILE_SIZE", 6)
+
+
+@pytest.fixture
+def count_loaded_tiles():
+    import sqlalchemy as sa
+    from ert_storage import database_schema as ds
+
+    loaded = []
+
+    def on_load(target, context):
+        loaded.append((target.row, target.column))
+
+    sa.event.listen(ds.F64MatrixTile, "load", on_load)
+    yield loaded
+    sa.event.remove(ds.F64MatrixTile, "load", on_load)
+
+
+def test_tiled_matrix(client, simple_ensemble, small_tiles):
+    from numpy.lib.format import read_array
+
+    ensemble_id = simple_ensemble(parameters=["coeffs"], size=7)
+    labels = [f"p{i}" for i in range(10)]
+    data = pd.DataFrame(np.random.rand(7, 10), columns=labels)
+    client.post(
+        f"/ensembles/{ensemble_id}/records/coeffs/matrix",
+        data=data.to_csv(),
+        headers={"content-type": "text/csv"},
+    )
+
+    resp = client.get(
+        f"/ensembles/{ensemble_id}/records/coeffs",
+        headers={"accept": "application/x-numpy"},
+    )
+    assert_array_equal(read_array(io.BytesIO(resp.content)), data.values)
+
+    for index in range(7):
+        resp = client.get(
+            f"/ensembles/{ensemble_id}/records/coeffs",
+            params={"realization_index": index},
+            headers={"accept": "application/x-numpy"},
+        )
+        assert_array_equal(read_array(io.BytesIO(resp.content)), data.values[[index]])
+
+    for label in labels:
+        resp = client.get(
+            f"/ensembles/{ensemble_id}/records/coeffs", params={"label": label}
+        )
+        assert resp.json() == data[[label]].values.tolist()
+
+
+def test_tiled_matrix_partial_read(
+    client, simple_ensemble, small_tiles, count_loaded_tiles
+):
+    from ert_storage import database_schema as ds
+
+    ensemble_id = simple_ensemble()
+    matrix = np.random.rand(7, 10)
+    client.post(f"/ensembles/{ensemble_id}/records/mat/matrix", json=matrix.tolist())
+
+    db = client.session()
+    f64_matrix = (
+        db.query(ds.F64Matrix)
+        .join(ds.Record)
+        .join(ds.RecordInfo)
+        .filter_by(name="mat")
+        .one()
+    )
+    assert f64_matrix.tiles.count() == 4 * 4
+
+    assert_array_equal(f64_matrix.read(rows=[5]), matrix[[5]])
+    assert count_loaded_tiles == [(2, 0), (2, 1), (2, 2), (2, 3)]
+
+    count_loaded_tiles.clear()
+    assert_array_equal(f64_matrix.read(columns=[4, 2]), matrix[:, [4, 2]])
+    assert sorted(count_loaded_tiles) == [(0, 0), (0, 1), (1, 0), (1, 1)] + [
+        (2, 0),
+        (2, 1),
+        (3, 0),
+        (3, 1),
+    ]
+
+    count_loaded_tiles.clear()
+    assert_array_equal(f64_matrix.read(rows=slice(1, 4), columns=[9]), matrix[1:4, [9]])
+    assert sorted(count_loaded_tiles) == [(0, 3), (1, 3)]
+    db.close()
+
+
+@pytest.fixture(params=["none", "zlib", "shuffle+zlib", "shuffle+zstd", "lz4"])
+def compression(request, monkeypatch):
+    """
+    Compress stored matrices and files with the given codec
+    """
+    from ert_storage.compression import check_codec
+    from ert_storage.database_schema import record
+
+    try:
+        check_codec(request.param)
+    except ValueError:
+        pytest.skip(f"Codec '{request.param}' is not installed")
+    monkeypatch.setattr(record, "COMPRESSION", request.param)
+    return request.param
+
+
+def test_compressed_matrix(client, simple_ensemble, small_tiles, compression):
+    from numpy.lib.format import read_array
+    from ert_storage import database_schema as ds
+
+    ensemble_id = simple_ensemble()
+    matrix = np.cumsum(np.random.rand(7, 10), axis=1)
+    client.post(f"/ensembles/{ensemble_id}/records/mat/matrix", json=matrix.tolist())
+
+    resp = client.get(
+        f"/ensembles/{ensemble_id}/records/mat",
+        headers={"accept": "application/x-numpy"},
+    )
+    assert_array_equal(read_array(io.BytesIO(resp.content)), matrix)
+
+    resp = client.get(
+        f"/ensembles/{ensemble_id}/records/mat", params={"realization_index": 3}
+    )
+    assert resp.json() == matrix[3].tolist()
+
+    db = client.session()
+    codecs = {codec for codec, in db.query(ds.F64MatrixTile.codec)}
+    assert codecs == {compression}
+    db.close()
+
+
+@pytest.fixture
+def database_blob_storage(monkeypatch):
+    """
+    Store files in the database, even if a blob storage is configured
+    """
+    from ert_storage.endpoints import _records_blob
+
+    monkeypatch.setattr(_records_blob, "HAS_AZURE_BLOB_STORAGE", False)
+    monkeypatch.setattr(_records_blob, "HAS_LOCAL_BLOB_STORAGE", False)
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """
+    Split files into uncompressed chunks of 1 KiB
+    """
+    from ert_storage.database_schema import record
+    from ert_storage.endpoints import _records_blob
+
+    monkeypatch.setattr(record, "COMPRESSION", "none")
+    monkeypatch.setattr(record, "MAX_CHUNK_SIZE", 1024)
+    monkeypatch.setattr(_records_blob, "MAX_CHUNK_SIZE", 1024)
+
+
+def test_compressed_file(client, simple_ensemble, compression, database_blob_storage):
+    from ert_storage import database_schema as ds
+    from ert_storage.compression import file_codec
+
+    ensemble_id = simple_ensemble()
+    data = b"".join(f"{i}\t{i**2}\n".encode() for i in range(10000))
+    client.post(
+        f"/ensembles/{ensemble_id}/records/foo/file",
+        files={"file": ("somefile", io.BytesIO(data), "text/plain")},
+    )
+    resp = client.get(f"/ensembles/{ensemble_id}/records/foo")
+    assert resp.content == data
+
+    db = client.session()
+    chunks = db.query(ds.FileChunk).all()
+    assert {chunk.codec for chunk in chunks} == {file_codec(compression)}
+    if compression != "none":
+        assert sum(len(chunk.data) for chunk in chunks) < len(data)
+    db.close()
+
+
+def test_chunked_file(client, simple_ensemble, database_blob_storage, small_chunks):
+    import hashlib
+    from ert_storage import database_schema as ds
+
+    ensemble_id = simple_ensemble()
+    data = np.random.bytes(10 * 1024 + 1)
+    client.post(
+        f"/ensembles/{ensemble_id}/records/foo/file",
+        files={"file": ("somefile", io.BytesIO(data), "foo/bar")},
+    )
+    resp = client.get(f"/ensembles/{ensemble_id}/records/foo")
+    assert resp.content == data
+
+    db = client.session()
+    file = db.query(ds.File).one()
+    assert file.size == len(data)
+    assert file.content_hash == hashlib.sha256(data).hexdigest()
+    assert [len(chunk.data) for chunk in file.chunks] == [1024] * 10 + [1]
+    db.close()
+
+
+def test_chunked_blob_assembly(
+    client, simple_ensemble, database_blob_storage, small_chunks
+):
+    import hashlib
+    from ert_storage import database_schema as ds
+
+    ensemble_id = simple_ensemble()
+    blocks = [np.random.bytes(size) for size in (3000, 1024, 1, 0, 2049)]
+
+    client.post(f"/ensembles/{ensemble_id}/records/foo/blob")
+    for i in [2, 0, 4, 1, 3]:
+        client.put(
+            f"/ensembles/{ensemble_id}/records/foo/blob",
+            params={"block_index": i},
+            data=blocks[i],
+        )
+    client.patch(f"/ensembles/{ensemble_id}/records/foo/blob")
+
+    data = b"".join(blocks)
+    resp = client.get(f"/ensembles/{ensemble_id}/records/foo")
+    assert resp.content == data
+
+    db = client.session()
+    file = db.query(ds.File).one()
+    assert file.size == len(data)
+    assert file.content_hash == hashlib.sha256(data).hexdigest()
+    assert [len(chunk.data) for chunk in file.chunks] == [
+        1024,
+        1024,
+        952,
+        1024,
+        1,
+        1024,
+        1024,
+        1,
+    ]
+    assert db.query(ds.FileBlock).count() == 0
+    db.close()
+
+
+def test_upload_file_memory(client, simple_ensemble, database_blob_storage, tmp_path):
+    """
+    Uploading a file must not read the whole file into memory
+    """
+    import asyncio
+    import tracemalloc
+    from fastapi import UploadFile
+    from ert_storage.endpoints._records_blob import BlobHandler, MAX_CHUNK_SIZE
+
+    size = 64 * 1024**2
+    path = tmp_path / "upload"
+    with open(path, "wb") as f:
+        for _ in range(size // 2**20):
+            f.write(np.random.bytes(2**20))
+
+    db = client.session()
+    handler = BlobHandler(db, "foo", None, None)
+    with open(path, "rb") as f:
+        upload = UploadFile(f, filename="upload", headers={"content-type": "foo/bar"})
+        tracemalloc.start()
+        file = asyncio.run(handler.upload_file(upload))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    assert file.size == size
+    # Drivers such as psycopg2 make a few escaped copies of each chunk
+    assert peak < 8 * MAX_CHUNK_SIZE < size
+    db.rollback()
+    db.close()
+
+
+def test_download_file_memory(client, simple_ensemble, database_blob_storage):
+    """
+    Downloading a file must not read the whole file into memory
+    """
+    import asyncio
+    import hashlib
+    import tracemalloc
+    from ert_storage import database_schema as ds
+    from ert_storage.endpoints._records_blob import BlobHandler, MAX_CHUNK_SIZE
+
+    ensemble_id = simple_ensemble()
+    size = 64 * 1024**2
+    client.post(
+        f"/ensembles/{ensemble_id}/records/foo/file",
+        files={"file": ("somefile", io.BytesIO(np.random.bytes(size)), "foo/bar")},
+    )
+
+    db = client.session()
+    record = db.query(ds.Record).join(ds.RecordInfo).filter_by(name="foo").one()
+    handler = BlobHandler(db, "foo", None, None)
+
+    async def download():
+        response = await handler.get_content(record)
+        assert response.headers["content-length"] == str(size)
+        sha256 = hashlib.sha256()
+        async for chunk in response.body_iterator:
+            sha256.update(chunk)
+        return sha256.hexdigest()
+
+    tracemalloc.start()
+    digest = asyncio.run(download())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert digest == record.file.content_hash
+    assert peak < 8 * MAX_CHUNK_SIZE < size
+    db.close()
+
+
+@pytest.fixture
+def local_blob_storage(monkeypatch, tmp_path):
+    """
+    Store files in a temporary directory instead of the database
+    """
+    from ert_storage.endpoints import _records_blob
+
+    monkeypatch.setattr(_records_blob, "HAS_AZURE_BLOB_STORAGE", False)
+    monkeypatch.setattr(_records_blob, "HAS_LOCAL_BLOB_STORAGE", True)
+    monkeypatch.setattr(_records_blob, "LOCAL_BLOB_PATH", tmp_path)
+    return tmp_path
+
+
+def test_local_blob_file(client, simple_ensemble, local_blob_storage):
+    import hashlib
+    from ert_storage import database_schema as ds
+
+    ensemble_id = simple_ensemble(size=2)
+    with open("/dev/urandom", "rb") as f:
+        data = f.read(random.randint(2**16, 2**24))
+    digest = hashlib.sha256(data).hexdigest()
+
+    for index in range(2):
+        client.post(
+            f"/ensembles/{ensemble_id}/records/foo/file",
+            params={"realization_index": index},
+            files={"file": ("somefile", io.BytesIO(data), "foo/bar")},
+        )
+        resp = client.get(
+            f"/ensembles/{ensemble_id}/records/foo",
+            params={"realization_index": index},
+        )
+        assert resp.content == data
+        assert resp.headers["content-type"] == "foo/bar"
+        assert int(resp.headers["content-length"]) == len(data)
+
+    # Both records share the same file on disk
+    path = local_blob_storage / digest[:2] / digest[2:4] / digest
+    assert path.read_bytes() == data
+    blobs = [p for p in local_blob_storage.rglob("*") if p.is_file()]
+    assert blobs == [path]
+
+    db = client.session()
+    file = db.query(ds.File).one()
+    assert file.local_blob == str(path.relative_to(local_blob_storage))
+    assert file.ref_count == 2
+    assert file.chunks.count() == 0
+    db.close()
+
+
+def test_local_blob_collect(
+    client, create_experiment, create_ensemble, local_blob_storage
+):
+    import os
+    from ert_storage.endpoints._records_blob import collect_local_blobs
+
+    experiment_ids = [
+        create_experiment(f"test_local_blob_collect{i}") for i in range(2)
+    ]
+    for experiment_id, data in zip(experiment_ids, [b"deleted", b"kept"]):
+        ensemble_id = create_ensemble(experiment_id)
+        client.post(
+            f"/ensembles/{ensemble_id}/records/foo/file",
+            files={"file": ("somefile", io.BytesIO(data), "foo/bar")},
+        )
+    blobs = {path.read_bytes(): path for path in local_blob_storage.glob("??/??/*")}
+    client.delete(f"/experiments/{experiment_ids[0]}")
+
+    # Blobs are left in place when their records are deleted, and only
+    # collected once they are old enough
+    db = client.session()
+    assert collect_local_blobs(db) == []
+    for path in blobs.values():
+        os.utime(path, (0, 0))
+    assert collect_local_blobs(db) == [
+        str(blobs[b"deleted"].relative_to(local_blob_storage))
+    ]
+    db.close()
+
+    assert sorted(local_blob_storage.glob("??/??/*")) == [blobs[b"kept"]]
+    resp = client.get(f"/ensembles/{ensemble_id}/records/foo")
+    assert resp.content == b"kept"
+
+
+def test_local_blob_empty_file(client, simple_ensemble, local_blob_storage):
+    ensemble_id = simple_ensemble()
+    client.post(
+        f"/ensembles/{ensemble_id}/records/foo/file",
+        files={"file": ("somefile", io.BytesIO(b""), "foo/bar")},
+    )
+    resp = client.get(f"/ensembles/{ensemble_id}/records/foo")
+    assert resp.content == b""
+
+
+def test_local_blob_stored_in_database(client, simple_ensemble, request):
+    ensemble_id = simple_ensemble()
+    client.post(
+        f"/ensembles/{ensemble_id}/records/foo/file",
+        files={"file": ("somefile", io.BytesIO(b"in database"), "foo/bar")},
+    )
+
+    # Files stored before local blob storage was enabled are still served
+    request.getfixturevalue("local_blob_storage")
+    resp = client.get(f"/ensembles/{ensemble_id}/records/foo")
+    assert resp.content == b"in database"
+
+
+def test_local_blob_chunked(client, simple_ensemble, local_blob_storage):
+    from ert_storage import database_schema as ds
+
+    ensemble_id = simple_ensemble()
+    chunks = [(1, b"b"), (0, b"a"), (2, b"c")]
+
+    client.post(f"/ensembles/{ensemble_id}/records/foo/blob")
+    for i, chunk in chunks:
+        client.put(
+            f"/ensembles/{ensemble_id}/records/foo/blob",
+            params={"block_index": i},
+            data=chunk,
+        )
+    assert len(list((local_blob_storage / "staging").iterdir())) == 3
+
+    client.patch(f"/ensembles/{ensemble_id}/records/foo/blob")
+    assert list((local_blob_storage / "staging").iterdir()) == []
+    db = client.session()
+    assert db.query(ds.FileBlock).count() == 0
+    db.close()
+
+    resp = client.get(f"/ensembles/{ensemble_id}/records/foo")
+    assert resp.content == b"abc"
+
+
+@pytest.mark.parametrize("zerocopy", [False, True])
+def test_local_file_response(tmp_path, zerocopy):
+    import asyncio
+    from ert_storage.endpoints._records_blob import LocalFileResponse
+
+    path = tmp_path / "blob"
+    path.write_bytes(b"x" * 10)
+    response = LocalFileResponse(path, media_type="foo/bar")
+    response.chunk_size = 4
+
+    messages = []
+
+    async def send(message):
+        if "body" in message:
+            message["body"] = bytes(message["body"])
+        if "file" in message:
+            message["file"] = os.read(message["file"], message["count"])
+        messages.append(message)
+
+    scope = {"extensions": {"http.response.zerocopysend": {}} if zerocopy else {}}
+    asyncio.run(response(scope, None, send))
+
+    assert (b"content-length", b"10") in messages[0]["headers"]
+    if zerocopy:
+        assert messages[1:] == [
+            {
+                "type": "http.response.zerocopysend",
+                "file": b"x" * 10,
+                "count": 10,
+                "more_body": False,
+            }
+        ]
+    else:
+        assert [message["body"] for message in messages[1:]] == [
+            b"xxxx",
+            b"xxxx",
+            b"xx",
+            b"",
+        ]
+
+
+def test_deduplicate_matrix(client, create_experiment, create_ensemble):
+    from ert_storage import database_schema as ds
+
+    experiment_id = create_experiment("test_deduplicate_matrix")
+    ensemble_ids = [
+        create_ensemble(experiment_id, parameters=["coeffs"]) for _ in range(3)
+    ]
+    data = pd.DataFrame(np.random.rand(5, 3), columns=["a", "b", "c"])
+    for ensemble_id in ensemble_ids[:2]:
+        client.post(
+            f"/ensembles/{ensemble_id}/records/coeffs/matrix",
+            data=data.to_csv(),
+            headers={"content-type": "text/csv"},
+        )
+    # Same numbers with different labels are not the same payload
+    client.post(
+        f"/ensembles/{ensemble_ids[2]}/records/coeffs/matrix",
+        data=data.rename(columns={"c": "d"}).to_csv(),
+        headers={"content-type": "text/csv"},
+    )
+
+    for ensemble_id in ensemble_ids:
+        resp = client.get(
+            f"/ensembles/{ensemble_id}/records/coeffs",
+            headers={"accept": "text/csv"},
+        )
+        df = pd.read_csv(
+            io.StringIO(resp.text), index_col=0, float_precision="round_trip"
+        )
+        assert_array_equal(df.values, data.values)
+
+    db = client.session()
+    matrices = (
+        db.query(ds.F64Matrix)
+        .join(ds.Record)
+        .join(ds.RecordInfo)
+        .join(ds.Ensemble)
+        .join(ds.Experiment)
+        .filter_by(name="test_deduplicate_matrix")
+        .distinct()
+        .order_by(ds.F64Matrix.pk)
+        .all()
+    )
+    assert [matrix.ref_count for matrix in matrices] == [2, 1]
+    assert matrices[0].content_hash == matrices[1].content_hash
+    pks = [matrix.pk for matrix in matrices]
+    db.close()
+
+    # Payloads are deleted once no records refer to them
+    client.delete(f"/experiments/{experiment_id}")
+    db = client.session()
+    assert db.query(ds.F64Matrix).filter(ds.F64Matrix.pk.in_(pks)).count() == 0
+    assert (
+        db.query(ds.F64MatrixTile)
+        .filter(ds.F64MatrixTile.f64_matrix_pk.in_(pks))
+        .count()
+        == 0
+    )
+    db.close()
+
+
+def test_deduplicate_empty_matrix(client, simple_ensemble):
+    from ert_storage import database_schema as ds
+
+    ensemble_id = simple_ensemble()
+    for name in ("foo", "bar"):
+        client.post(f"/ensembles/{ensemble_id}/records/{name}/matrix", json=[[], []])
+        resp = client.get(f"/ensembles/{ensemble_id}/records/{name}")
+        assert resp.json() == [[], []]
+
+    db = client.session()
+    matrix = db.query(ds.F64Matrix).join(ds.Record).distinct().one()
+    assert matrix.ref_count == 2
+    assert matrix.shape == [2, 0]
+    db.close()
+
+
+def test_deduplicate_file(
+    client, create_experiment, create_ensemble, database_blob_storage
+):
+    from ert_storage import database_schema as ds
+
+    experiment_id = create_experiment("test_deduplicate_file")
+    ensemble_ids = [create_ensemble(experiment_id) for _ in range(2)]
+    for ensemble_id in ensemble_ids:
+        client.post(
+            f"/ensembles/{ensemble_id}/records/foo/file",
+            files={"file": ("somefile", io.BytesIO(b"content"), "foo/bar")},
+        )
+        client.post(
+            f"/ensembles/{ensemble_id}/records/bar/file",
+            files={"file": ("otherfile", io.BytesIO(b"content"), "foo/bar")},
+        )
+
+    db = client.session()
+    files = (
+        db.query(ds.File)
+        .join(ds.Record)
+        .join(ds.RecordInfo)
+        .join(ds.Ensemble)
+        .filter(ds.Ensemble.id.in_(ensemble_ids))
+        .distinct()
+        .order_by(ds.File.filename)
+        .all()
+    )
+    assert [(file.filename, file.ref_count) for file in files] == [
+        ("otherfile", 2),
+        ("somefile", 2),
+    ]
+    db.close()
+
+    for ensemble_id in ensemble_ids:
+        for name in ("foo", "bar"):
+            resp = client.get(f"/ensembles/{ensemble_id}/records/{name}")
+            assert resp.content == b"content"
+
+
+def _npz(**arrays):
+    stream = io.BytesIO()
+    np.savez(stream, **arrays)
+    return stream.getvalue()
+
+
+def test_bulk_records_npz(client, simple_ensemble):
+    ensemble_id = simple_ensemble(["coeffs"], size=NUM_REALIZATIONS)
+    arrays = {
+        "coeffs": np.array(PARAMETERS),
+        **{f"indexed@{index}": np.array(row) for index, row in enumerate(PARAMETERS)},
+    }
+    client.post(
+        f"/ensembles/{ensemble_id}/records",
+        data=_npz(**arrays),
+        headers={"content-type": "application/x-npz"},
+    )
+
+    resp = client.get(f"/ensembles/{ensemble_id}/parameters")
+    assert resp.json() == [{"labels": [], "name": "coeffs"}]
+
+    resp = client.get(f"/ensembles/{ensemble_id}/records/coeffs")
+    assert resp.json() == PARAMETERS
+    for realization_index in range(NUM_REALIZATIONS):
+        resp = client.get(
+            f"/ensembles/{ensemble_id}/records/indexed",
+            params=dict(realization_index=realization_index),
+        )
+        assert resp.json() == PARAMETERS[realization_index]
+
+
+def test_bulk_records_empty(client, simple_ensemble):
+    ensemble_id = simple_ensemble()
+    client.post(
+        f"/ensembles/{ensemble_id}/records",
+        data=_npz(foo=np.empty((2, 0))),
+        headers={"content-type": "application/x-npz"},
+    )
+
+    resp = client.get(f"/ensembles/{ensemble_id}/records/foo")
+    assert resp.json() == [[], []]
+
+
+def test_bulk_records_concurrent_info(client, simple_ensemble, monkeypatch):
+    from ert_storage.endpoints import _records_bulk
+
+    ensemble_id = simple_ensemble()
+    client.post(
+        f"/ensembles/{ensemble_id}/records/foo/matrix",
+        params=dict(realization_index=0),
+        json=[1.0, 2.0],
+    )
+
+    # Miss the record info the first time, as if another request created it
+    # after it was looked up
+    query_record_infos = _records_bulk._query_record_infos
+    calls = []
+
+    def miss_first(*args):
+        calls.append(args)
+        return {} if len(calls) == 1 else query_record_infos(*args)
+
+    monkeypatch.setattr(_records_bulk, "_query_record_infos", miss_first)
+    client.post(
+        f"/ensembles/{ensemble_id}/records",
+        data=_npz(**{"foo@1": np.array([3.0, 4.0])}),
+        headers={"content-type": "application/x-npz"},
+    )
+    assert len(calls) == 2
+
+    resp = client.get(f"/ensembles/{ensemble_id}/records/foo")
+    assert resp.json() == [[1.0, 2.0], [3.0, 4.0]]
+
+
+def test_bulk_records_arrow(client, simple_ensemble):
+    import pyarrow as pa
+
+    ensemble_id = simple_ensemble(size=NUM_REALIZATIONS)
+    table = pa.table(
+        {
+            "name": ["foo"] * NUM_REALIZATIONS + ["bar"],
+            "realization_index": [*range(NUM_REALIZATIONS), None],
+            "values": [*PARAMETERS, [4.0, 5.0]],
+        }
+    )
+    stream = io.BytesIO()
+    with pa.ipc.new_stream(stream, table.schema) as writer:
+        writer.write_table(table)
+    client.post(
+        f"/ensembles/{ensemble_id}/records",
+        data=stream.getvalue(),
+        headers={"content-type": "application/vnd.apache.arrow.stream"},
+    )
+
+    for realization_index in range(NUM_REALIZATIONS):
+        resp = client.get(
+            f"/ensembles/{ensemble_id}/records/foo",
+            params=dict(realization_index=realization_index),
+        )
+        assert resp.json() == PARAMETERS[realization_index]
+    resp = client.get(f"/ensembles/{ensemble_id}/records/bar")
+    assert resp.json() == [4.0, 5.0]
+
+
+@pytest.mark.parametrize(
+    "columns",
+    [
+        {"values": [1.0, 2.0]},
+        {"values": [["a", "b"], ["c"]]},
+        {"values": [[1.0], [2.0]], "shape": [[1.5], [1.5]]},
+        {"values": [[1.0], [2.0]], "name": [1, 2]},
+    ],
+)
+def test_bulk_records_arrow_invalid(client, simple_ensemble, columns):
+    import pyarrow as pa
+
+    ensemble_id = simple_ensemble(size=2)
+    table = pa.table({"name": ["foo", "foo"], "realization_index": [0, 1], **columns})
+    stream = io.BytesIO()
+    with pa.ipc.new_stream(stream, table.schema) as writer:
+        writer.write_table(table)
+    client.post(
+        f"/ensembles/{ensemble_id}/records",
+        data=stream.getvalue(),
+        headers={"content-type": "application/vnd.apache.arrow.stream"},
+        check_status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    )
+
+
+def test_bulk_records_invalid(client, simple_ensemble):
+    ensemble_id = simple_ensemble(["coeffs"], size=4, active_realizations=[0, 2])
+    client.post(
+        f"/ensembles/{ensemble_id}/records/foo/matrix",
+        params=dict(realization_index=0),
+        data="[1, 2]",
+    )
+
+    for arrays, status_code in [
+        # Record already exists
+        ({"foo@0": [1.0]}, status.HTTP_409_CONFLICT),
+        # Ensemble-wide and forward-model records of the same name
+        ({"bar": [1.0], "bar@2": [1.0]}, status.HTTP_409_CONFLICT),
+        # Inactive realization
+        ({"bar@1": [1.0]}, status.HTTP_417_EXPECTATION_FAILED),
+        # Ensemble-wide parameters are at least 2D
+        ({"coeffs": [1.0, 2.0]}, status.HTTP_422_UNPROCESSABLE_ENTITY),
+    ]:
+        client.post(
+            f"/ensembles/{ensemble_id}/records",
+            data=_npz(baz=[1.0], **arrays),
+            headers={"content-type": "application/x-npz"},
+            check_status_code=status_code,
+        )
+
+    resp = client.post(
+        f"/ensembles/{ensemble_id}/records",
+        data=_npz(**{"foo@0": [1.0]}),
+        headers={"content-type": "application/x-npz"},
+        check_status_code=status.HTTP_409_CONFLICT,
+    )
+    assert "'foo' for realization 0" in resp.json()["detail"]["error"]
+
+    client.post(
+        f"/ensembles/{ensemble_id}/records",
+        data=b"not an archive",
+        headers={"content-type": "application/x-npz"},
+        check_status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    )
+
+    # None of the records in the failed requests were created
+    resp = client.get(f"/ensembles/{ensemble_id}/records")
+    assert set(resp.json()) == {"foo"}
+
+
+@pytest.fixture
+def count_statements():
+    """
+    Count the SQL statements that are executed inside the returned context
+    """
+    import contextlib
+
+    import sqlalchemy as sa
+    from ert_storage.database import engine
+
+    statements = []
+
+    def on_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    @contextlib.contextmanager
+    def func():
+        statements.clear()
+        sa.event.listen(engine, "before_cursor_execute", on_execute)
+        try:
+            yield statements
+        finally:
+            sa.event.remove(engine, "before_cursor_execute", on_execute)
+
+    return func
+
+
+def test_bulk_records_statements(
+    client, create_experiment, create_ensemble, count_statements
+):
+    from ert_storage import database_schema as ds
+
+    experiment_id = create_experiment("test_bulk_records_statements")
+
+    def post(size):
+        ensemble_id = create_ensemble(experiment_id, size=size)
+        arrays = {
+            f"{name}@{index}": np.full(3, size)
+            for name in "ab"
+            for index in range(size)
+        }
+        with count_statements() as statements:
+            client.post(
+                f"/ensembles/{ensemble_id}/records",
+                data=_npz(**arrays),
+                headers={"content-type": "application/x-npz"},
+            )
+        return len(statements)
+
+    # The number of statements doesn't grow with the number of records
+    assert post(2) == post(50)
+
+    # Identical matrices are stored once
+    db = client.session()
+    matrices = (
+        db.query(ds.F64Matrix)
+        .join(ds.Record)
+        .join(ds.RecordInfo)
+        .join(ds.Ensemble)
+        .join(ds.Experiment)
+        .filter_by(name="test_bulk_records_statements")
+        .distinct()
+        .order_by(ds.F64Matrix.pk)
+        .all()
+    )
+    assert [matrix.ref_count for matrix in matrices] == [2 * 2, 2 * 50]
+
+    # Creating the records leaves stacking them to the first read
+    infos = (
+        db.query(ds.RecordInfo)
+        .join(ds.Ensemble)
+        .join(ds.Experiment)
+        .filter_by(name="test_bulk_records_statements")
+        .all()
+    )
+    assert len(infos) == 4
+    assert all(info.ensemble_matrix_pk is None for info in infos)
+    db.close()
+
+
+def _read_arrow(content):
+    import pyarrow as pa
+
+    table = pa.ipc.open_stream(content).read_all()
+    return [
+        (name, index, np.reshape(values, shape))
+        for name, index, values, shape in zip(
+            *(table.column(key).to_pylist() for key in table.column_names)
+        )
+    ]
+
+
+def test_bulk_fetch(client, simple_ensemble):
+    ensemble_id = simple_ensemble(["coeffs"], size=NUM_REALIZATIONS)
+    data = pd.DataFrame(PARAMETERS, columns=["a", "b", "c"])
+    client.post(
+        f"/ensembles/{ensemble_id}/records/coeffs/matrix",
+        data=data.to_csv(),
+        headers={"content-type": "text/csv"},
+    )
+    for index, row in enumerate(PARAMETERS):
+        client.post(
+            f"/ensembles/{ensemble_id}/records/indexed/matrix",
+            params=dict(realization_index=index),
+            data=json.dumps([row, row]),
+        )
+    client.post(
+        f"/ensembles/{ensemble_id}/records/foo/file",
+        files={"file": ("foo.bar", io.BytesIO(b"foo"), "foo/bar")},
+    )
+
+    resp = client.get(
+        f"/ensembles/{ensemble_id}/record_data",
+        params=dict(name=["coeffs", "indexed"]),
+        headers={"accept": "application/x-npz"},
+    )
+    with np.load(io.BytesIO(resp.content)) as npz:
+        assert sorted(npz.files) == [
+            "coeffs",
+            *(f"indexed@{index}" for index in range(NUM_REALIZATIONS)),
+        ]
+        assert_array_equal(npz["coeffs"], PARAMETERS)
+        for index, row in enumerate(PARAMETERS):
+            assert_array_equal(npz[f"indexed@{index}"], [row, row])
+
+    # All matrix records, split by realization
+    resp = client.get(
+        f"/ensembles/{ensemble_id}/record_data",
+        params=dict(realization_index=[3, 1]),
+    )
+    entries = _read_arrow(resp.content)
+    assert [(name, index) for name, index, _ in entries] == [
+        ("coeffs", 1),
+        ("coeffs", 3),
+        ("indexed", 1),
+        ("indexed", 3),
+    ]
+    assert_array_equal(entries[0][2], PARAMETERS[1])
+    assert_array_equal(entries[3][2], [PARAMETERS[3], PARAMETERS[3]])
+
+    # The Arrow stream can be posted as-is
+    other_ensemble_id = simple_ensemble(["coeffs"], size=NUM_REALIZATIONS)
+    client.post(
+        f"/ensembles/{other_ensemble_id}/records",
+        data=resp.content,
+        headers={"content-type": "application/vnd.apache.arrow.stream"},
+    )
+    resp = client.get(
+        f"/ensembles/{other_ensemble_id}/records/indexed",
+        params=dict(realization_index=3),
+    )
+    assert resp.json() == [PARAMETERS[3], PARAMETERS[3]]
+
+    resp = client.get(
+        f"/ensembles/{ensemble_id}/record_data",
+        params=dict(name="coeffs", label="b"),
+    )
+    [(_, _, values)] = _read_arrow(resp.content)
+    assert_array_equal(values, [[row[1]] for row in PARAMETERS])
+
+    client.get(
+        f"/ensembles/{ensemble_id}/record_data",
+        params=dict(name=["coeffs", "missing"]),
+        check_status_code=status.HTTP_404_NOT_FOUND,
+    )
+    client.get(
+        f"/ensembles/{ensemble_id}/record_data",
+        params=dict(name="foo"),
+        check_status_code=status.HTTP_417_EXPECTATION_FAILED,
+    )
+
+
+def test_bulk_fetch_statements(
+    client, create_experiment, create_ensemble, count_statements, small_tiles
+):
+    experiment_id = create_experiment("test_bulk_fetch_statements")
+
+    def get(size):
+        ensemble_id = create_ensemble(experiment_id, parameters=["coeffs"], size=size)
+        arrays = {
+            "coeffs": np.random.rand(size, 10),
+            **{
+                f"{name}@{index}": np.random.rand(10)
+                for name in "ab"
+                for index in range(size)
+            },
+        }
+        client.post(
+            f"/ensembles/{ensemble_id}/records",
+            data=_npz(**arrays),
+            headers={"content-type": "application/x-npz"},
+        )
+        with count_statements() as statements:
+            resp = client.get(
+                f"/ensembles/{ensemble_id}/record_data",
+                params=dict(name=["coeffs", "a", "b"]),
+                headers={"accept": "application/x-npz"},
+            )
+        with np.load(io.BytesIO(resp.content)) as npz:
+            for key, array in arrays.items():
+                assert_array_equal(npz[key], array)
+        return len(statements)
+
+    # The number of statements doesn't grow with the number of records
+    assert get(2) == get(50)
+
+
+@pytest.mark.parametrize(
+    "mimetype",
+    ["application/json", "text/csv", "application/x-numpy", "application/x-parquet"],
+)
+@pytest.mark.parametrize("labeled", [False, True])
+def test_ensemble_matrix(client, simple_ensemble, monkeypatch, mimetype, labeled):
+    from ert_storage.endpoints import records
+
+    ensemble_id = simple_ensemble(size=NUM_REALIZATIONS)
+    for index, row in enumerate(PARAMETERS):
+        if labeled:
+            data = pd.DataFrame([row], columns=["a", "b", "c"], index=[index])
+            client.post(
+                f"/ensembles/{ensemble_id}/records/indexed/matrix",
+                params=dict(realization_index=index),
+                data=data.to_csv(),
+                headers={"content-type": "text/csv"},
+            )
+        else:
+            client.post(
+                f"/ensembles/{ensemble_id}/records/indexed/matrix",
+                params=dict(realization_index=index),
+                data=json.dumps(row),
+            )
+
+    def get(**params):
+        return client.get(
+            f"/ensembles/{ensemble_id}/records/indexed",
+            params=params,
+            headers={"accept": mimetype},
+        ).content
+
+    # The first read stacks the records for the reads after it
+    unstacked = [get(), *([get(label="b")] if labeled else [])]
+    stacked = [get(), *([get(label="b")] if labeled else [])]
+    assert stacked == unstacked
+    monkeypatch.setattr(records, "get_ensemble_matrix_rows", lambda *args: None)
+    concatenated = [get(), *([get(label="b")] if labeled else [])]
+    assert stacked == concatenated
+
+
+def test_ensemble_matrix_update(
+    client,
+    create_experiment,
+    create_ensemble,
+    small_tiles,
+    count_loaded_tiles,
+    count_statements,
+):
+    from ert_storage import database_schema as ds
+
+    experiment_id = create_experiment("test_ensemble_matrix_update")
+    ensemble_id = create_ensemble(experiment_id, size=NUM_REALIZATIONS)
+
+    def post(index):
+        client.post(
+            f"/ensembles/{ensemble_id}/records/indexed/matrix",
+            params=dict(realization_index=index),
+            data=json.dumps(PARAMETERS[index]),
+        )
+
+    def get():
+        resp = client.get(f"/ensembles/{ensemble_id}/records/indexed")
+        return resp.json()
+
+    def stacked():
+        db = client.session()
+        try:
+            info = (
+                db.query(ds.RecordInfo)
+                .join(ds.Ensemble)
+                .filter(ds.Ensemble.id == ensemble_id, ds.RecordInfo.name == "indexed")
+                .one()
+            )
+            return info.ensemble_matrix_pk, info.ensemble_matrix_realizations
+        finally:
+            db.close()
+
+    def count_writes(statements):
+        return sum(
+            statement.lstrip().startswith(("INSERT", "UPDATE", "DELETE"))
+            for statement in statements
+        )
+
+    # Creating the records doesn't stack them, but the first read of all of
+    # them does so after responding
+    for index in range(3):
+        post(index)
+    assert stacked() == (None, None)
+    assert get() == PARAMETERS[:3]
+    matrix_pk, realizations = stacked()
+    assert realizations == [0, 1, 2]
+
+    # The stacked matrix, in tiles of 2 rows, is read instead of the records,
+    # and reading it never writes
+    count_loaded_tiles.clear()
+    with count_statements() as statements:
+        assert get() == PARAMETERS[:3]
+    assert len(count_loaded_tiles) == 2
+    assert count_writes(statements) == 0
+
+    # New realizations are read one by one until the next rebuild, which
+    # replaces the stacked matrix
+    post(4)
+    post(3)
+    assert stacked() == (matrix_pk, [0, 1, 2])
+    assert get() == PARAMETERS
+    new_matrix_pk, realizations = stacked()
+    assert new_matrix_pk != matrix_pk
+    assert realizations == [0, 1, 2, 3, 4]
+    db = client.session()
+    assert db.query(ds.F64Matrix).filter_by(pk=matrix_pk).count() == 0
+    db.close()
+    count_loaded_tiles.clear()
+    with count_statements() as statements:
+        assert get() == PARAMETERS
+    assert len(count_loaded_tiles) == 3
+    assert count_writes(statements) == 0
+    for statement in statements:
+        assert "FOR UPDATE" not in statement
+
+    # A rebuild based on a stacked matrix that was replaced in the meantime
+    # changes nothing
+    db = client.session()
+    info = (
+        db.query(ds.RecordInfo)
+        .join(ds.Ensemble)
+        .filter(ds.Ensemble.id == ensemble_id, ds.RecordInfo.name == "indexed")
+        .one()
+    )
+    assert not ds.replace_ensemble_matrix(
+        db.connection(), info.pk, matrix_pk, matrix_pk, [0], [0]
+    )
+    db.close()
+    assert stacked() == (new_matrix_pk, [0, 1, 2, 3, 4])
+    matrix_pk = new_matrix_pk
+
+    # The stacked matrix is deleted together with the records
+    client.delete(f"/experiments/{experiment_id}")
+    db = client.session()
+    assert db.query(ds.F64Matrix).filter_by(pk=matrix_pk).count() == 0
+    assert db.query(ds.F64MatrixTile).filter_by(f64_matrix_pk=matrix_pk).count() == 0
+    db.close()
+
+
+def test_ensemble_matrix_rebuild_failure(client, simple_ensemble, monkeypatch):
+    from ert_storage.endpoints import _records_cache
+
+    ensemble_id = simple_ensemble(size=NUM_REALIZATIONS)
+    for index, row in enumerate(PARAMETERS):
+        client.post(
+            f"/ensembles/{ensemble_id}/records/indexed/matrix",
+            params=dict(realization_index=index),
+            data=json.dumps(row),
+        )
+
+    def fail(*args):
+        raise RuntimeError("Rebuild failed")
+
+    # A failed rebuild doesn't fail the read, and the records are read one by
+    # one until a rebuild succeeds
+    with monkeypatch.context() as m:
+        m.setattr(_records_cache, "_read_rows", fail)
+        for _ in range(2):
+            resp = client.get(f"/ensembles/{ensemble_id}/records/indexed")
+            assert resp.json() == PARAMETERS
+    assert client.get(f"/ensembles/{ensemble_id}/records/indexed").json() == PARAMETERS
+    assert client.get(f"/ensembles/{ensemble_id}/records/indexed").json() == PARAMETERS
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        pd.DataFrame(np.random.rand(8, 3)),
+        pd.DataFrame(np.random.rand(7, 2), columns=["a", "b"], index=list("ABCDEFG")),
+        pd.DataFrame([[[1.0, 2.0], [3.0, np.nan]]] * 4),
+        pd.DataFrame(np.random.rand(3, 4)),
+        pd.DataFrame(np.empty((0, 3))),
+    ],
+)
+def test_streamed_encoders(monkeypatch, data):
+    from ert_storage.endpoints import records
+
+    monkeypatch.setattr(records, "STREAM_BLOCK_ROWS", 3)
+    assert b"".join(records._iter_csv(data)) == data.to_csv().encode()
+    assert (
+        b"".join(records._iter_json(data.values))
+        == json.dumps(data.values.tolist()).encode()
+    )
+
+
+def test_label_sets(client, create_experiment, create_ensemble):
+    from ert_storage import database_schema as ds
+
+    experiment_id = create_experiment("test_label_sets")
+    ensemble_id = create_ensemble(experiment_id, size=NUM_REALIZATIONS)
+    for index, row in enumerate(PARAMETERS):
+        data = pd.DataFrame([row], columns=["a", "b", "c"], index=[f"r{index}"])
+        client.post(
+            f"/ensembles/{ensemble_id}/records/indexed/matrix",
+            params=dict(realization_index=index),
+            data=data.to_csv(),
+            headers={"content-type": "text/csv"},
+        )
+
+    resp = client.get(
+        f"/ensembles/{ensemble_id}/records/indexed",
+        params=dict(realization_index=2, label="c"),
+    )
+    assert resp.json() == [PARAMETERS[2][2]]
+    client.get(
+        f"/ensembles/{ensemble_id}/records/indexed",
+        params=dict(realization_index=2, label="d"),
+        check_status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    )
+
+    # The realizations share their column labels, and have their own row labels
+    db = client.session()
+    matrices = (
+        db.query(ds.F64Matrix)
+        .join(ds.Record)
+        .join(ds.RecordInfo)
+        .filter(ds.RecordInfo.ensemble.has(id=ensemble_id))
+        .order_by(ds.Record.realization_index)
+        .all()
+    )
+    assert len({matrix.column_label_set_pk for matrix in matrices}) == 1
+    assert [matrix.labels for matrix in matrices] == [
+        [["a", "b", "c"], [f"r{index}"]] for index in range(NUM_REALIZATIONS)
+    ]
+    label_set_pks = {matrices[0].column_label_set_pk} | {
+        matrix.row_label_set_pk for matrix in matrices
+    }
+    db.close()
+
+    # Label sets are deleted together with the last matrix referring to them
+    client.delete(f"/experiments/{experiment_id}")
+    db = client.session()
+    assert db.query(ds.LabelSet).filter(ds.LabelSet.pk.in_(label_set_pks)).count() == 0
+    assert (
+        db.query(ds.Label).filter(ds.Label.label_set_pk.in_(label_set_pks)).count() == 0
+    )
+    db.close()
+
+
+@pytest.mark.parametrize(
+    "params,columns",
+    [
+        (dict(label=["p7", "p2", "p8"]), [7, 2, 8]),
+        (dict(label_from="p3", label_to="p5"), [3, 4, 5]),
+        (dict(label_from="p8"), [8, 9]),
+        (dict(label_to="p1"), [0, 1]),
+        (dict(columns="4"), [4]),
+        (dict(columns="-2:"), [8, 9]),
+        (dict(columns="1:9:3"), [1, 4, 7]),
+    ],
+)
+def test_column_selection(
+    client, simple_ensemble, small_tiles, count_loaded_tiles, params, columns
+):
+    import pyarrow as pa
+
+    ensemble_id = simple_ensemble(parameters=["coeffs"], size=4)
+    labels = [f"p{i}" for i in range(10)]
+    data = pd.DataFrame(np.random.rand(4, 10), columns=labels)
+    client.post(
+        f"/ensembles/{ensemble_id}/records/coeffs/matrix",
+        data=data.to_csv(),
+        headers={"content-type": "text/csv"},
+    )
+    count_loaded_tiles.clear()
+
+    resp = client.get(
+        f"/ensembles/{ensemble_id}/records/coeffs",
+        params=params,
+        headers={"accept": "application/vnd.apache.arrow.stream"},
+    )
+    selected = pa.ipc.open_stream(resp.content).read_pandas()
+    expected = data.iloc[:, columns]
+    assert list(selected.columns) == list(expected.columns)
+    assert_array_equal(selected.values, expected.values)
+
+    # Only the tiles of 3 columns that contain the selection are read
+    assert sorted(set(count_loaded_tiles)) == sorted(
+        {(row, column // 3) for row in range(2) for column in columns}
+    )
+
+
+def test_column_selection_label_queries(
+    client, simple_ensemble, count_statements, monkeypatch
+):
+    from ert_storage.endpoints import records
+
+    # Read the forward-model records one by one
+    monkeypatch.setattr(records, "get_ensemble_matrix_rows", lambda records: None)
+
+    def get(size):
+        ensemble_id = simple_ensemble(size=size)
+        data = pd.DataFrame(np.random.rand(size, 3), columns=["a", "b", "c"])
+        for index in range(size):
+            client.post(
+                f"/ensembles/{ensemble_id}/records/indexed/matrix",
+                params=dict(realization_index=index),
+                data=data.iloc[[index]].to_csv(),
+                headers={"content-type": "text/csv"},
+            )
+        with count_statements() as statements:
+            resp = client.get(
+                f"/ensembles/{ensemble_id}/records/indexed",
+                params=dict(label=["c", "a"]),
+                headers={"accept": "text/csv"},
+            )
+        df = pd.read_csv(
+            io.StringIO(resp.text), index_col=0, float_precision="round_trip"
+        )
+        assert_array_equal(df.values, data[["c", "a"]].values)
+        return [statement for statement in statements if "FROM label " in statement]
+
+    # The labels are looked up once for all records that share them
+    assert len(get(2)) == len(get(10)) == 1
+
+
+def test_column_selection_invalid(client, simple_ensemble):
+    ensemble_id = simple_ensemble(parameters=["coeffs"], size=4)
+    client.post(
+        f"/ensembles/{ensemble_id}/records/coeffs/matrix",
+        data=pd.DataFrame([[1.0, 2.0]], columns=["a", "b"]).to_csv(),
+        headers={"content-type": "text/csv"},
+    )
+
+    for params in [
+        dict(label=["a", "c"]),
+        dict(label_from="c"),
+        dict(label_from="b", label_to="a"),
+        dict(label="a", columns="0"),
+        dict(label_from="a", columns=":1"),
+        dict(columns="a:b"),
+        dict(columns="::0"),
+        dict(columns="2"),
+    ]:
+        client.get(
+            f"/ensembles/{ensemble_id}/records/coeffs",
+            params=params,
+            check_status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+
+def test_realization_subsets(client, create_experiment, create_ensemble):
+    import sqlalchemy as sa
+    from ert_storage import database_schema as ds
+
+    experiment_id = create_experiment("test_realization_subsets")
+    ensemble_id = create_ensemble(experiment_id, size=10)
+    data = pd.DataFrame(np.random.rand(10, 3), columns=["a", "b", "c"])
+    for index in range(10):
+        client.post(
+            f"/ensembles/{ensemble_id}/records/indexed/matrix",
+            params=dict(realization_index=index),
+            data=data.iloc[[index]].to_csv(),
+            headers={"content-type": "text/csv"},
+        )
+    client.post(
+        f"/ensembles/{ensemble_id}/records/wide/matrix",
+        data=data.to_csv(),
+        headers={"content-type": "text/csv"},
+    )
+
+    loaded = []
+
+    def on_load(target, context):
+        loaded.append(target.realization_index)
+
+    def get(name, realizations):
+        resp = client.get(
+            f"/ensembles/{ensemble_id}/records/{name}",
+            params=dict(realizations=realizations) if realizations else {},
+            headers={"accept": "text/csv"},
+        )
+        return pd.read_csv(
+            io.BytesIO(resp.content), index_col=0, float_precision="round_trip"
+        )
+
+    sa.event.listen(ds.Record, "load", on_load)
+    try:
+        # Only the records of the selected realizations are loaded
+        assert_frame_equal(get("indexed", "1,3-5"), data.iloc[[1, 3, 4, 5]])
+        assert sorted(loaded) == [1, 3, 4, 5]
+
+        # Ensemble-wide records are read row by realization
+        assert_frame_equal(get("wide", "8,2"), data.iloc[[2, 8]])
+    finally:
+        sa.event.remove(ds.Record, "load", on_load)
+
+    def stacked_matrix_pk():
+        db = client.session()
+        try:
+            return (
+                db.query(ds.RecordInfo.ensemble_matrix_pk)
+                .join(ds.Ensemble)
+                .filter(ds.Ensemble.id == ensemble_id, ds.RecordInfo.name == "indexed")
+                .scalar()
+            )
+        finally:
+            db.close()
+
+    # Subsets are read from the stacked matrix, which is built as the records
+    # are created and is not replaced by reading
+    assert_frame_equal(get("indexed", None), data)
+    matrix_pk = stacked_matrix_pk()
+    assert matrix_pk is not None
+    assert_frame_equal(get("indexed", "7-9,0"), data.iloc[[0, 7, 8, 9]])
+    assert_frame_equal(get("wide", "8-12,0-1,9"), data.iloc[[0, 1, 8, 9]])
+    assert stacked_matrix_pk() == matrix_pk
+
+    for params in [
+        dict(realizations="1-"),
+        dict(realizations="5-3"),
+        dict(realizations="a"),
+        dict(realizations="1", realization_index=1),
+        # More realizations than the ensemble has
+        dict(realizations="0-999999999"),
+        dict(realizations="0-5,11-15"),
+    ]:
+        client.get(
+            f"/ensembles/{ensemble_id}/records/indexed",
+            params=params,
+            check_status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+
+def test_get_records_by_name_statements(
+    client, create_experiment, create_ensemble, count_statements
+):
+    from ert_storage import exceptions as exc
+    from ert_storage.endpoints._realizations import Realizations
+    from ert_storage.endpoints.records import get_records_by_name
+
+    experiment_id = create_experiment("test_get_records_by_name_statements")
+    ensemble_id = create_ensemble(experiment_id, size=NUM_REALIZATIONS)
+    for index, row in enumerate(PARAMETERS):
+        client.post(
+            f"/ensembles/{ensemble_id}/records/indexed/matrix",
+            params=dict(realization_index=index),
+            data=json.dumps(row),
+        )
+    client.post(f"/ensembles/{ensemble_id}/records/wide/matrix", data="[[1, 2]]")
+
+    def get(name, realization_index=None, realizations=None):
+        db = client.session()
+        try:
+            with count_statements() as statements:
+                records = get_records_by_name(
+                    db=db,
+                    ensemble_id=ensemble_id,
+                    name=name,
+                    realization_index=realization_index,
+                    realizations=realizations
+                    and Realizations((index, index) for index in realizations),
+                )
+                for record in records:
+                    assert record.record_info.name == name
+                    assert record.f64_matrix.shape is not None
+            # The records are resolved and loaded with a single statement
+            assert len(statements) == 1
+            return sorted(
+                -1 if record.realization_index is None else record.realization_index
+                for record in records
+            )
+        finally:
+            db.close()
+
+    assert get("indexed", realization_index=2) == [2]
+    assert get("indexed") == list(range(NUM_REALIZATIONS))
+    assert get("indexed", realizations=[1, 3]) == [1, 3]
+    assert get("wide") == [-1]
+    assert get("wide", realization_index=2) == [-1]
+    assert get("wide", realizations=[1, 3]) == [-1]
+    with pytest.raises(exc.NotFoundError):
+        get("indexed", realizations=[NUM_REALIZATIONS])
+    with pytest.raises(exc.NotFoundError):
+        get("missing")
+
+
+def test_parameters_statements(
+    client, create_experiment, create_ensemble, count_statements
+):
+    import sqlalchemy as sa
+    from ert_storage import database_schema as ds
+
+    experiment_id = create_experiment("test_parameters_statements")
+
+    def get(size):
+        names = [f"group{index}" for index in range(size)]
+        ensemble_id = create_ensemble(experiment_id, parameters=names, size=2)
+        for index, name in enumerate(names[1:]):
+            data = pd.DataFrame(np.random.rand(2, 3), columns=["a", "b", f"c{index}"])
+            client.post(
+                f"/ensembles/{ensemble_id}/records/{name}/matrix",
+                data=data.to_csv(),
+                headers={"content-type": "text/csv"},
+            )
+        with count_statements() as statements:
+            resp = client.get(f"/ensembles/{ensemble_id}/parameters")
+        assert resp.json() == [
+            {"name": names[0], "labels": []},
+            *(
+                {"name": name, "labels": ["a", "b", f"c{index}"]}
+                for index, name in enumerate(names[1:])
+            ),
+        ]
+        return len(statements)
+
+    loaded = []
+
+    def on_load(target, context):
+        loaded.append(target)
+
+    # The number of statements doesn't grow with the number of parameters, and
+    # no matrix is loaded
+    sa.event.listen(ds.F64Matrix, "load", on_load)
+    try:
+        assert get(2) == get(30)
+    finally:
+        sa.event.remove(ds.F64Matrix, "load", on_load)
+    assert loaded == []
+
+
+def test_list_records_statements(
+    client, create_experiment, create_ensemble, count_statements
+):
+    import sqlalchemy as sa
+    from ert_storage import database_schema as ds
+
+    experiment_id = create_experiment("test_list_records_statements")
+    obs_id = client.post(
+        f"/experiments/{experiment_id}/observations",
+        json=dict(name="obs", values=[1.0], errors=[0.1], x_axis=["a"]),
+    ).json()["id"]
+
+    loaded = []
+
+    def on_load(target, context):
+        loaded.append(target)
+
+    def get(size):
+        ensemble_id = create_ensemble(experiment_id, size=2)
+        for index in range(size):
+            data = pd.DataFrame(np.random.rand(2, 3), columns=["a", "b", "c"])
+            client.post(
+                f"/ensembles/{ensemble_id}/records/rec{index}/matrix",
+                data=data.to_csv(),
+                headers={"content-type": "text/csv"},
+            )
+        client.post(
+            f"/ensembles/{ensemble_id}/records/rec0/observations", json=[obs_id]
+        )
+
+        loaded.clear()
+        with count_statements() as statements:
+            records = client.get(f"/ensembles/{ensemble_id}/records").json()
+        assert loaded == []
+        assert sorted(records) == [f"rec{index}" for index in range(size)]
+        assert [
+            records[f"rec{index}"]["has_observations"] for index in range(size)
+        ] == [index == 0 for index in range(size)]
+        return len(statements)
+
+    # Listing records reads neither their payloads nor their observations, and
+    # the number of statements doesn't grow with the number of records
+    classes = [ds.F64Matrix, ds.F64MatrixTile, ds.LabelSet, ds.Observation]
+    for cls in classes:
+        sa.event.listen(cls, "load", on_load)
+    try:
+        assert get(2) == get(10)
+    finally:
+        for cls in classes:
+            sa.event.remove(cls, "load", on_load)
+
+
+class _FakeAzureBlob:
+    def __init__(self, blobs, key):
+        self._blobs = blobs
+        self._key = key
+
+    async def upload_blob(self, data):
+        self._blobs[self._key] = data.read()
+
+    async def stage_block(self, block_id, data):
+        self._blobs[block_id] = data
+
+    async def commit_block_list(self, block_ids):
+        self._blobs[self._key] = b"".join(self._blobs.pop(id_) for id_ in block_ids)
+
+    async def download_blob(self):
+        content = self._blobs[self._key]
+
+        class Download:
+            async def chunks(self):
+                yield content
+
+        return Download()
+
+
+class _FakeAzureContainer:
+    container_name = "fake"
+
+    def __init__(self):
+        self.blobs = {}
+
+    def get_blob_client(self, key):
+        return _FakeAzureBlob(self.blobs, key)
+
+
+@pytest.fixture(params=["database", "local", "azure"])
+def blob_storage(request, monkeypatch, tmp_path):
+    """
+    Store files with each of the blob handlers, where Azure Blob Storage is
+    faked in memory
+    """
+    from ert_storage.endpoints import _records_blob
+
+    monkeypatch.setattr(_records_blob, "HAS_AZURE_BLOB_STORAGE", False)
+    monkeypatch.setattr(_records_blob, "HAS_LOCAL_BLOB_STORAGE", False)
+    if request.param == "local":
+        monkeypatch.setattr(_records_blob, "HAS_LOCAL_BLOB_STORAGE", True)
+        monkeypatch.setattr(_records_blob, "LOCAL_BLOB_PATH", tmp_path)
+    elif request.param == "azure":
+        monkeypatch.setattr(_records_blob, "HAS_AZURE_BLOB_STORAGE", True)
+        monkeypatch.setattr(
+            _records_blob,
+            "azure_blob_container",
+            _FakeAzureContainer(),
+            raising=False,
+        )
+    return request.param
+
+
+def test_queries_off_event_loop(client, simple_ensemble, blob_storage):
+    """
+    The record endpoints run their queries in the thread pool, so that they
+    never block the event loop
+    """
+    import asyncio
+
+    import sqlalchemy as sa
+    from ert_storage.database import engine
+
+    ensemble_id = simple_ensemble(["coeffs"], size=2)
+    on_loop = []
+
+    def on_execute(conn, cursor, statement, *args):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        on_loop.append(statement)
+
+    url = f"/ensembles/{ensemble_id}/records"
+    data = pd.DataFrame(np.random.rand(2, 3), columns=["a", "b", "c"])
+    sa.event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        record_id = client.post(
+            f"{url}/coeffs/matrix",
+            data=data.to_csv(),
+            headers={"content-type": "text/csv"},
+        ).json()["id"]
+        client.post(f"{url}/indexed/matrix", params=dict(realization_index=0), json=[1])
+        client.post(f"{url}/indexed/matrix", params=dict(realization_index=1), json=[2])
+        client.post(
+            url,
+            data=_npz(bulk=np.ones((2, 2))),
+            headers={"content-type": "application/x-npz"},
+        )
+        client.post(
+            f"{url}/foo/file",
+            files={"file": ("foo.bar", io.BytesIO(b"foo"), "foo/bar")},
+        )
+        client.post(f"{url}/blob/blob")
+        client.put(f"{url}/blob/blob", params={"block_index": 0}, data=b"blob")
+        client.patch(f"{url}/blob/blob")
+        client.put(f"{url}/coeffs/userdata", json={"foo": "bar"})
+
+        for accept in ["application/json", "text/csv", "application/x-numpy"]:
+            client.get(f"{url}/coeffs", headers={"accept": accept})
+            client.get(f"{url}/indexed", headers={"accept": accept})
+            client.get(f"/records/{record_id}/data", headers={"accept": accept})
+        client.get(f"{url}/coeffs", params=dict(label=["a", "c"]))
+        client.get(f"{url}/indexed", params=dict(realizations="1"))
+        assert client.get(f"{url}/foo").content == b"foo"
+        assert client.get(f"{url}/blob").content == b"blob"
+        client.get(f"/ensembles/{ensemble_id}/record_data")
+        client.get(f"{url}/coeffs/labels")
+        client.get(f"{url}/coeffs/userdata")
+        client.get(f"/ensembles/{ensemble_id}/parameters")
+        client.get(url)
+        client.get(f"/records/{record_id}")
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", on_execute)
+    assert on_loop == []
+
+
+def test_codec_process_pool(client, simple_ensemble, monkeypatch):
+    """
+    Records are encoded and decoded the same way in worker processes, with the
+    pool reported in the server metrics
+    """
+    from ert_storage.endpoints import _codec_pool
+
+    ensemble_id = simple_ensemble(["coeffs"], size=2)
+    url = f"/ensembles/{ensemble_id}/records"
+    data = pd.DataFrame(np.random.rand(2, 3), columns=["a", "b", "c"])
+    client.post(
+        f"{url}/coeffs/matrix", data=data.to_csv(), headers={"content-type": "text/csv"}
+    )
+    for index in range(2):
+        client.post(
+            f"{url}/indexed/matrix",
+            params=dict(realization_index=index),
+            json=list(data.values[index]),
+        )
+
+    requests = [
+        (name, accept)
+        for name in ("coeffs", "indexed")
+        for accept in ("application/json", "text/csv", "application/x-parquet")
+    ] + [("coeffs", "application/vnd.apache.arrow.stream")]
+    expected = [
+        client.get(f"{url}/{name}", headers={"accept": accept}).content
+        for name, accept in requests
+    ]
+
+    pool = _codec_pool.CodecPool("process", 2)
+    monkeypatch.setattr(_codec_pool, "codec_pool", pool)
+    try:
+        assert [
+            client.get(f"{url}/{name}", headers={"accept": accept}).content
+            for name, accept in requests
+        ] == expected
+
+        client.post(
+            f"{url}/parquet/matrix",
+            data=data.to_parquet(),
+            headers={"content-type": "application/x-parquet"},
+        )
+        assert_frame_equal(
+            pd.read_parquet(
+                io.BytesIO(
+                    client.get(
+                        f"{url}/parquet", headers={"accept": "application/x-parquet"}
+                    ).content
+                )
+            ),
+            data,
+        )
+        client.post(
+            f"{url}/invalid/matrix",
+            data=b"not a matrix",
+            headers={"content-type": "application/x-numpy"},
+            check_status_code=422,
+        )
+        client.post(
+            url,
+            data=b"",
+            headers={"content-type": "text/plain"},
+            check_status_code=422,
+        )
+
+        assert client.get("/server/metrics").json()["codec_pool"] == {
+            "kind": "process",
+            "workers": 2,
+            "pending": 0,
+            "queue_depth": 0,
+        }
+    finally:
+        pool.shutdown()
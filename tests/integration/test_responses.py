@@ -38,6 +38,16 @@ def test_get_response_data(client, create_experiment, create_ensemble):
             response_df.loc[id_real].values, data_df[id_real].values.flatten()
         )
 
+    # get a subset of the realizations
+    resp = client.get(
+        f"/ensembles/{ensemble_id}/responses/{response_name}/data",
+        params=dict(realizations="0,2-3"),
+    )
+    stream = io.BytesIO(resp.content)
+    response_df = pd.read_csv(stream, index_col=0, float_precision="round_trip")
+    assert_array_equal(response_df.index, [0, 2, 3])
+    assert_array_equal(response_df.values, matrices[[0, 2, 3]])
+
 
 def test_get_response_data_with_nan(client, create_experiment, create_ensemble):
     experiment_id = create_experiment("test_ensembles")
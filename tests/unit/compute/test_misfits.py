@@ -1,4 +1,5 @@
 import pandas as pd
+import pytest
 import numpy as np
 from numpy.testing import assert_array_almost_equal, assert_array_less
 from ert_storage.compute import calculate_misfits_from_pandas, misfits
@@ -141,3 +142,54 @@ def test_misfits_increasing_response_values():
         )
     assert_array_less(misfits_increased_responses[0], misfits_increased_responses[1])
     assert_array_less(misfits_increased_responses[1], misfits_increased_responses[2])
+
+
+def _reference_misfits(response_dict, observation_df):
+    # Univariate misfits computed one realization and observation at a time
+    return {
+        realization_index: [
+            np.sign(response.loc[0, label] - value)
+            * ((response.loc[0, label] - value) / error) ** 2
+            for label, value, error in zip(
+                observation_df.index,
+                observation_df["values"],
+                observation_df["errors"],
+            )
+        ]
+        for realization_index, response in response_dict.items()
+    }
+
+
+@pytest.mark.parametrize("shuffle_columns", [False, True])
+def test_misfits_stacked(shuffle_columns):
+    columns = ["A", "B", "C", "D", "E", "F", "G", "H"]
+    response_dict = {}
+    for realization_index in range(10):
+        if shuffle_columns:
+            columns = list(np.random.permutation(columns))
+        response_dict[realization_index] = pd.DataFrame(
+            [np.random.rand(8)], columns=columns
+        )
+    observation_df = _get_dummy_observation_df()
+    expected = _reference_misfits(response_dict, observation_df)
+
+    misfits_df = calculate_misfits_from_pandas(response_dict, observation_df)
+    assert list(misfits_df.index) == list(range(10))
+    assert list(misfits_df.columns) == observation["x_axis"]
+    for realization_index, values in expected.items():
+        assert_array_almost_equal(misfits_df.loc[realization_index].values, values)
+
+    summary_df = calculate_misfits_from_pandas(
+        response_dict, observation_df, summary_misfits=True
+    )
+    assert_array_almost_equal(
+        summary_df[0].values,
+        [np.abs(values).sum() for values in expected.values()],
+    )
+
+
+def test_misfits_missing_observed_column():
+    response_df = pd.DataFrame([np.random.rand(3)], columns=["A", "B", "C"])
+
+    with pytest.raises(KeyError, match="'E', 'H'"):
+        calculate_misfits_from_pandas({0: response_df}, _get_dummy_observation_df())
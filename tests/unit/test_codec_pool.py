@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def codec_pool(monkeypatch):
+    monkeypatch.setenv("ERT_STORAGE_DATABASE_URL", "sqlite:///foo.bar")
+
+    from ert_storage.endpoints import _codec_pool
+
+    return _codec_pool
+
+
+@pytest.mark.parametrize(
+    "env,kind,workers",
+    [({}, "thread", None), ({"POOL": "process", "WORKERS": "3"}, "process", 3)],
+)
+def test_env_codec_pool(codec_pool, monkeypatch, env, kind, workers):
+    for key in ("POOL", "WORKERS"):
+        monkeypatch.delenv(f"ERT_STORAGE_CODEC_{key}", raising=False)
+    for key, value in env.items():
+        monkeypatch.setenv(f"ERT_STORAGE_CODEC_{key}", value)
+
+    assert codec_pool.get_env_codec_pool() == kind
+    assert codec_pool.get_env_codec_workers() == (workers or codec_pool.os.cpu_count())
+
+
+@pytest.mark.parametrize(
+    "key,value", [("POOL", "fork"), ("WORKERS", "0"), ("WORKERS", "two")]
+)
+def test_env_codec_pool_invalid(codec_pool, monkeypatch, key, value):
+    monkeypatch.setenv(f"ERT_STORAGE_CODEC_{key}", value)
+
+    with pytest.raises(EnvironmentError, match=f"ERT_STORAGE_CODEC_{key}"):
+        codec_pool.get_env_codec_pool()
+        codec_pool.get_env_codec_workers()
+
+
+def test_queue_depth(codec_pool):
+    pool = codec_pool.CodecPool("thread", 2)
+    release = threading.Event()
+    threads = [
+        threading.Thread(target=pool.run, args=(release.wait,)) for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    while pool.pending < 5:
+        time.sleep(0.01)
+
+    assert pool.metrics() == {
+        "kind": "thread",
+        "workers": 2,
+        "pending": 5,
+        "queue_depth": 3,
+    }
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert pool.pending == 0
+    assert pool.queue_depth == 0
+    pool.shutdown()
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from ert_storage import compression
+
+
+CODECS = [
+    "none",
+    *compression.COMPRESSORS,
+    *(f"shuffle+{name}" for name in compression.COMPRESSORS),
+]
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_roundtrip(codec):
+    data = np.cumsum(np.random.rand(1000)).tobytes()
+    packed = compression.compress(data, codec, itemsize=8)
+    assert bytes(compression.decompress(packed, codec, itemsize=8)) == data
+
+
+@pytest.mark.parametrize("codec", [None, "none"])
+def test_uncompressed_is_not_copied(codec):
+    data = b"foo"
+    assert compression.compress(data, codec) is data
+    assert compression.decompress(data, codec) is data
+
+
+def test_shuffle():
+    data = np.array([0x0102, 0x0304, 0x0506], dtype=">u2").tobytes()
+    assert (
+        compression.compress(data, "shuffle", itemsize=2) == b"\x01\x03\x05\x02\x04\x06"
+    )
+
+
+def test_file_codec():
+    assert compression.file_codec("none") == "none"
+    assert compression.file_codec("zlib") == "zlib"
+    assert compression.file_codec("shuffle+zlib") == "zlib"
+    assert compression.file_codec("shuffle") == "none"
+
+
+def test_unknown_codec():
+    compression.check_codec("shuffle+zlib")
+    with pytest.raises(ValueError, match="Unknown compression codec 'foo'"):
+        compression.check_codec("shuffle+foo")
+
+
+def test_env_compression(monkeypatch):
+    monkeypatch.setenv("ERT_STORAGE_DATABASE_URL", "sqlite:///foo.bar")
+    from ert_storage import database
+
+    monkeypatch.setenv(database.ENV_COMPRESSION, "zlib")
+    assert database.get_env_compression() == "zlib"
+
+    monkeypatch.setenv(database.ENV_COMPRESSION, "foo")
+    with pytest.raises(EnvironmentError, match=database.ENV_COMPRESSION):
+        database.get_env_compression()